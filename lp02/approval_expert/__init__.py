@@ -1,2 +1,2 @@
 from approval_expert.prompting import get_system_message as get_approval_expert_system_message
-from approval_expert.graph import APPROVAL_GRAPH, APPROVAL_GRAPH_RUNNER
\ No newline at end of file
+from approval_expert.graph import APPROVAL_GRAPH, APPROVAL_GRAPH_ASYNC_RUNNER, APPROVAL_GRAPH_RUNNER
\ No newline at end of file
@@ -0,0 +1,139 @@
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+from approval_expert.classifier import classify_approval_response
+
+#
+# Offline benchmark for the fast-path approval classifier.  Run from the lp02 directory with:
+#
+#     python -m approval_expert.benchmark
+#
+# Each reply is labelled with the outcome the approval LLM should reach.  The fast path should decide as many of
+# the "approved" and "denied" replies as it can, and must never decide an "other" reply or get a decision wrong.
+#
+
+LABELLED_REPLIES: List[Tuple[str, str]] = [
+    ("Yes, I approve.", "approved"),
+    ("yeah, that's fine.", "approved"),
+    ("Sure, go ahead.", "approved"),
+    ("Approved", "approved"),
+    ("approved.", "approved"),
+    ("yes", "approved"),
+    ("Yes please", "approved"),
+    ("yep", "approved"),
+    ("y", "approved"),
+    ("ok", "approved"),
+    ("Okay, do it", "approved"),
+    ("go ahead", "approved"),
+    ("Go ahead, thanks!", "approved"),
+    ("lgtm", "approved"),
+    ("Proceed", "approved"),
+    ("yes, proceed", "approved"),
+    ("Sure thing", "approved"),
+    ("Absolutely, go ahead", "approved"),
+    ("I approve this operation", "approved"),
+    ("That's fine", "approved"),
+    ("Confirmed", "approved"),
+    ("yup, do it", "approved"),
+    ("Looks good to me", "approved"),
+    ("Ship it", "approved"),
+    ("Yes, create the dashboard", "approved"),
+    ("no", "denied"),
+    ("No.", "denied"),
+    ("nope", "denied"),
+    ("Denied", "denied"),
+    ("I deny this", "denied"),
+    ("No, don't do that", "denied"),
+    ("Don't do it", "denied"),
+    ("Cancel", "denied"),
+    ("cancel it please", "denied"),
+    ("Stop", "denied"),
+    ("Reject", "denied"),
+    ("nah", "denied"),
+    ("No thanks", "denied"),
+    ("Absolutely not", "denied"),
+    ("I don't approve", "denied"),
+    ("Please don't create that dashboard", "denied"),
+    ("Not now", "denied"),
+    ("No, don't proceed", "denied"),
+    ("Nope, not fine, cancel it", "denied"),
+    # Replies with both a denial and an approval word; the fast path has to leave these to the LLM
+    ("No, go ahead", "approved"),
+    ("Nah, it's fine", "approved"),
+    ("Don't stop, proceed", "approved"),
+    ("No, proceed", "approved"),
+    ("No no, that's fine, go ahead", "approved"),
+    ("Yes, no problem", "approved"),
+    ("Stop, don't proceed", "denied"),
+    ("What does this operation do?", "other"),
+    ("Which region will the dashboard be created in?", "other"),
+    ("yes but only in us-east-1", "other"),
+    ("Approve it if the widgets include CPU utilization", "other"),
+    ("Can you add a memory widget first?", "other"),
+    ("not sure", "other"),
+    ("Hmm, let me think", "other"),
+    ("wait", "other"),
+    ("Change the dashboard name to prod-overview", "other"),
+    ("How much will this cost?", "other"),
+    ("What tools do you have?", "other"),
+    ("Let's talk about something else", "other"),
+    ("Maybe later", "other"),
+    ("Explain the JSON to me", "other"),
+    ("yes? no? I don't know", "other"),
+    ("ok, but rename it first", "other"),
+    ("Sure, but can you also list the metrics for my other domain before you do it?", "other"),
+    ("Tell me more about the widgets", "other"),
+    ("I need more details before I decide", "other"),
+    ("Go ahead and delete my other dashboards too", "other"),
+]
+
+LABEL_TO_CLASSIFICATION = {"approved": "approved", "denied": "denied", "other": "ambiguous"}
+
+def run_benchmark(corpus: List[Tuple[str, str]] = LABELLED_REPLIES, repetitions: int = 1000) -> Dict[str, float]:
+    """
+    Classifies each reply in the corpus, returning accuracy and latency figures.
+    """
+    decided = 0
+    correct = 0
+    wrong = []
+    decidable = sum(1 for _, label in corpus if label != "other")
+    for reply, label in corpus:
+        classification = classify_approval_response(reply)
+        if classification == "ambiguous":
+            if label == "other":
+                correct += 1
+            continue
+        decided += 1
+        if classification == LABEL_TO_CLASSIFICATION[label]:
+            correct += 1
+        else:
+            wrong.append((reply, label, classification))
+
+    latencies_us = []
+    for reply, _ in corpus:
+        start = time.perf_counter_ns()
+        for _ in range(repetitions):
+            classify_approval_response(reply)
+        latencies_us.append((time.perf_counter_ns() - start) / repetitions / 1000)
+    latencies_us.sort()
+
+    for reply, label, classification in wrong:
+        print(f"WRONG: {reply!r} labelled {label}, classified {classification}")
+
+    return {
+        "replies": len(corpus),
+        # Replies the fast path handled, as a share of those it could have handled
+        "coverage": decided / decidable if decidable else 0.0,
+        # Fast-path decisions that were correct; anything below 1.0 is a bug
+        "precision": (decided - len(wrong)) / decided if decided else 1.0,
+        # Replies that ended up with the right outcome, counting ambiguous replies as correctly sent to the LLM
+        "accuracy": correct / len(corpus),
+        "errors": len(wrong),
+        "latency_p50_us": statistics.median(latencies_us),
+        "latency_p99_us": latencies_us[min(len(latencies_us) - 1, int(len(latencies_us) * 0.99))],
+    }
+
+if __name__ == "__main__":
+    for key, value in run_benchmark().items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
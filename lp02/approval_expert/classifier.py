@@ -0,0 +1,89 @@
+import logging
+import re
+from typing import FrozenSet, List, Literal, Optional
+
+from approval_expert.prompting import APPROVAL_EXAMPLES
+
+logger = logging.getLogger(__name__)
+
+#
+# A deterministic fast path for the approval conversation.  Short, unambiguous replies ("yes", "approved", "no, don't
+# do that") are classified with a lexicon so we don't need a full LLM call for them.  Anything else - questions,
+# conditions, changes of topic, long replies - is left to the LLM.  The classifier only ever errs on the side of
+# "ambiguous", since a wrong fast-path decision can't be corrected by the LLM.
+#
+
+ApprovalClassification = Literal["approved", "denied", "ambiguous"]
+
+# Replies longer than this always go to the LLM
+MAX_FAST_PATH_WORDS = 8
+
+# Words that carry an approval on their own
+APPROVAL_WORDS = frozenset([
+    "yes", "yeah", "yep", "yup", "y", "sure", "ok", "okay", "approve", "approved", "lgtm", "proceed", "confirmed",
+    "confirm", "affirmative", "granted", "fine", "ahead"
+])
+# Words that carry a denial on their own
+DENIAL_WORDS = frozenset([
+    "no", "nope", "nah", "n", "deny", "denied", "reject", "rejected", "decline", "declined", "cancel", "abort", "stop",
+    "dont", "negative"
+])
+# Filler that may appear alongside either, without changing the meaning
+FILLER_WORDS = frozenset([
+    "i", "that", "thats", "is", "its", "it", "go", "do", "please", "thanks", "thank", "you", "this", "the",
+    "operation", "request", "all", "good", "looks", "sounds", "to", "me", "with", "of", "course", "absolutely",
+    "definitely", "not", "want", "away", "right", "now", "a", "way", "perfect", "great"
+])
+# Words that signal a condition, a question, or a change of mind; any of these sends the reply to the LLM
+AMBIGUOUS_WORDS = frozenset([
+    "but", "if", "unless", "except", "only", "first", "wait", "what", "why", "how", "which", "when", "where", "who",
+    "can", "could", "would", "should", "maybe", "perhaps", "instead", "change", "before", "after", "think", "hmm",
+    "depends", "more", "explain", "details", "tell"
+])
+# Negations that turn an approval word around ("not fine", "don't proceed")
+NEGATION_WORDS = frozenset(["not", "dont", "no", "never"])
+# Negations that can only turn the word right after them around; "no" isn't one, as punctuation is dropped and
+# "no, proceed" would read as "no proceed"
+STRICT_NEGATION_WORDS = NEGATION_WORDS - {"no"}
+
+_WORD_PATTERN = re.compile(r"[a-z]+")
+
+def _normalize(text: str) -> List[str]:
+    return _WORD_PATTERN.findall(text.lower().replace("'", "").replace("\u2019", ""))
+
+# The examples in the approval prompt are approvals by definition
+APPROVAL_EXAMPLE_PHRASES: FrozenSet[str] = frozenset(" ".join(_normalize(example)) for example in APPROVAL_EXAMPLES)
+
+def classify_approval_response(text: Optional[str]) -> ApprovalClassification:
+    """
+    Classifies the human operator's reply to an approval request as "approved", "denied", or "ambiguous".
+    """
+    if not isinstance(text, str) or "?" in text:
+        return "ambiguous"
+
+    words = _normalize(text)
+    if not words or len(words) > MAX_FAST_PATH_WORDS:
+        return "ambiguous"
+    if " ".join(words) in APPROVAL_EXAMPLE_PHRASES:
+        return "approved"
+    if any(word in AMBIGUOUS_WORDS for word in words):
+        return "ambiguous"
+    if any(word not in APPROVAL_WORDS | DENIAL_WORDS | FILLER_WORDS for word in words):
+        return "ambiguous"
+
+    has_approval = any(word in APPROVAL_WORDS for word in words)
+    has_denial = any(word in DENIAL_WORDS for word in words)
+    has_negation = any(word in NEGATION_WORDS for word in words)
+
+    if has_denial and not has_approval:
+        return "denied"
+    if has_denial and has_approval:
+        # "No, don't proceed" and "I don't approve" are denials, as every approval word is negated.  Otherwise both
+        # readings are possible ("No, go ahead", "Don't stop, proceed"), so the LLM decides.
+        if all(i > 0 and words[i - 1] in STRICT_NEGATION_WORDS
+                for i, word in enumerate(words) if word in APPROVAL_WORDS):
+            return "denied"
+        return "ambiguous"
+    if has_approval and not has_negation:
+        return "approved"
+    return "ambiguous"
@@ -1,28 +1,40 @@
-from functools import wraps
 import logging
-from typing import Annotated, Any, Callable, Dict, List, Literal
+from typing import Annotated, Any, Dict, List, Literal, Union
 from typing_extensions import TypedDict
+import uuid
 
-from langchain_aws import ChatBedrockConverse
-from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolCall, ToolMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import END, START, StateGraph
 from langgraph.graph.message import add_messages
 from langgraph.graph.state import CompiledGraph
 
-from approval_expert.tools import TOOLS_ALL, TOOLS_TERMINAL
+from approval_expert.classifier import classify_approval_response
+from approval_expert.tools import approval_denied_tool, approval_granted_tool, TOOLS_ALL, TOOLS_TERMINAL
+from utilities.checkpointing import get_default_checkpointer
+from utilities.models import MODEL_ROUTER, ModelConfig, ModelRoute
+from utilities.prompt_caching import PromptCachingConfig
+from utilities.startup import Lazy
+from utilities.tracing import trace_node, TRACER
 
 logger = logging.getLogger(__name__)
 
 
-# Define our LLM
-llm = ChatBedrockConverse(
-    model="anthropic.claude-3-5-sonnet-20240620-v1:0",
-    temperature=0,
-    max_tokens=4096,
-    region_name="us-west-2"
+# Classifying the operator's reply is a small task, so a small, fast model handles it, falling back to a larger model
+# if it's slow or throttled.  Override with utilities.models.configure_model_routes().
+APPROVAL_MODEL_ROUTE = ModelRoute(
+    primary=ModelConfig(model_id="anthropic.claude-3-haiku-20240307-v1:0", max_tokens=1024, timeout_seconds=10,
+        max_attempts=2),
+    fallback=ModelConfig(model_id="anthropic.claude-3-5-sonnet-20240620-v1:0", max_tokens=1024)
 )
-llm_with_tools = llm.bind_tools(TOOLS_ALL)
+MODEL_ROUTER.register("node_invoke_llm_approval", APPROVAL_MODEL_ROUTE, TOOLS_ALL)
+
+# Bedrock prompt caching of the system prompt, tool schemas, and recent history.  Off by default, as not every model
+# supports it.
+PROMPT_CACHING = PromptCachingConfig(enabled=False)
+
+# Clear approvals and denials are classified without calling the LLM; see approval_expert.classifier
+FAST_PATH_ENABLED = True
 
 # Define the state our graph will be operating on
 class ApprovalState(TypedDict):
@@ -40,20 +52,8 @@ def approval_state_to_json(state: ApprovalState) -> Dict[str, Any]:
         "approval_outcome": state.get("approval_outcome", None)
     }
     
-def trace_approval_node(func: Callable[[ApprovalState], Dict[str, Any]]) -> Callable[[ApprovalState], Dict[str, Any]]:
-    @wraps(func)
-    def wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
-        logging.info(f"Entering node: {func.__name__}")
-        state_json = approval_state_to_json(state)
-        logging.debug(f"Starting state: {str(state_json)}")
-        
-        result = func(state)
-        
-        logging.debug(f"Output of {func.__name__}: {result}")
-        
-        return result
-    
-    return wrapper
+# Log node entry/exit and record a tracing span for each node
+trace_approval_node = trace_node(approval_state_to_json)
 
 # Set up our tools
 tools_terminal_by_name = {tool.name: tool for tool in TOOLS_TERMINAL}
@@ -61,7 +61,32 @@ tools_terminal_by_name = {tool.name: tool for tool in TOOLS_TERMINAL}
 # Define our Graph
 approval_graph = StateGraph(ApprovalState)
 
-# Set up our graph nodes
+# Set up our graph nodes.  Each node has both a sync and an async implementation so that the same compiled graph
+# can be driven by either stream() or astream().
+@trace_approval_node
+def node_classify_fast_path(state: ApprovalState):
+    """
+    Node to classify the human operator's latest reply without the LLM.  If the reply is a clear approval or denial,
+    we record the decision as a terminal tool call, just as the LLM would have.
+    """
+    # Nodes must write something, so the no-decision case writes the same handoff flag the LLM node does
+    no_decision = {"is_approval_handoff": False}
+    last_turn = state["approval_turns"][-1]
+    if not FAST_PATH_ENABLED or not isinstance(last_turn, HumanMessage):
+        return no_decision
+
+    classification = classify_approval_response(last_turn.content)
+    logger.info(f"Fast-path classification: {classification}")
+    if classification == "approved":
+        tool_name = approval_granted_tool.name
+    elif classification == "denied":
+        tool_name = approval_denied_tool.name
+    else:
+        return no_decision
+
+    decision = AIMessage(content="", tool_calls=[{"name": tool_name, "args": {}, "id": f"fast_path_{uuid.uuid4().hex}"}])
+    return {"approval_turns": [decision], "is_approval_handoff": False}
+
 @trace_approval_node
 def node_invoke_llm_approval(state: ApprovalState):
     """
@@ -70,24 +95,43 @@ def node_invoke_llm_approval(state: ApprovalState):
     logger.info(state["approval_turns"])
 
     approval_turns = state['approval_turns']
-    response = llm_with_tools.invoke(approval_turns)
+    response = MODEL_ROUTER.invoke("node_invoke_llm_approval", approval_turns, PROMPT_CACHING)
     return {"approval_turns": [response], "is_approval_handoff": False}
 
+@trace_approval_node
+async def node_invoke_llm_approval_async(state: ApprovalState):
+    logger.info(state["approval_turns"])
+
+    approval_turns = state['approval_turns']
+    response = await MODEL_ROUTER.ainvoke("node_invoke_llm_approval", approval_turns, PROMPT_CACHING)
+    return {"approval_turns": [response], "is_approval_handoff": False}
+
+def _terminal_decision_results(tool_call: ToolCall, decision: str) -> Dict[str, Any]:
+    result = []
+    result.append(ToolMessage(content=decision, tool_call_id=tool_call["id"], name=tool_call["name"]))
+    result.append(AIMessage(content=decision))
+    return {"approval_in_progress": False, "approval_turns": result, "approval_outcome": tool_call["name"]}
+
 @trace_approval_node
 def node_terminal_decision(state: ApprovalState):
     """
     Node to invoke the terminal tool and store the decision made by the LLM in the state
     """
-    result = []
     tool_call = state["approval_turns"][-1].tool_calls[-1]
     tool = tools_terminal_by_name[tool_call["name"]]
     decision = tool.invoke(tool_call["args"])
-    result.append(ToolMessage(content=decision, tool_call_id=tool_call["id"], name=tool.name))
-    result.append(AIMessage(content=decision))
-    return {"approval_in_progress": False, "approval_turns": result, "approval_outcome": tool_call["name"]}
+    return _terminal_decision_results(tool_call, decision)
 
-approval_graph.add_node("node_invoke_llm_approval", node_invoke_llm_approval)
-approval_graph.add_node("node_terminal_decision", node_terminal_decision)
+@trace_approval_node
+async def node_terminal_decision_async(state: ApprovalState):
+    tool_call = state["approval_turns"][-1].tool_calls[-1]
+    tool = tools_terminal_by_name[tool_call["name"]]
+    decision = await tool.ainvoke(tool_call["args"])
+    return _terminal_decision_results(tool_call, decision)
+
+approval_graph.add_node("node_classify_fast_path", node_classify_fast_path)
+approval_graph.add_node("node_invoke_llm_approval", RunnableLambda(node_invoke_llm_approval, afunc=node_invoke_llm_approval_async))
+approval_graph.add_node("node_terminal_decision", RunnableLambda(node_terminal_decision, afunc=node_terminal_decision_async))
 
 # Define our graph edges
 def next_node(state: ApprovalState) -> Literal["node_terminal_decision", END]:
@@ -102,7 +146,17 @@ def next_node(state: ApprovalState) -> Literal["node_terminal_decision", END]:
     # Otherwise, we stop (reply to the user)
     return END
 
-approval_graph.add_edge(START, "node_invoke_llm_approval")
+def next_node_after_fast_path(state: ApprovalState) -> Literal["node_terminal_decision", "node_invoke_llm_approval"]:
+    # The fast path reached a decision, so skip the LLM
+    if isinstance(state["approval_turns"][-1], AIMessage) and next_node(state) == "node_terminal_decision":
+        return "node_terminal_decision"
+    return "node_invoke_llm_approval"
+
+approval_graph.add_edge(START, "node_classify_fast_path")
+approval_graph.add_conditional_edges(
+    "node_classify_fast_path",
+    next_node_after_fast_path
+)
 
 approval_graph.add_conditional_edges(
     "node_invoke_llm_approval",
@@ -112,27 +166,48 @@ approval_graph.add_edge("node_terminal_decision", END)
 
 APPROVAL_GRAPH = approval_graph
 
-# Initialize memory to persist state between graph runs
-checkpointer = MemorySaver()
-
 # Finally, compile the graph into a LangChain Runnable
-def _create_runner(workflow: CompiledGraph):
-    def run_workflow(approval_turns: List[BaseMessage], thread: int) -> Dict[str, any]:
-        states = workflow.stream(
-            {"approval_turns": approval_turns},
-            config={"configurable": {"thread_id": thread}},
-            stream_mode="values"
-        )
-
-        final_state = None
-        for state in states:
-            if "approval_turns" in state:
-                state["approval_turns"][-1].pretty_print()
-                logger.info(state["approval_turns"][-1].to_json())
-            final_state = state
+def _create_runner(workflow: Union[CompiledGraph, Lazy[CompiledGraph]]):
+    def run_workflow(approval_turns: List[BaseMessage], thread: Union[int, str]) -> Dict[str, any]:
+        with TRACER.span("APPROVAL_GRAPH", "graph", thread_id=thread):
+            states = workflow.stream(
+                {"approval_turns": approval_turns},
+                config={"configurable": {"thread_id": thread}},
+                stream_mode="values"
+            )
+
+            final_state = None
+            for state in states:
+                if "approval_turns" in state:
+                    state["approval_turns"][-1].pretty_print()
+                    logger.info(state["approval_turns"][-1].to_json())
+                final_state = state
+
+        return final_state
+
+    return run_workflow
+
+def _create_async_runner(workflow: Union[CompiledGraph, Lazy[CompiledGraph]]):
+    async def run_workflow(approval_turns: List[BaseMessage], thread: Union[int, str]) -> Dict[str, any]:
+        with TRACER.span("APPROVAL_GRAPH", "graph", thread_id=thread):
+            states = workflow.astream(
+                {"approval_turns": approval_turns},
+                config={"configurable": {"thread_id": thread}},
+                stream_mode="values"
+            )
+
+            final_state = None
+            async for state in states:
+                if "approval_turns" in state:
+                    logger.info(state["approval_turns"][-1].to_json())
+                final_state = state
 
         return final_state
 
     return run_workflow
 
-APPROVAL_GRAPH_RUNNER = _create_runner(APPROVAL_GRAPH.compile(checkpointer=checkpointer))
\ No newline at end of file
+# Compiled, with the default checkpointer to persist state between graph runs, on first use
+_compiled_approval_graph: Lazy[CompiledGraph] = Lazy("compile approval graph",
+    lambda: APPROVAL_GRAPH.compile(checkpointer=get_default_checkpointer()))
+APPROVAL_GRAPH_RUNNER = _create_runner(_compiled_approval_graph)
+APPROVAL_GRAPH_ASYNC_RUNNER = _create_async_runner(_compiled_approval_graph)
\ No newline at end of file
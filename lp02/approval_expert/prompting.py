@@ -26,12 +26,20 @@ guidelines, surrounded by the <guidelines> tags:
 
 Examples of responses to classify as "approved" are below surrounded by the <approval_examples> tags:
 <approval_examples>
-"Yes, I approve."
-"yeah, that's fine."
-"Sure, go ahead."
-"Approved"
+{approval_examples}
 </approval_examples>
 """
 
+# Also used to build the fast-path classifier in approval_expert.classifier
+APPROVAL_EXAMPLES = [
+    "Yes, I approve.",
+    "yeah, that's fine.",
+    "Sure, go ahead.",
+    "Approved"
+]
+
 def get_system_message(operation_details: str) -> SystemMessage:
-    return SystemMessage(content=message_string.format(operation=operation_details))
\ No newline at end of file
+    return SystemMessage(content=message_string.format(
+        operation=operation_details,
+        approval_examples="\n".join(f'"{example}"' for example in APPROVAL_EXAMPLES)
+    ))
\ No newline at end of file
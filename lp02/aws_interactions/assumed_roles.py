@@ -0,0 +1,216 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from botocore.credentials import RefreshableCredentials
+
+from utilities.caching import CacheStats
+
+logger = logging.getLogger(__name__)
+
+#
+# Credentials for roles we assume in other accounts.  Our domains live in many accounts, so each tool call may need a
+# different role; assuming it on every call would add an STS round trip to each, and letting the credentials run out
+# would stall whichever call noticed.  Instead the credentials for each (source identity, role, region) are cached, and
+# a background thread assumes the role again well before they expire.
+#
+# Boto clients get the credentials as botocore RefreshableCredentials.  botocore asks for new credentials 15 minutes
+# before expiry (and blocks on them at 10), so we refresh ahead of that: when botocore asks, the cache already has
+# fresh ones to hand over.
+#
+
+ROLE_SESSION_NAME = "lp02-cloudwatch-expert"
+ROLE_DURATION_SECONDS = 60 * 60
+
+# How long before expiry the background thread assumes the role again; must be more than botocore's 15 minutes
+REFRESH_AHEAD = timedelta(minutes=20)
+# Roles nobody has used for this long are dropped rather than refreshed; they're assumed again on next use
+ROLE_IDLE_TIMEOUT = timedelta(hours=2)
+# How long to wait before retrying a failed background refresh, doubling on each failure up to the max
+REFRESH_RETRY_INITIAL = timedelta(seconds=30)
+REFRESH_RETRY_MAX = timedelta(minutes=5)
+
+# (AWS profile, region, compute mode, role ARN)
+RoleKey = Tuple[str, Optional[str], bool, str]
+StsClientFactory = Callable[[str, Optional[str], bool], Any]
+
+@dataclass
+class _RoleCredentials:
+    metadata: Dict[str, str]  # In the form botocore's RefreshableCredentials expects
+    expiration: datetime
+    next_refresh: datetime
+    last_used: datetime
+    refresh_failures: int = 0
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+class AssumedRoleCredentialCache:
+    def __init__(self, sts_client_factory: StsClientFactory, refresh_ahead: timedelta = REFRESH_AHEAD,
+            idle_timeout: timedelta = ROLE_IDLE_TIMEOUT):
+        """
+        Thread-safe cache of assumed role credentials, refreshed in the background.  sts_client_factory returns the
+        STS client of the source identity (profile, region, compute mode) to assume roles with.
+        """
+        self._sts_client_factory = sts_client_factory
+        self.refresh_ahead = refresh_ahead
+        self.idle_timeout = idle_timeout
+        self._condition = threading.Condition()
+        self._entries: Dict[RoleKey, _RoleCredentials] = {}
+        self._key_locks: Dict[RoleKey, threading.Lock] = {}
+        self._refresher: Optional[threading.Thread] = None
+        self.stats = CacheStats()
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def _assume_role(self, key: RoleKey) -> _RoleCredentials:
+        aws_profile, aws_region, aws_compute, role_arn = key
+        sts_client = self._sts_client_factory(aws_profile, aws_region, aws_compute)
+        response = sts_client.assume_role(RoleArn=role_arn, RoleSessionName=ROLE_SESSION_NAME,
+            DurationSeconds=ROLE_DURATION_SECONDS)
+        credentials = response["Credentials"]
+        expiration = credentials["Expiration"]
+        logger.info(f"Assumed role {role_arn} in {aws_region}; credentials expire at {expiration.isoformat()}")
+        now = _now()
+        return _RoleCredentials(
+            metadata={
+                "access_key": credentials["AccessKeyId"],
+                "secret_key": credentials["SecretAccessKey"],
+                "token": credentials["SessionToken"],
+                "expiry_time": expiration.isoformat(),
+            },
+            expiration=expiration,
+            # Short-lived credentials are refreshed halfway through instead
+            next_refresh=max(expiration - self.refresh_ahead, now + (expiration - now) / 2),
+            last_used=now,
+        )
+
+    def _get_metadata(self, key: RoleKey) -> Dict[str, str]:
+        """
+        The current credentials for the role, assuming it now only if there are none that are still good.
+        """
+        with self._condition:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expiration - self.refresh_ahead / 2 > _now():
+                entry.last_used = _now()
+                self.stats.record_hit()
+                return entry.metadata
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one thread assumes each role; the rest wait for its answer
+        with key_lock:
+            with self._condition:
+                entry = self._entries.get(key)
+                if entry is not None and entry.expiration - self.refresh_ahead / 2 > _now():
+                    entry.last_used = _now()
+                    self.stats.record_hit()
+                    return entry.metadata
+            self.stats.record_miss()
+            entry = self._assume_role(key)
+            with self._condition:
+                self._entries[key] = entry
+                self._ensure_refresher()
+                self._condition.notify_all()
+            return entry.metadata
+
+    def get_credentials(self, aws_profile: str, aws_region: Optional[str], aws_compute: bool,
+            role_arn: str) -> RefreshableCredentials:
+        """
+        Returns credentials for the role to build Boto sessions with.  Whenever botocore decides they need refreshing,
+        it gets the cache's current ones.
+        """
+        key = (aws_profile, aws_region, aws_compute, role_arn)
+        return RefreshableCredentials.create_from_metadata(
+            metadata=self._get_metadata(key),
+            refresh_using=lambda: self._get_metadata(key),
+            method="assume-role-lp02"
+        )
+
+    def _ensure_refresher(self):
+        # Called with the condition held
+        if self._refresher is None or not self._refresher.is_alive():
+            self._refresher = threading.Thread(target=self._refresh_loop, name="assumed-role-refresher", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            with self._condition:
+                now = _now()
+                for key in [key for key, entry in self._entries.items() if now - entry.last_used > self.idle_timeout]:
+                    logger.debug(f"Dropping idle credentials for role {key[3]}")
+                    del self._entries[key]
+                due = [key for key, entry in self._entries.items() if entry.next_refresh <= now]
+                if not due:
+                    next_refresh = min((entry.next_refresh for entry in self._entries.values()), default=None)
+                    timeout = (next_refresh - now).total_seconds() if next_refresh else None
+                    self._condition.wait(timeout)
+                    continue
+
+            for key in due:
+                self._refresh(key)
+
+    def _refresh(self, key: RoleKey):
+        with self._key_locks.setdefault(key, threading.Lock()):
+            try:
+                refreshed = self._assume_role(key)
+            except Exception as e:
+                with self._condition:
+                    entry = self._entries.get(key)
+                    if entry is None:
+                        return
+                    entry.refresh_failures += 1
+                    retry_in = min(REFRESH_RETRY_INITIAL * 2 ** (entry.refresh_failures - 1), REFRESH_RETRY_MAX)
+                    entry.next_refresh = _now() + retry_in
+                    self.refresh_failures += 1
+                logger.warning(f"Failed to refresh credentials for role {key[3]} (retrying in {retry_in}): {e}")
+                return
+
+            with self._condition:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    refreshed.last_used = entry.last_used
+                    self._entries[key] = refreshed
+                    self.refreshes += 1
+
+    def invalidate(self):
+        with self._condition:
+            self._entries.clear()
+            self._condition.notify_all()
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "roles": len(self._entries),
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            **self.stats.to_json(),
+        }
+
+#
+# Which role to assume in each account
+#
+
+CROSS_ACCOUNT_ROLE_NAME_ENV_VAR = "LP02_CROSS_ACCOUNT_ROLE_NAME"
+
+@dataclass
+class CrossAccountConfig:
+    """
+    role_name: the role to assume in every account other than our own, e.g. "CloudWatchExpertReadOnly"; None uses
+        our own credentials everywhere, unless the account is in role_arns
+    role_arns: account ID -> the ARN of the role to assume there, for accounts that don't follow role_name
+    """
+    role_name: Optional[str] = field(default_factory=lambda: os.environ.get(CROSS_ACCOUNT_ROLE_NAME_ENV_VAR))
+    role_arns: Dict[str, str] = field(default_factory=dict)
+
+    def get_role_arn(self, account_id: str, own_account_id: Callable[[], str], partition: str = "aws") -> Optional[str]:
+        """
+        The role to assume to work in the account, or None to use our own credentials.  own_account_id is only called
+        when it matters.
+        """
+        if account_id in self.role_arns:
+            return self.role_arns[account_id]
+        if self.role_name is None or account_id == own_account_id():
+            return None
+        return f"arn:{partition}:iam::{account_id}:role/{self.role_name}"
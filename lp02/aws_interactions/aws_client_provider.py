@@ -1,97 +1,318 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 import logging
-from typing import Dict
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
 
 import boto3
+import botocore.session
+from botocore.config import Config
+from botocore.credentials import Credentials, RefreshableCredentials
+
+from aws_interactions.assumed_roles import AssumedRoleCredentialCache, CrossAccountConfig
+from aws_interactions.rate_limiting import RATE_LIMITER
+from utilities.caching import CacheStats, TtlLruCache
+from utilities.tracing import TRACER
 
 logger = logging.getLogger(__name__)
 
+# The number of connections each cached client may hold open.  Because clients are shared by every thread in the
+# process, this needs to be comfortably larger than botocore's default of 10.
+CLIENT_MAX_POOL_CONNECTIONS = 50
+
+# How close to credential expiry we throw away a cached session and its clients.  botocore refreshes credentials in
+# place 15 minutes ahead of expiry, so credentials this close to it haven't been refreshing.
+CREDENTIAL_REFRESH_MARGIN = timedelta(minutes=5)
+
+SessionKey = Tuple[str, Optional[str], bool, Optional[str]]
+ClientKey = Tuple[str, Optional[str], str, bool, Optional[float], Optional[int], Optional[str]]
+
+def _start_aws_span(model: Any, context: Dict[str, Any], **kwargs):
+    if TRACER.enabled:
+        context["lp02_span"] = TRACER.start_span(
+            f"{model.service_model.service_name}.{model.name}", "aws", region=context.get("client_region")
+        )
+
+def _end_aws_span(context: Dict[str, Any], exception: Exception = None, http_response: Any = None, **kwargs):
+    span = context.pop("lp02_span", None)
+    if span is not None and http_response is not None:
+        span.set_attribute("http_status_code", http_response.status_code)
+    TRACER.end_span(span, error=exception)
+
+def _register_tracing_hooks(client: Any):
+    """
+    Records an "aws" tracing span for every API call the client makes.  The handlers do nothing while tracing is off.
+    """
+    client.meta.events.register("before-call", _start_aws_span)
+    client.meta.events.register("after-call", _end_aws_span)
+    client.meta.events.register("after-call-error", _end_aws_span)
+
+@dataclass
+class _CachedClient:
+    client: Any
+    credentials: Optional[Credentials]
+    is_assumed_role: bool
+
+class AwsClientCache:
+    def __init__(self, max_pool_connections: int = CLIENT_MAX_POOL_CONNECTIONS):
+        """
+        Process-wide, thread-safe cache of Boto Sessions and Clients.  Sessions are keyed by (profile, region,
+        compute mode, assumed role) and Clients by (profile, region, service, compute mode, timeout, max attempts,
+        assumed role).  Boto Clients are thread-safe, so a single Client (and its HTTPS connection pool) is shared by
+        every caller asking for the same key.  Calls made with the Clients are traced, and rate limited as set up in
+        rate_limiting.py.
+
+        Boto Sessions are not thread-safe, so all Session access happens under the cache's lock.
+        """
+        self._lock = threading.RLock()
+        self._sessions: Dict[SessionKey, boto3.Session] = {}
+        self._clients: Dict[ClientKey, _CachedClient] = {}
+        self._client_config = Config(max_pool_connections=max_pool_connections)
+        self.stats = CacheStats()
+        # Roles are assumed with the STS client of the identity we started from
+        self.role_credentials = AssumedRoleCredentialCache(
+            lambda aws_profile, aws_region, aws_compute: self.get_client(aws_profile, aws_region, "sts", aws_compute)
+        )
+
+    def _build_session(self, aws_profile: str, aws_region: Optional[str], aws_compute: bool,
+            role_credentials: Optional[RefreshableCredentials] = None) -> boto3.Session:
+        if role_credentials is not None:
+            botocore_session = botocore.session.get_session()
+            botocore_session._credentials = role_credentials
+            return boto3.Session(botocore_session=botocore_session, region_name=aws_region)
+        if aws_compute:
+            return boto3.Session()
+        return boto3.Session(profile_name=aws_profile, region_name=aws_region)
+
+    def get_session(self, aws_profile: str, aws_region: Optional[str], aws_compute: bool,
+            role_arn: Optional[str] = None) -> boto3.Session:
+        key = (aws_profile, aws_region, aws_compute, role_arn)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                return session
+
+        # Assuming the role needs an STS client from this cache (possibly on the background refresher's thread), so
+        # it has to happen outside the lock
+        role_credentials = None
+        if role_arn is not None:
+            role_credentials = self.role_credentials.get_credentials(aws_profile, aws_region, aws_compute, role_arn)
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                logger.debug(f"Creating new Boto Session for {key}")
+                session = self._build_session(aws_profile, aws_region, aws_compute, role_credentials)
+                self._sessions[key] = session
+            return session
+
+    def _is_stale(self, entry: _CachedClient) -> bool:
+        # If we had no credentials when the client was made, they may have shown up since (e.g. an SSO login)
+        if entry.credentials is None:
+            return True
+        # Refreshable credentials (SSO, instance profiles, etc) are refreshed in place by botocore, the next time
+        # they're used once they're within 15 minutes of expiry.  If they're any closer than our margin, either the
+        # client has sat idle or refreshing is failing (e.g. the source profile's own credentials have expired), so
+        # start again from a new Session.  Static credentials have no expiry; assumed role credentials are kept
+        # fresh by role_credentials.
+        expiration = getattr(entry.credentials, "_expiry_time", None)
+        if expiration is not None and not entry.is_assumed_role:
+            return expiration - CREDENTIAL_REFRESH_MARGIN <= datetime.now(timezone.utc)
+        return False
+
+    def _get_account_id(self, aws_profile: str, aws_region: Optional[str], aws_compute: bool,
+            role_arn: Optional[str]) -> str:
+        # Only used to pick a client's rate limits, so failing to look it up shouldn't fail the call
+        if role_arn is not None:
+            return role_arn.split(":")[4]
+        try:
+            return AwsClientProvider(aws_profile=aws_profile, aws_region=aws_region, aws_compute=aws_compute) \
+                .get_account_id()
+        except Exception as e:
+            logger.warning(f"Unable to look up the account for profile {aws_profile}; rate limiting by profile: {e}")
+            return f"profile:{aws_profile}"
+
+    def _create_client(self, session: boto3.Session, service: str, timeout_seconds: Optional[float],
+            max_attempts: Optional[int], account_resolver: Callable[[], str], is_assumed_role: bool) -> _CachedClient:
+        credentials = session.get_credentials()
+
+        config = self._client_config
+        if timeout_seconds is not None or max_attempts is not None:
+            config = config.merge(Config(
+                read_timeout=timeout_seconds or 60,
+                connect_timeout=timeout_seconds or 60,
+                retries={"max_attempts": max_attempts or 3, "mode": "standard"}
+            ))
+
+        client = session.client(service, config=config)
+        _register_tracing_hooks(client)
+        RATE_LIMITER.register(client, service, account_resolver)
+        return _CachedClient(client=client, credentials=credentials, is_assumed_role=is_assumed_role)
+
+    def get_client(self, aws_profile: str, aws_region: Optional[str], service: str, aws_compute: bool,
+            timeout_seconds: Optional[float] = None, max_attempts: Optional[int] = None,
+            role_arn: Optional[str] = None) -> Any:
+        """
+        timeout_seconds/max_attempts: the client's connect/read timeout and how many times it tries each call; None
+            uses the Boto defaults.  Clients with different settings are cached separately.
+        role_arn: a role to assume for the client, e.g. in another account; None uses the profile's own credentials
+        """
+        key = (aws_profile, aws_region, service, aws_compute, timeout_seconds, max_attempts, role_arn)
+        # Make sure the Session exists before taking the lock; see get_session()
+        session = self.get_session(aws_profile, aws_region, aws_compute, role_arn)
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None and not self._is_stale(entry):
+                self.stats.record_hit()
+                return entry.client
+
+            self.stats.record_miss()
+            if entry is not None:
+                logger.debug(f"Credentials for cached client {key} are missing or expiring; rebuilding")
+                self.stats.record_eviction()
+                # Drop the Session too so that credential resolution starts from scratch.  Assumed role credentials
+                # refresh themselves, so those Sessions are never the problem.
+                if role_arn is None:
+                    self._sessions.pop((aws_profile, aws_region, aws_compute, role_arn), None)
+                    session = self.get_session(aws_profile, aws_region, aws_compute, role_arn)
+
+            entry = self._create_client(session, service, timeout_seconds, max_attempts,
+                lambda: self._get_account_id(aws_profile, aws_region, aws_compute, role_arn), role_arn is not None)
+            self._clients[key] = entry
+            return entry.client
+
+    def create_resource(self, aws_profile: str, aws_region: Optional[str], service: str, aws_compute: bool,
+            role_arn: Optional[str] = None) -> Any:
+        """
+        Resources are not thread-safe, so they are never cached, but they are still built from the cached Session.
+        """
+        session = self.get_session(aws_profile, aws_region, aws_compute, role_arn)
+        with self._lock:
+            return session.resource(service, region_name=aws_region, config=self._client_config)
+
+    def invalidate(self, aws_profile: str = None, aws_region: str = None):
+        """
+        Drop cached Sessions and Clients.  If a profile and/or region is given, only matching entries are dropped.
+        """
+        def matches(profile: str, region: Optional[str]) -> bool:
+            return (aws_profile is None or profile == aws_profile) and (aws_region is None or region == aws_region)
+
+        with self._lock:
+            for key in [key for key in self._clients if matches(key[0], key[1])]:
+                del self._clients[key]
+            for key in [key for key in self._sessions if matches(key[0], key[1])]:
+                del self._sessions[key]
+        self.role_credentials.invalidate()
+
+AWS_CLIENT_CACHE = AwsClientCache()
+
+CROSS_ACCOUNT_CONFIG = CrossAccountConfig()
+
+def configure_cross_account_roles(config: CrossAccountConfig):
+    """
+    Sets the roles to assume in other accounts, e.g.
+    configure_cross_account_roles(CrossAccountConfig(role_name="CloudWatchExpertReadOnly")).  The role name can also
+    be set with the LP02_CROSS_ACCOUNT_ROLE_NAME environment variable.
+    """
+    global CROSS_ACCOUNT_CONFIG
+    CROSS_ACCOUNT_CONFIG = config
+
+ACCOUNT_ID_CACHE_TTL_SECONDS = 60 * 60
+
+# (profile, compute mode, role) -> the account ID those credentials belong to
+ACCOUNT_ID_CACHE = TtlLruCache(max_entries=256, ttl_seconds=ACCOUNT_ID_CACHE_TTL_SECONDS)
+
+def get_partition(region: str) -> str:
+    if region.startswith("cn-"):
+        return "aws-cn"
+    if region.startswith("us-gov-"):
+        return "aws-us-gov"
+    return "aws"
+
 class AwsClientProvider:
-    def __init__(self, aws_profile: str = "default", aws_region: str = None, aws_compute=False):
+    def __init__(self, aws_profile: str = "default", aws_region: str = None, aws_compute=False,
+            assume_role_arn: str = None):
         """
-        Wrapper around creation of Boto AWS Clients.
+        Wrapper around creation of Boto AWS Clients.  Sessions and Clients are pulled from the process-wide
+        AWS_CLIENT_CACHE, so creating a new provider per call is cheap.
         aws_profile: if not provided, will use "default"
         aws_region: if not provided, will use the default region in your local AWS Config
         aws_compute: if True, will not use the profile, and will use the local AWS Config
+        assume_role_arn: if provided, clients use this role's credentials, assumed from the above and kept fresh in
+            the background
         """
         self._aws_profile = aws_profile
         self._aws_region = aws_region
         self._aws_compute = aws_compute
-    
-    def _get_assumed_credentials(self, current_session: boto3.Session) -> Dict[str, str]:
-        sts_client = current_session.client("sts")
-
-        # Assume the role in the target account
-        assumed_role_object = sts_client.assume_role(
-            RoleArn=self._assume_role_arn,
-            RoleSessionName="ArkimeAwsAioCLI"
-        )
+        self._assume_role_arn = assume_role_arn
+
+    @classmethod
+    def for_account(cls, account_id: str, aws_region: str, aws_profile: str = "default",
+            aws_compute=False) -> "AwsClientProvider":
+        """
+        A provider for working in the given account: it assumes the account's role from CROSS_ACCOUNT_CONFIG, or uses
+        our own credentials if the account is our own or has no role.
+        """
+        own_provider = cls(aws_profile=aws_profile, aws_region=aws_region, aws_compute=aws_compute)
+        role_arn = CROSS_ACCOUNT_CONFIG.get_role_arn(account_id, own_provider.get_account_id, get_partition(aws_region))
+        return cls(aws_profile=aws_profile, aws_region=aws_region, aws_compute=aws_compute, assume_role_arn=role_arn)
 
-        return assumed_role_object["Credentials"]
+    def get_account_id(self) -> str:
+        """
+        The account the provider's credentials belong to, looked up with STS at most once an hour.
+        """
+        key = (self._aws_profile, self._aws_compute, self._assume_role_arn)
+        account_id = ACCOUNT_ID_CACHE.get(key)
+        if account_id is None:
+            account_id = self.get_sts().get_caller_identity()["Account"]
+            ACCOUNT_ID_CACHE.put(key, account_id)
+        return account_id
 
     def _get_session(self) -> boto3.Session:
-        if self._aws_compute:
-            current_account_session = boto3.Session()
-        else:
-            current_account_session = boto3.Session(profile_name=self._aws_profile, region_name=self._aws_region)
-        
-        return current_account_session
+        return AWS_CLIENT_CACHE.get_session(self._aws_profile, self._aws_region, self._aws_compute,
+            self._assume_role_arn)
+
+    def _get_client(self, service: str):
+        return AWS_CLIENT_CACHE.get_client(self._aws_profile, self._aws_region, service, self._aws_compute,
+            role_arn=self._assume_role_arn)
 
     def get_acm(self):
-        session = self._get_session()
-        client = session.client("acm")
-        return client
+        return self._get_client("acm")
+
+    def get_bedrock_runtime(self, timeout_seconds: Optional[float] = None, max_attempts: Optional[int] = None):
+        return AWS_CLIENT_CACHE.get_client(self._aws_profile, self._aws_region, "bedrock-runtime", self._aws_compute,
+            timeout_seconds, max_attempts, self._assume_role_arn)
 
     def get_cloudwatch(self):
-        session = self._get_session()
-        client = session.client("cloudwatch")
-        return client 
+        return self._get_client("cloudwatch")
 
     def get_ec2(self):
-        session = self._get_session()
-        client = session.client("ec2")
-        return client 
+        return self._get_client("ec2")
 
     def get_ecs(self):
-        session = self._get_session()
-        client = session.client("ecs")
-        return client
+        return self._get_client("ecs")
 
     def get_events(self):
-        session = self._get_session()
-        client = session.client("events")
-        return client
+        return self._get_client("events")
 
     def get_iam(self):
-        session = self._get_session()
-        client = session.client("iam")
-        return client
+        return self._get_client("iam")
 
     def get_opensearch(self):
-        session = self._get_session()
-        client = session.client("opensearch")
-        return client
+        return self._get_client("opensearch")
 
     def get_s3(self):
-        session = self._get_session()
-        client = session.client("s3")
-        return client
+        return self._get_client("s3")
 
     def get_s3_resource(self):
-        boto3.setup_default_session(profile_name=self._aws_profile)
-        resource = boto3.resource("s3", region_name=self._aws_region)
-        return resource
+        return AWS_CLIENT_CACHE.create_resource(self._aws_profile, self._aws_region, "s3", self._aws_compute,
+            self._assume_role_arn)
 
     def get_secretsmanager(self):
-        session = self._get_session()
-        client = session.client("secretsmanager")
-        return client
+        return self._get_client("secretsmanager")
 
     def get_ssm(self):
-        session = self._get_session()
-        client = session.client("ssm")
-        return client
+        return self._get_client("ssm")
 
     def get_sts(self):
-        session = self._get_session()
-        client = session.client("sts")
-        return client
\ No newline at end of file
+        return self._get_client("sts")
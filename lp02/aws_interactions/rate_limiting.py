@@ -0,0 +1,260 @@
+from dataclasses import dataclass, field
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+#
+# Client-side rate limiting of AWS API calls.  AWS enforces its TPS quotas per account, region, and API, and every
+# session in the process shares them; without coordination, many sessions paging through ListMetrics at once get
+# throttled, each retries on its own schedule, and the retries are throttled in turn until the errors reach the LLM.
+#
+# Instead, every call to a rate-limited service takes a token from a process-wide bucket for its (account, region,
+# service, API) first.  Buckets start at the API's quota and adapt: a throttling error cuts the bucket's rate and pauses
+# everyone using it for a jittered, exponentially growing interval, and each success wins some of the rate back, so
+# throughput settles just under whatever the account actually allows.
+#
+# The limiter hooks into botocore's events on the clients AwsClientCache creates, so paginators, waiters, and botocore's
+# own retries all go through it.
+#
+
+# Default TPS quotas of the CloudWatch APIs we call; APIs not listed use RateLimitConfig.default_rate.  These are per
+# process, so lower them when several processes share an account.
+CLOUDWATCH_OPERATION_RATES = {
+    "GetDashboard": 10.0,
+    "GetMetricData": 50.0,
+    "ListDashboards": 10.0,
+    "ListMetrics": 25.0,
+    "PutDashboard": 10.0,
+}
+
+THROTTLING_ERROR_CODES = {
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "SlowDown",
+    "ThrottledException",
+    "Throttling",
+    "ThrottlingException",
+    "TooManyRequestsException",
+}
+
+# How a bucket's rate adapts: multiplied by THROTTLE_RATE_FACTOR on each throttle (but never below
+# MIN_RATE_FRACTION of the quota), and raised by RECOVERY_RATE_FRACTION of the quota on each success
+THROTTLE_RATE_FACTOR = 0.7
+MIN_RATE_FRACTION = 0.05
+RECOVERY_RATE_FRACTION = 0.02
+
+# How long a throttle pauses a bucket: doubling with each throttle in a row, up to the max, then jittered down by up to
+# half so that processes sharing the quota don't all come back at once
+BACKOFF_INITIAL_SECONDS = 0.25
+BACKOFF_MAX_SECONDS = 20.0
+
+# (account ID, region, service, API)
+BucketKey = Tuple[str, Optional[str], str, str]
+
+@dataclass
+class RateLimitConfig:
+    """
+    enabled: if False, calls are never delayed
+    services: the services (as in boto3.client(service)) whose calls are rate limited
+    default_rate: the TPS quota of APIs without an entry in operation_rates
+    operation_rates: API name -> TPS quota
+    """
+    enabled: bool = True
+    services: Set[str] = field(default_factory=lambda: {"cloudwatch"})
+    default_rate: float = 10.0
+    operation_rates: Dict[str, float] = field(default_factory=lambda: dict(CLOUDWATCH_OPERATION_RATES))
+
+    def get_rate(self, operation: str) -> float:
+        return self.operation_rates.get(operation, self.default_rate)
+
+class TokenBucket:
+    def __init__(self, max_rate: float):
+        """
+        Thread-safe token bucket refilled at an adaptive rate of up to max_rate tokens per second, holding at most a
+        second's worth.  Also keeps the queue depth and wait time metrics for the calls that use it.
+        """
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.capacity = max(1.0, max_rate)
+        self._condition = threading.Condition()
+        self._tokens = self.capacity
+        # When the tokens were last topped up; in the future while a throttle pause is in effect
+        self._last_refill = time.monotonic()
+        self._consecutive_throttles = 0
+
+        self.waiting = 0
+        self.max_waiting = 0
+        self.acquired = 0
+        self.delayed = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.throttles = 0
+
+    def _refill(self, now: float):
+        if now > self._last_refill:
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+
+    def acquire(self) -> float:
+        """
+        Blocks until a token is available, and returns how long that took in seconds.
+        """
+        start = time.monotonic()
+        with self._condition:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._tokens >= 1 and now >= self._last_refill:
+                        self._tokens -= 1
+                        break
+                    self._condition.wait(max(0.0, self._last_refill - now) + (1 - self._tokens) / self.rate)
+            finally:
+                self.waiting -= 1
+
+            waited = time.monotonic() - start
+            self.acquired += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            if waited > 0.001:
+                self.delayed += 1
+            return waited
+
+    def record_success(self):
+        with self._condition:
+            self._consecutive_throttles = 0
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_RATE_FRACTION)
+
+    def record_throttle(self) -> float:
+        """
+        Slows the bucket down after a throttling error, and returns how long it's paused for.
+        """
+        with self._condition:
+            self.throttles += 1
+            self._consecutive_throttles += 1
+            self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate * THROTTLE_RATE_FACTOR)
+
+            backoff = min(BACKOFF_MAX_SECONDS, BACKOFF_INITIAL_SECONDS * 2 ** (self._consecutive_throttles - 1))
+            pause = backoff * random.uniform(0.5, 1.0)
+            self._tokens = 0.0
+            self._last_refill = max(self._last_refill, time.monotonic() + pause)
+            self._condition.notify_all()
+            return pause
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "rate": self.rate,
+            "max_rate": self.max_rate,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "acquired": self.acquired,
+            "delayed": self.delayed,
+            "mean_wait_ms": 1000 * self.total_wait_seconds / self.acquired if self.acquired else 0.0,
+            "max_wait_ms": 1000 * self.max_wait_seconds,
+            "throttles": self.throttles,
+        }
+
+def _is_throttled(response: Optional[Tuple[Any, Dict[str, Any]]]) -> bool:
+    if response is None:
+        return False
+    http_response, parsed = response
+    return http_response.status_code == 429 or parsed.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+class _ClientHooks:
+    def __init__(self, limiter: "RateLimiter", service: str, region: Optional[str],
+            account_resolver: Callable[[], str]):
+        """
+        The botocore event handlers for one client.  The client's account is only looked up on its first call.
+        """
+        self._limiter = limiter
+        self._service = service
+        self._region = region
+        self._account_resolver = account_resolver
+        self._account_id: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _get_bucket(self, event_name: str) -> TokenBucket:
+        if self._account_id is None:
+            with self._lock:
+                if self._account_id is None:
+                    self._account_id = self._account_resolver()
+        # Event names look like "before-send.cloudwatch.ListMetrics"
+        operation = event_name.rsplit(".", 1)[-1]
+        return self._limiter.get_bucket((self._account_id, self._region, self._service, operation))
+
+    def before_send(self, event_name: str, **kwargs):
+        # Called before every attempt at a call, including botocore's retries
+        if not self._limiter.config.enabled:
+            return
+        waited = self._get_bucket(event_name).acquire()
+        if waited > 1:
+            logger.debug(f"Waited {waited:.1f}s for a {event_name} token")
+
+    def needs_retry(self, event_name: str, response: Optional[Tuple[Any, Dict[str, Any]]] = None, **kwargs):
+        # Called after every attempt.  Returns None so botocore's own retry handler still decides whether to retry.
+        if not self._limiter.config.enabled:
+            return
+        bucket = self._get_bucket(event_name)
+        if _is_throttled(response):
+            pause = bucket.record_throttle()
+            logger.warning(f"Throttled on {event_name} in {self._region}; slowing to {bucket.rate:.3g} TPS and "
+                f"pausing {pause:.2f}s")
+        elif response is not None and response[0].status_code < 400:
+            bucket.record_success()
+
+class RateLimiter:
+    def __init__(self, config: RateLimitConfig):
+        """
+        Process-wide registry of token buckets, keyed by (account, region, service, API).
+        """
+        self.config = config
+        self._lock = threading.Lock()
+        self._buckets: Dict[BucketKey, TokenBucket] = {}
+
+    def configure(self, config: RateLimitConfig):
+        # Clients keep their hooks, so the limiter is reconfigured in place rather than replaced
+        with self._lock:
+            self.config = config
+            self._buckets.clear()
+
+    def get_bucket(self, key: BucketKey) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.config.get_rate(key[3]))
+                self._buckets[key] = bucket
+            return bucket
+
+    def register(self, client: Any, service: str, account_resolver: Callable[[], str]):
+        """
+        Rate limits the client's calls, if its service is one of the configured ones.  account_resolver returns the
+        account the client's credentials belong to.
+        """
+        if service not in self.config.services:
+            return
+        hooks = _ClientHooks(self, service, client.meta.region_name, account_resolver)
+        service_id = client.meta.service_model.service_id.hyphenize()
+        client.meta.events.register(f"before-send.{service_id}", hooks.before_send)
+        client.meta.events.register(f"needs-retry.{service_id}", hooks.needs_retry)
+
+    def to_json(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            buckets = list(self._buckets.items())
+        return {"/".join(str(part) for part in key): bucket.to_json() for key, bucket in buckets}
+
+RATE_LIMITER = RateLimiter(RateLimitConfig())
+
+def configure_rate_limits(config: RateLimitConfig):
+    """
+    Sets the quotas to stay under, e.g.
+    configure_rate_limits(RateLimitConfig(operation_rates={"ListMetrics": 5.0})) when several processes share an
+    account.
+    """
+    RATE_LIMITER.configure(config)
@@ -0,0 +1 @@
+# Intentionally empty
\ No newline at end of file
@@ -0,0 +1,235 @@
+import argparse
+from contextlib import redirect_stdout
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Tuple
+from unittest import mock
+import uuid
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from aws_interactions.aws_client_provider import AwsClientProvider
+from benchmarks.reporting import latency_summary, print_table, summarize_spans
+from benchmarks.stubs import generate_metric_names, stub_llm_factory, StubCloudWatchClient, StubStsClient
+from cw_expert import CW_SYSTEM_MESSAGE
+from cw_expert.graph import compile_cw_graph, create_runner
+from cw_expert.tools import METRIC_LISTING_CACHE
+from utilities.checkpointing import SqliteCheckpointer
+from utilities.models import create_bedrock_llm, MODEL_ROUTER
+from utilities.tracing import configure_tracing, InMemorySpanCollector
+
+#
+# Offline end-to-end benchmark of the CloudWatch graph.  Replays the conversations from debug.py through the real
+# graph, checkpointer, and tools, with a scripted model and a stub CloudWatch client in place of AWS.  Run from the
+# lp02 directory with:
+#
+#     python -m benchmarks.end_to_end [--conversations 20] [--metrics 5000] [--output results.json]
+#
+# Pass --baseline with the output of an earlier run to fail (exit code 1) when throughput, peak memory, or checkpoint
+# size regress by more than --max-regression, so it can run in CI.
+#
+
+DOMAIN_ARN = "arn:aws:es:us-west-2:729929230507:domain/arkimedomain872-vzfrvtegjekp"
+
+DASHBOARD_JSON = json.dumps({"widgets": [
+    {"type": "metric", "properties": {"title": "Average", "stat": "Average", "region": "us-west-2",
+        "metrics": [["AWS/ES", name, "DomainName", "arkimedomain872-vzfrvtegjekp", "ClientId", "729929230507"]
+            for name in ["IndexingRate", "WriteIOPS", "IndexingLatency"]]}},
+    {"type": "metric", "properties": {"title": "P99", "stat": "p99", "region": "us-west-2",
+        "metrics": [["AWS/ES", name, "DomainName", "arkimedomain872-vzfrvtegjekp", "ClientId", "729929230507"]
+            for name in ["IndexingRate", "CPUUtilization", "JVMMemoryPressure"]]}},
+]})
+
+# Each conversation is a list of (who the reply goes to, what the user says).  Replies to "approval" answer a pending
+# approval request.
+CONVERSATIONS: Dict[str, List[Tuple[str, str]]] = {
+    "explore-then-create": [
+        ("cw", "What can you do?"),
+        ("cw", f"What metrics do you have for the OpenSearch domain {DOMAIN_ARN}?"),
+        ("cw", "Can you just give me a list of the raw metric names?"),
+        ("cw", "Can you please give me the JSON for a CloudWatch Dashboard that shows two graphs: Average "
+            "IndexingRate, WriteIOPS, and IndexingLatency, and P99 IndexingRate, CPUUtilization, and "
+            "JVMMemoryPressure.  Do not create the Dashboard, just give me the JSON"),
+        ("cw", "Cool!  Now make that Dashboard, please."),
+        ("approval", "Approved!"),
+    ],
+    "create-directly": [
+        ("cw", f"Can you please make me a CloudWatch Dashboard for the domain {DOMAIN_ARN} that shows me a single "
+            "graph with the Average IndexingRate, WriteIOPS, and IndexingLatency?"),
+        ("approval", "OK, sure, create it"),
+    ],
+}
+
+LLM_NODES = ["node_invoke_llm_cw", "node_invoke_llm_approval"]
+
+def _tool_call(name: str, args: Dict[str, Any]) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"tooluse_{uuid.uuid4().hex[:22]}"}])
+
+def respond(messages: List[BaseMessage]) -> AIMessage:
+    """
+    Scripted answers for the benchmark conversations, keyed on the user's latest request.  Stateless, so any number
+    of conversations can run through the same model.
+    """
+    if "classify the response of a human operator" in str(messages[0].content):
+        return _tool_call("ApprovalGranted", {})
+
+    last = messages[-1]
+    if isinstance(last, ToolMessage):
+        return AIMessage(content=f"Here's what I found:\n\n{str(last.content)[:2000]}")
+
+    request = next(str(message.content) for message in reversed(messages) if isinstance(message, HumanMessage))
+    if "raw metric names" in request:
+        return _tool_call("PrintRawMetricNamesForOpenSearchDomain", {"domain_arn": DOMAIN_ARN})
+    if "What metrics" in request:
+        return _tool_call("ExplainMetricsForOpenSearchDomain", {"domain_arn": DOMAIN_ARN})
+    if "make that Dashboard" in request or "make me a CloudWatch Dashboard" in request:
+        return _tool_call("CreateNewCloudwatchDashboardFromJson",
+            {"dashboard_json": DASHBOARD_JSON, "aws_region_name": "us-west-2"})
+    if "give me the JSON" in request:
+        return AIMessage(content=f"Here's the JSON for your dashboard:\n\n{DASHBOARD_JSON}")
+    return AIMessage(content="I can explain the CloudWatch metrics of your OpenSearch domains, and write and create "
+        "CloudWatch Dashboards for them.")
+
+def run_conversations(conversations: int, metric_count: int, nodes_per_domain: int,
+        db_path: str) -> Tuple[int, float]:
+    """
+    Runs the scripted conversations round-robin against a fresh checkpointer, returning the number of turns taken
+    and the seconds they took.
+    """
+    METRIC_LISTING_CACHE.invalidate()
+    cloudwatch = StubCloudWatchClient(generate_metric_names(metric_count), nodes_per_domain=nodes_per_domain)
+    scripts = list(CONVERSATIONS.values())
+
+    turns = 0
+    with SqliteCheckpointer(db_path) as checkpointer, \
+            mock.patch.object(AwsClientProvider, "get_cloudwatch", return_value=cloudwatch), \
+            mock.patch.object(AwsClientProvider, "get_sts", return_value=StubStsClient()), \
+            redirect_stdout(io.StringIO()):
+        runner = create_runner(compile_cw_graph(checkpointer))
+        start = time.perf_counter()
+        for i in range(conversations):
+            thread = uuid.uuid4().hex
+            state = {"cw_turns": [CW_SYSTEM_MESSAGE], "approval_turns": [], "approval_in_progress": False}
+            for target, text in scripts[i % len(scripts)]:
+                state[f"{target}_turns"].append(HumanMessage(content=text))
+                state = runner(state, thread)
+                turns += 1
+        elapsed = time.perf_counter() - start
+        checkpointer.compact()
+    return turns, elapsed
+
+def measure_checkpoints(db_path: str) -> Dict[str, int]:
+    sizes = sum(os.path.getsize(path) for path in [db_path, db_path + "-wal"] if os.path.exists(path))
+    with sqlite3.connect(db_path) as conn:
+        checkpoints = conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        messages = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    return {"bytes": sizes, "checkpoints": checkpoints, "messages": messages}
+
+def run_benchmark(conversations: int = 20, metric_count: int = 5000, nodes_per_domain: int = 2,
+        llm_latency_ms: float = 0.0) -> Dict[str, Any]:
+    """
+    Runs the conversations twice: once traced, for latency and throughput, and once under tracemalloc, for peak
+    memory (which slows everything down too much to time).
+    """
+    latency = (llm_latency_ms / 1000, 0.0)
+    latencies = {MODEL_ROUTER.get_route(node).primary.model_id: latency for node in LLM_NODES}
+    collector = InMemorySpanCollector()
+    configure_tracing(collector)
+    MODEL_ROUTER.set_llm_factory(stub_llm_factory(respond, latencies))
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = os.path.join(temp_dir, "checkpoints.db")
+            turns, elapsed = run_conversations(conversations, metric_count, nodes_per_domain, db_path)
+            checkpoints = measure_checkpoints(db_path)
+
+            configure_tracing()
+            tracemalloc.start()
+            try:
+                run_conversations(conversations, metric_count, nodes_per_domain,
+                    os.path.join(temp_dir, "checkpoints-memory.db"))
+                _, peak_bytes = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+    finally:
+        configure_tracing()
+        MODEL_ROUTER.set_llm_factory(create_bedrock_llm)
+        METRIC_LISTING_CACHE.invalidate()
+
+    nodes = summarize_spans(collector.spans)
+    return {
+        "parameters": {"conversations": conversations, "metrics": metric_count, "nodes_per_domain": nodes_per_domain,
+            "llm_latency_ms": llm_latency_ms},
+        "turns": turns,
+        "turns_per_second": turns / elapsed,
+        "turn": latency_summary([span.duration_ms for span in collector.spans if span.kind == "graph"]),
+        "nodes": nodes,
+        "peak_memory_bytes": peak_bytes,
+        "checkpoints": checkpoints,
+    }
+
+# Results where a higher value is better; for the rest, lower is better
+REGRESSION_CHECKS = {
+    "turns_per_second": True,
+    "peak_memory_bytes": False,
+    "checkpoints.bytes": False,
+}
+
+def _lookup(results: Dict[str, Any], path: str) -> float:
+    for key in path.split("."):
+        results = results[key]
+    return results
+
+def find_regressions(results: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """
+    Compares the results with an earlier run's, returning a description of each figure that got worse by more than
+    max_regression (a fraction, e.g. 0.2 for 20%).
+    """
+    regressions = []
+    for path, higher_is_better in REGRESSION_CHECKS.items():
+        current, previous = _lookup(results, path), _lookup(baseline, path)
+        change = (previous - current) / previous if higher_is_better else (current - previous) / previous
+        if change > max_regression:
+            regressions.append(f"{path}: {previous:.1f} -> {current:.1f} ({change:.0%} worse)")
+    return regressions
+
+def print_results(results: Dict[str, Any]):
+    print(f"turns: {results['turns']}")
+    print(f"turns/sec: {results['turns_per_second']:.1f}")
+    print(f"peak memory: {results['peak_memory_bytes'] / 1024 / 1024:.1f} MiB")
+    checkpoints = results["checkpoints"]
+    print(f"checkpoint db: {checkpoints['bytes'] / 1024:.0f} KiB ({checkpoints['checkpoints']} checkpoints, "
+        f"{checkpoints['messages']} messages)")
+    print_table("turn", {"CW_GRAPH": results["turn"]})
+    print_table("nodes", results["nodes"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CloudWatch graph end to end, offline")
+    parser.add_argument("--conversations", type=int, default=20, help="Conversations to run")
+    parser.add_argument("--metrics", type=int, default=5000, help="Distinct metric names the stub domain reports")
+    parser.add_argument("--nodes-per-domain", type=int, default=2, help="Nodes reporting each metric")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency of each LLM call")
+    parser.add_argument("--output", help="File to write the results to, as JSON")
+    parser.add_argument("--baseline", help="Results of an earlier run to check for regressions against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+        help="How much worse (as a fraction) a figure can get before the run fails")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.conversations, args.metrics, args.nodes_per_domain, args.llm_latency_ms)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        sys.exit(1 if regressions else 0)
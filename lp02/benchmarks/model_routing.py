@@ -0,0 +1,140 @@
+import argparse
+from contextlib import redirect_stdout
+import io
+import os
+import tempfile
+import time
+from typing import Dict, List
+from unittest import mock
+import uuid
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from aws_interactions.aws_client_provider import AwsClientProvider
+from benchmarks.reporting import latency_summary, print_table, summarize_spans
+from benchmarks.stubs import stub_llm_factory, StubCloudWatchClient, StubStsClient
+from cw_expert import CW_SYSTEM_MESSAGE
+from cw_expert.graph import compile_cw_graph, create_runner
+from utilities.checkpointing import SqliteCheckpointer
+from utilities.models import create_bedrock_llm, MODEL_ROUTER, ModelConfig, ModelRoute
+from utilities.tracing import configure_tracing, InMemorySpanCollector
+
+#
+# Compares per-node latency across model routing configurations, using stubbed models with simulated latencies.  Run
+# from the lp02 directory with:
+#
+#     python -m benchmarks.model_routing [--conversations 5] [--time-scale 0.1]
+#
+# Each conversation asks for a dashboard, then approves it with a reply the approval fast path can't classify, so
+# both LLM nodes are exercised.
+#
+
+SONNET = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+HAIKU = "anthropic.claude-3-haiku-20240307-v1:0"
+
+# Model ID -> (seconds to first token, seconds per output token), roughly in line with what Bedrock reports
+STUB_LATENCIES = {
+    SONNET: (1.2, 0.015),
+    HAIKU: (0.4, 0.005),
+}
+
+CONFIGURATIONS: Dict[str, Dict[str, ModelRoute]] = {
+    "sonnet-everywhere": {
+        "node_invoke_llm_cw": ModelRoute(ModelConfig(SONNET)),
+        "node_invoke_llm_approval": ModelRoute(ModelConfig(SONNET, max_tokens=1024)),
+    },
+    "haiku-for-approval": {
+        "node_invoke_llm_cw": ModelRoute(ModelConfig(SONNET)),
+        "node_invoke_llm_approval": ModelRoute(ModelConfig(HAIKU, max_tokens=1024),
+            fallback=ModelConfig(SONNET, max_tokens=1024)),
+    },
+    "haiku-everywhere": {
+        "node_invoke_llm_cw": ModelRoute(ModelConfig(HAIKU)),
+        "node_invoke_llm_approval": ModelRoute(ModelConfig(HAIKU, max_tokens=1024)),
+    },
+}
+
+# Configuration name -> model ID -> throttle every Nth call, to measure the cost of falling back
+THROTTLING: Dict[str, Dict[str, int]] = {
+    "haiku-for-approval (haiku throttled)": {HAIKU: 1},
+}
+
+APPROVAL_REPLY = "Fine by me as long as it stays in us-west-2"
+DASHBOARD_JSON = ('{"widgets": [{"type": "metric", "properties": {"region": "us-west-2", '
+    '"metrics": [["AWS/ES", "CPUUtilization"]]}}]}')
+
+def respond(messages: List[BaseMessage]) -> AIMessage:
+    """
+    Scripted answers for the benchmark conversation.
+    """
+    first, last = messages[0], messages[-1]
+    if "classify the response of a human operator" in str(first.content):
+        return AIMessage(content="", tool_calls=[{"name": "ApprovalGranted", "args": {}, "id": uuid.uuid4().hex}])
+    if isinstance(last, ToolMessage):
+        return AIMessage(content=f"I've created the dashboard.  Its ARN is {last.content}.")
+    return AIMessage(
+        content="Here's a dashboard that shows the CPU utilization of your domain.",
+        tool_calls=[{
+            "name": "CreateNewCloudwatchDashboardFromJson",
+            "args": {"dashboard_json": DASHBOARD_JSON, "aws_region_name": "us-west-2"},
+            "id": uuid.uuid4().hex
+        }]
+    )
+
+def run_configuration(routes: Dict[str, ModelRoute], throttled_models: Dict[str, int], conversations: int,
+        time_scale: float) -> Dict[str, Dict[str, float]]:
+    """
+    Runs the benchmark conversation against one routing configuration and returns latency figures per node, plus
+    the number of LLM calls per model.
+    """
+    collector = InMemorySpanCollector()
+    configure_tracing(collector)
+    MODEL_ROUTER.configure(routes)
+    MODEL_ROUTER.set_llm_factory(stub_llm_factory(respond, STUB_LATENCIES, time_scale, throttled_models))
+
+    conversation_seconds = []
+    with tempfile.TemporaryDirectory() as temp_dir, \
+            SqliteCheckpointer(os.path.join(temp_dir, "checkpoints.db")) as checkpointer, \
+            mock.patch.object(AwsClientProvider, "get_cloudwatch", return_value=StubCloudWatchClient()), \
+            mock.patch.object(AwsClientProvider, "get_sts", return_value=StubStsClient()), \
+            redirect_stdout(io.StringIO()):
+        runner = create_runner(compile_cw_graph(checkpointer))
+        for _ in range(conversations):
+            thread = uuid.uuid4().hex
+            start = time.perf_counter()
+            state = {"cw_turns": [CW_SYSTEM_MESSAGE, HumanMessage(content="Create a dashboard for my domain")],
+                "approval_turns": [], "approval_in_progress": False}
+            state = runner(state, thread)
+            state["approval_turns"].append(HumanMessage(content=APPROVAL_REPLY))
+            runner(state, thread)
+            conversation_seconds.append(time.perf_counter() - start)
+
+    results = summarize_spans(collector.spans)
+    results["conversation"] = latency_summary([seconds * 1000 for seconds in conversation_seconds])
+    return results
+
+def run_benchmark(conversations: int = 5, time_scale: float = 0.1) -> Dict[str, Dict[str, Dict[str, float]]]:
+    runs = {name: (routes, {}) for name, routes in CONFIGURATIONS.items()}
+    for name, throttled_models in THROTTLING.items():
+        runs[name] = (CONFIGURATIONS[name.split(" (")[0]], throttled_models)
+
+    try:
+        return {
+            name: run_configuration(routes, throttled_models, conversations, time_scale)
+            for name, (routes, throttled_models) in runs.items()
+        }
+    finally:
+        configure_tracing()
+        MODEL_ROUTER.configure({})
+        MODEL_ROUTER.set_llm_factory(create_bedrock_llm)
+
+def print_results(results: Dict[str, Dict[str, Dict[str, float]]]):
+    for configuration, rows in results.items():
+        print_table(configuration, rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-node latency across model routing configurations")
+    parser.add_argument("--conversations", type=int, default=5, help="Conversations to run per configuration")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="Multiplier for the simulated model latencies")
+    args = parser.parse_args()
+    print_results(run_benchmark(args.conversations, args.time_scale))
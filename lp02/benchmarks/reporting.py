@@ -0,0 +1,43 @@
+import statistics
+from typing import Dict, List
+
+from utilities.tracing import Span
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def latency_summary(durations_ms: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(durations_ms),
+        "mean_ms": statistics.mean(durations_ms),
+        "p50_ms": percentile(durations_ms, 0.5),
+        "p95_ms": percentile(durations_ms, 0.95),
+    }
+
+def summarize_spans(spans: List[Span]) -> Dict[str, Dict[str, float]]:
+    """
+    Latency figures for each graph node, and call and error counts for each model, from the spans of a run.
+    """
+    results: Dict[str, Dict[str, float]] = {}
+    node_durations: Dict[str, List[float]] = {}
+    for span in spans:
+        if span.kind == "node":
+            node_durations.setdefault(span.name, []).append(span.duration_ms)
+        elif span.kind == "llm":
+            key = f"llm calls: {span.attributes.get('model')}"
+            results.setdefault(key, {"count": 0, "errors": 0})
+            results[key]["count"] += 1
+            results[key]["errors"] += 1 if span.error else 0
+
+    for name, durations in node_durations.items():
+        results[name] = latency_summary(durations)
+    return results
+
+def print_table(title: str, rows: Dict[str, Dict[str, float]]):
+    print(f"\n== {title}")
+    for name, row in sorted(rows.items()):
+        figures = "  ".join(
+            f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}" for key, value in row.items()
+        )
+        print(f"  {name:<50} {figures}")
@@ -0,0 +1,243 @@
+from datetime import datetime, timedelta, timezone
+import json
+import math
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from botocore.exceptions import ClientError
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from utilities.models import ModelConfig
+
+#
+# Offline stand-ins for Bedrock models and AWS clients, so the graphs can be benchmarked without network access or
+# credentials.  Latencies are simulated with sleeps.
+#
+
+class StubChatModel(BaseChatModel):
+    """
+    A chat model that answers with whatever the responder returns for the conversation, after a simulated delay.
+    Streams its answer word by word, so it works with the streaming runner too.
+    """
+    model_id: str
+    responder: Callable[[List[BaseMessage]], AIMessage]
+    latency_seconds: float = 0.0  # Time to the first token
+    seconds_per_token: float = 0.0
+    throttle_every: int = 0  # Raise a ThrottlingException on every Nth call; 0 never does
+    _calls: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "StubChatModel":
+        return self
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        self._calls += 1
+        if self.throttle_every and self._calls % self.throttle_every == 0:
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, "Converse")
+        time.sleep(self.latency_seconds)
+
+        response = self.responder(messages)
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4
+        output_tokens = max(1, len(str(response.content)) // 4)
+        return AIMessage(
+            content=response.content,
+            tool_calls=response.tool_calls,
+            usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens}
+        )
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+            **kwargs: Any) -> ChatResult:
+        response = self._respond(messages)
+        time.sleep(self.seconds_per_token * response.usage_metadata["output_tokens"])
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+            **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        response = self._respond(messages)
+        words = response.content.split(" ") if response.content else []
+        for i, word in enumerate(words):
+            time.sleep(self.seconds_per_token)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            tool_call_chunks=[
+                {"name": tool_call["name"], "args": json.dumps(tool_call["args"]), "id": tool_call["id"], "index": i}
+                for i, tool_call in enumerate(response.tool_calls)
+            ],
+            usage_metadata=response.usage_metadata
+        ))
+
+def stub_llm_factory(responder: Callable[[List[BaseMessage]], AIMessage], latencies: Dict[str, tuple],
+        time_scale: float = 1.0, throttled_models: Dict[str, int] = None) -> Callable[[ModelConfig], BaseChatModel]:
+    """
+    Returns a factory for ModelRouter.set_llm_factory() that creates StubChatModels.
+
+    latencies: model ID -> (seconds to first token, seconds per output token)
+    time_scale: multiplier applied to every latency, to make runs faster
+    throttled_models: model ID -> N, to throttle every Nth call to that model
+    """
+    throttled_models = throttled_models or {}
+
+    def create(config: ModelConfig) -> BaseChatModel:
+        first_token, per_token = latencies.get(config.model_id, (0.0, 0.0))
+        return StubChatModel(
+            model_id=config.model_id,
+            responder=responder,
+            latency_seconds=first_token * time_scale,
+            seconds_per_token=per_token * time_scale,
+            throttle_every=throttled_models.get(config.model_id, 0)
+        )
+
+    return create
+
+# Real AWS/ES metric names, used as the families for generated names
+BASE_METRIC_NAMES = [
+    "CPUUtilization", "FreeStorageSpace", "IndexingRate", "IndexingLatency", "SearchRate", "SearchLatency",
+    "JVMMemoryPressure", "SysMemoryUtilization", "WriteIOPS", "ReadIOPS", "WriteLatency", "ReadLatency",
+    "ThreadpoolSearchQueue", "ThreadpoolWriteRejected", "ClusterStatus.green", "Nodes", "SearchableDocuments",
+    "DeletedDocuments", "2xx", "5xx"
+]
+
+def generate_metric_names(count: int) -> List[str]:
+    """
+    Returns count distinct metric names that look like the ones OpenSearch domains report.
+    """
+    names = BASE_METRIC_NAMES[:count]
+    i = 0
+    while len(names) < count:
+        names.append(f"{BASE_METRIC_NAMES[i % len(BASE_METRIC_NAMES)]}Shard{i // len(BASE_METRIC_NAMES)}")
+        i += 1
+    return names
+
+class StubCloudWatchClient:
+    def __init__(self, metric_names: List[str] = None, nodes_per_domain: int = 1, page_size: int = 500,
+            latency_seconds: float = 0.0, datapoints_per_page: int = 100800):
+        """
+        Answers the CloudWatch calls our tools make, from memory.  Like the real ListMetrics, each metric name is
+        reported once per node and results come back in pages.  GetMetricData returns a made-up but repeatable series
+        for each metric, split into pages of at most datapoints_per_page.
+        """
+        self.metric_names = metric_names or BASE_METRIC_NAMES
+        self.nodes_per_domain = nodes_per_domain
+        self.page_size = page_size
+        self.latency_seconds = latency_seconds
+        self.datapoints_per_page = datapoints_per_page
+        self.dashboards: Dict[str, str] = {}
+        self.get_metric_data_calls = 0
+
+    def put_dashboard(self, DashboardName: str, DashboardBody: str) -> Dict[str, Any]:
+        time.sleep(self.latency_seconds)
+        self.dashboards[DashboardName] = DashboardBody
+        return {"DashboardValidationMessages": []}
+
+    def get_dashboard(self, DashboardName: str) -> Dict[str, Any]:
+        time.sleep(self.latency_seconds)
+        return {
+            "DashboardArn": f"arn:aws:cloudwatch::123456789012:dashboard/{DashboardName}",
+            "DashboardBody": self.dashboards[DashboardName],
+            "DashboardName": DashboardName
+        }
+
+    def _generate_series(self, metric_name: str, start_time: datetime, end_time: datetime,
+            period_seconds: int) -> List[tuple]:
+        """
+        A noisy wave around a per-metric baseline that climbs or falls over each day, with every 7th period missing.
+        Values depend only on the metric and the period's time, so overlapping requests agree.
+        """
+        seed = zlib.crc32(metric_name.encode())
+        baseline, slope_per_hour = 10 + seed % 90, (seed % 7 - 3) / 2
+        first_slot = int(start_time.timestamp()) // period_seconds
+        datapoints = []
+        for slot in range(first_slot, first_slot + int((end_time - start_time).total_seconds()) // period_seconds):
+            if (slot + seed) % 7 == 0:
+                continue
+            hour_of_day = slot * period_seconds % 86400 / 3600
+            value = baseline + slope_per_hour * hour_of_day + 5 * math.sin(slot / 4) + (seed >> (slot % 16)) % 3
+            datapoints.append((datetime.fromtimestamp(slot * period_seconds, tz=timezone.utc), value))
+        return datapoints
+
+    def get_metric_data(self, MetricDataQueries: List[Dict[str, Any]], StartTime: datetime, EndTime: datetime,
+            NextToken: str = None, **kwargs) -> Dict[str, Any]:
+        if len(MetricDataQueries) > 500:
+            raise ClientError({"Error": {"Code": "ValidationError", "Message": "Too many queries"}}, "GetMetricData")
+        time.sleep(self.latency_seconds)
+        self.get_metric_data_calls += 1
+
+        # The token is the query and datapoint to resume from
+        query_index, offset = map(int, (NextToken or "0:0").split(":"))
+        known_metrics = set(self.metric_names)
+        results = []
+        budget = self.datapoints_per_page
+        while query_index < len(MetricDataQueries) and budget > 0:
+            query = MetricDataQueries[query_index]
+            metric_name = query["MetricStat"]["Metric"]["MetricName"]
+            datapoints = []
+            if metric_name in known_metrics:
+                datapoints = self._generate_series(metric_name, StartTime, EndTime, query["MetricStat"]["Period"])
+            page = datapoints[offset:offset + budget]
+            results.append({"Id": query["Id"], "Timestamps": [timestamp for timestamp, _ in page],
+                "Values": [value for _, value in page], "StatusCode": "Complete"})
+            budget -= len(page)
+            if offset + len(page) < len(datapoints):
+                offset += len(page)
+            else:
+                query_index, offset = query_index + 1, 0
+
+        response = {"MetricDataResults": results, "Messages": []}
+        if query_index < len(MetricDataQueries):
+            response["NextToken"] = f"{query_index}:{offset}"
+        return response
+
+    def get_paginator(self, operation_name: str):
+        if operation_name != "list_metrics":
+            raise NotImplementedError(operation_name)
+        client = self
+
+        class ListMetricsPaginator:
+            def paginate(self, **kwargs) -> Iterator[Dict[str, Any]]:
+                dimensions = kwargs.get("Dimensions", [])
+                page = []
+                for node in range(client.nodes_per_domain):
+                    for name in client.metric_names:
+                        page.append({"MetricName": name, "Namespace": kwargs.get("Namespace", "AWS/ES"),
+                            "Dimensions": dimensions + [{"Name": "NodeId", "Value": f"node-{node}"}]})
+                        if len(page) == client.page_size:
+                            time.sleep(client.latency_seconds)
+                            yield {"Metrics": page}
+                            page = []
+                if page:
+                    time.sleep(client.latency_seconds)
+                    yield {"Metrics": page}
+
+        return ListMetricsPaginator()
+
+class StubStsClient:
+    def __init__(self, account_id: str = "123456789012"):
+        self.account_id = account_id
+        self.assume_role_calls = 0
+
+    def get_caller_identity(self) -> Dict[str, Any]:
+        return {"Account": self.account_id, "Arn": f"arn:aws:iam::{self.account_id}:user/benchmark"}
+
+    def assume_role(self, RoleArn: str, RoleSessionName: str, DurationSeconds: int = 3600, **kwargs) -> Dict[str, Any]:
+        self.assume_role_calls += 1
+        return {
+            "Credentials": {
+                "AccessKeyId": f"ASIASTUB{self.assume_role_calls:012d}",
+                "SecretAccessKey": "stub-secret",
+                "SessionToken": "stub-token",
+                "Expiration": datetime.now(timezone.utc) + timedelta(seconds=DurationSeconds),
+            },
+            "AssumedRoleUser": {"Arn": f"{RoleArn}/{RoleSessionName}"},
+        }
@@ -0,0 +1,2 @@
+from chat_service.app import ChatApp, TurnLimiter
+from chat_service.turns import add_user_message, get_ai_response, run_turn, TurnResult
\ No newline at end of file
@@ -0,0 +1,353 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import json
+import logging
+import re
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from chat_service.turns import run_turn, StreamingRunner
+from utilities.graph import StreamEvent
+from utilities.sessions import SessionManager
+
+logger = logging.getLogger(__name__)
+
+#
+# A headless ASGI service for the chat graph.  Run it with any ASGI server, e.g. (from the lp02 directory):
+#
+#     uvicorn serve_chat:CHAT_APP --port 8000
+#
+# Endpoints:
+#     POST   /sessions                      -> 201 {"session_id": ...}
+#     POST   /sessions/{id}/messages        {"content": ..., "stream": true} -> newline-delimited JSON events, or a
+#                                           single JSON result when stream is false
+#     GET    /sessions/{id}/history         -> {"session_id": ..., "conversation": [{"role": ..., "content": ...}]}
+#     DELETE /sessions/{id}                 -> 204
+#     GET    /health                        -> {"status": "ok", ...}
+#     GET    /metrics                       -> turn, queue, and session figures
+#
+# Graph runs are blocking, so each turn runs on a bounded worker pool.  Turns beyond the pool's size wait in a bounded
+# queue; once that's full, or a turn has waited too long, new turns are turned away with a 503 and a Retry-After header
+# rather than piling up.
+#
+
+DEFAULT_MAX_CONCURRENT_TURNS = 8
+DEFAULT_MAX_QUEUED_TURNS = 32
+DEFAULT_QUEUE_TIMEOUT_SECONDS = 30
+DEFAULT_IDLE_SWEEP_SECONDS = 60
+MAX_REQUEST_BODY_BYTES = 64 * 1024
+RETRY_AFTER_SECONDS = 5
+LATENCY_WINDOW = 1_000  # How many recent turn latencies the metrics are computed over
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[List[Tuple[bytes, bytes]]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or []
+
+class TurnLimiter:
+    def __init__(self, max_concurrent: int, max_queued: int, queue_timeout_seconds: float):
+        """
+        Admits at most max_concurrent turns at once, with up to max_queued more waiting for a slot.  Tracks the
+        figures the metrics endpoint reports.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_seconds: List[float] = []
+        self.turn_seconds: List[float] = []
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        # Counted before waiting on the semaphore, so turns arriving together can't all slip into the queue
+        if self.active + self.queued >= self.max_concurrent + self.max_queued:
+            self.rejected += 1
+            raise self._busy("Too many turns queued")
+
+        self.queued += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise self._busy("Timed out waiting for a worker")
+        finally:
+            self.queued -= 1
+        self._record(self.wait_seconds, time.monotonic() - start)
+
+        self.active += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._record(self.turn_seconds, time.monotonic() - start)
+            self._semaphore.release()
+
+    def record_outcome(self, succeeded: bool):
+        if succeeded:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    def _busy(self, message: str) -> HttpError:
+        return HttpError(503, message, headers=[(b"retry-after", str(RETRY_AFTER_SECONDS).encode())])
+
+    def _record(self, values: List[float], value: float):
+        values.append(value)
+        if len(values) > LATENCY_WINDOW:
+            del values[0]
+
+    def to_json(self) -> Dict[str, Any]:
+        def percentile(values: List[float], fraction: float) -> Optional[float]:
+            if not values:
+                return None
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 3)
+
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "active": self.active,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_seconds_p50": percentile(self.wait_seconds, 0.5),
+            "wait_seconds_p99": percentile(self.wait_seconds, 0.99),
+            "turn_seconds_p50": percentile(self.turn_seconds, 0.5),
+            "turn_seconds_p99": percentile(self.turn_seconds, 0.99),
+        }
+
+async def _read_json_body(receive: Receive) -> Dict[str, Any]:
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HttpError(400, "Client disconnected")
+        body += message.get("body", b"")
+        if len(body) > MAX_REQUEST_BODY_BYTES:
+            raise HttpError(413, f"Request body is larger than {MAX_REQUEST_BODY_BYTES} bytes")
+        more_body = message.get("more_body", False)
+
+    try:
+        payload = json.loads(body or b"{}")
+    except json.JSONDecodeError as e:
+        raise HttpError(400, f"Request body is not valid JSON: {e}")
+    if not isinstance(payload, dict):
+        raise HttpError(400, "Request body must be a JSON object")
+    return payload
+
+async def _send_json(send: Send, status: int, payload: Any, headers: Optional[List[Tuple[bytes, bytes]]] = None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+            + (headers or [])
+    })
+    await send({"type": "http.response.body", "body": body})
+
+def _event_line(kind: str, content: Any) -> bytes:
+    return (json.dumps({"kind": kind, "content": content}) + "\n").encode()
+
+class ChatApp:
+    def __init__(self, session_manager: SessionManager, runner: StreamingRunner,
+            max_concurrent_turns: int = DEFAULT_MAX_CONCURRENT_TURNS,
+            max_queued_turns: int = DEFAULT_MAX_QUEUED_TURNS,
+            queue_timeout_seconds: float = DEFAULT_QUEUE_TIMEOUT_SECONDS,
+            idle_sweep_seconds: float = DEFAULT_IDLE_SWEEP_SECONDS):
+        """
+        The ASGI application.  session_manager holds the conversations; runner is a streaming graph runner (see
+        cw_expert.graph.create_streaming_runner).
+        """
+        self.session_manager = session_manager
+        self.runner = runner
+        self.limiter = TurnLimiter(max_concurrent_turns, max_queued_turns, queue_timeout_seconds)
+        self.idle_sweep_seconds = idle_sweep_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_turns, thread_name_prefix="chat-turn")
+        self._busy_sessions: Set[str] = set()
+        self._sweeper: Optional[asyncio.Task] = None
+        self._started_at = time.monotonic()
+
+        self._routes = [
+            ("POST", re.compile(r"^/sessions$"), self.create_session),
+            ("POST", re.compile(r"^/sessions/(?P<session_id>[0-9a-f]+)/messages$"), self.send_message),
+            ("GET", re.compile(r"^/sessions/(?P<session_id>[0-9a-f]+)/history$"), self.get_history),
+            ("DELETE", re.compile(r"^/sessions/(?P<session_id>[0-9a-f]+)$"), self.delete_session),
+            ("GET", re.compile(r"^/health$"), self.health),
+            ("GET", re.compile(r"^/metrics$"), self.metrics),
+        ]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._dispatch(scope, receive, send)
+
+    async def _lifespan(self, receive: Receive, send: Send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._sweeper = asyncio.create_task(self._sweep_idle_sessions())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._sweeper is not None:
+                    self._sweeper.cancel()
+                self._executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _sweep_idle_sessions(self):
+        while True:
+            await asyncio.sleep(self.idle_sweep_seconds)
+            removed = await asyncio.get_running_loop().run_in_executor(None, self.session_manager.remove_idle_sessions)
+            if removed:
+                logger.info(f"Removed {removed} idle sessions")
+
+    async def _dispatch(self, scope: Scope, receive: Receive, send: Send):
+        path, method = scope["path"].rstrip("/") or "/", scope["method"]
+        try:
+            allowed = []
+            for route_method, pattern, handler in self._routes:
+                match = pattern.match(path)
+                if match is None:
+                    continue
+                if route_method == method:
+                    return await handler(receive, send, **match.groupdict())
+                allowed.append(route_method)
+            if allowed:
+                raise HttpError(405, f"Method {method} not allowed", headers=[(b"allow", ", ".join(allowed).encode())])
+            raise HttpError(404, f"Not found: {path}")
+        except HttpError as e:
+            await _send_json(send, e.status, {"error": e.message}, e.headers)
+        except Exception as e:
+            logger.exception(f"Error handling {method} {path}")
+            await _send_json(send, 500, {"error": f"{type(e).__name__}: {e}"})
+
+    async def _run_blocking(self, func: Callable, *args) -> Any:
+        # Session lookups can reload an offloaded session from the checkpointer, and removals delete its checkpoints,
+        # so they're kept off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def _get_session(self, session_id: str):
+        session = await self._run_blocking(self.session_manager.get_session, session_id)
+        if session is None:
+            raise HttpError(404, f"Unknown session: {session_id}")
+        return session
+
+    async def create_session(self, receive: Receive, send: Send):
+        session = await self._run_blocking(self.session_manager.create_session)
+        await _send_json(send, 201, {"session_id": session.session_id})
+
+    async def get_history(self, receive: Receive, send: Send, session_id: str):
+        session = await self._get_session(session_id)
+        await _send_json(send, 200, {"session_id": session_id, "conversation": list(session.conversation)})
+
+    async def delete_session(self, receive: Receive, send: Send, session_id: str):
+        if session_id in self._busy_sessions:
+            raise HttpError(409, f"Session {session_id} is in the middle of a turn")
+        await self._get_session(session_id)
+        await self._run_blocking(self.session_manager.remove_session, session_id)
+        await _send_json(send, 204, None)
+
+    async def send_message(self, receive: Receive, send: Send, session_id: str):
+        payload = await _read_json_body(receive)
+        text = payload.get("content")
+        if not isinstance(text, str) or not text.strip():
+            raise HttpError(400, "'content' must be a non-empty string")
+        await self._get_session(session_id)
+
+        # A session's turns have to run one at a time, as each builds on the state the last one left
+        if session_id in self._busy_sessions:
+            raise HttpError(409, f"Session {session_id} is in the middle of a turn")
+        self._busy_sessions.add(session_id)
+        try:
+            async with self.limiter.slot():
+                try:
+                    if payload.get("stream", True):
+                        succeeded = await self._stream_turn(send, session_id, text)
+                    else:
+                        result = await asyncio.get_running_loop().run_in_executor(
+                            self._executor, run_turn, self.session_manager, session_id, text, self.runner
+                        )
+                        await _send_json(send, 200, result.to_json())
+                        succeeded = True
+                except Exception:
+                    self.limiter.record_outcome(False)
+                    raise
+                self.limiter.record_outcome(succeeded)
+        finally:
+            self._busy_sessions.discard(session_id)
+
+    async def _stream_turn(self, send: Send, session_id: str, text: str) -> bool:
+        """
+        Streams the turn's events as newline-delimited JSON, ending with a "final" event holding the result or an
+        "error" event.  The turn runs to completion even if the client goes away, so the session's state stays
+        consistent.  Returns whether the turn succeeded.
+        """
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+
+        def on_event(event: StreamEvent):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        turn = loop.run_in_executor(self._executor, run_turn, self.session_manager, session_id, text, self.runner,
+            on_event)
+        turn.add_done_callback(lambda _: loop.call_soon_threadsafe(events.put_nowait, None))
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/x-ndjson"), (b"cache-control", b"no-cache")]
+        })
+        client_connected = True
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            if client_connected:
+                try:
+                    await send({"type": "http.response.body", "body": _event_line(event.kind, event.content),
+                        "more_body": True})
+                except OSError:
+                    logger.info(f"Client went away during a turn of session {session_id}")
+                    client_connected = False
+
+        succeeded = False
+        try:
+            result = await turn
+            final_line = _event_line("final", result.to_json())
+            succeeded = True
+        except Exception as e:
+            logger.exception(f"Turn failed for session {session_id}")
+            final_line = _event_line("error", f"{type(e).__name__}: {e}")
+        if client_connected:
+            await send({"type": "http.response.body", "body": final_line, "more_body": False})
+        return succeeded
+
+    async def health(self, receive: Receive, send: Send):
+        limiter = self.limiter
+        at_capacity = limiter.active + limiter.queued >= limiter.max_concurrent + limiter.max_queued
+        status = "busy" if at_capacity else "ok"
+        await _send_json(send, 200, {"status": status, "uptime_seconds": round(time.monotonic() - self._started_at)})
+
+    async def metrics(self, receive: Receive, send: Send):
+        await _send_json(send, 200, {
+            "turns": self.limiter.to_json(),
+            "sessions": self.session_manager.to_json(),
+            "busy_sessions": len(self._busy_sessions),
+        })
@@ -0,0 +1,55 @@
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+
+#
+# A small client for the chat service, used by the Streamlit UI.
+#
+
+DEFAULT_SERVICE_URL = "http://localhost:8000"
+DEFAULT_TIMEOUT_SECONDS = 300
+
+class SessionNotFound(Exception):
+    pass
+
+class ServiceBusy(Exception):
+    def __init__(self, message: str, retry_after_seconds: Optional[float]):
+        super().__init__(message)
+        self.retry_after_seconds = retry_after_seconds
+
+class ChatServiceClient:
+    def __init__(self, base_url: str = DEFAULT_SERVICE_URL, timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS):
+        self.base_url = base_url.rstrip("/")
+        self.timeout_seconds = timeout_seconds
+        self._http = requests.Session()
+
+    def _check(self, response: requests.Response, session_id: Optional[str] = None):
+        if response.status_code == 404 and session_id is not None:
+            raise SessionNotFound(session_id)
+        if response.status_code == 503:
+            retry_after = response.headers.get("Retry-After")
+            raise ServiceBusy(response.json().get("error", "Service busy"), float(retry_after) if retry_after else None)
+        response.raise_for_status()
+
+    def create_session(self) -> str:
+        response = self._http.post(f"{self.base_url}/sessions", timeout=self.timeout_seconds)
+        self._check(response)
+        return response.json()["session_id"]
+
+    def get_history(self, session_id: str) -> List[Dict[str, Any]]:
+        response = self._http.get(f"{self.base_url}/sessions/{session_id}/history", timeout=self.timeout_seconds)
+        self._check(response, session_id)
+        return response.json()["conversation"]
+
+    def send_message(self, session_id: str, content: str) -> Iterator[Dict[str, Any]]:
+        """
+        Sends the user's message and yields the turn's events as they arrive: {"kind": "progress"|"token"|"final"|
+        "error", "content": ...}.
+        """
+        with self._http.post(f"{self.base_url}/sessions/{session_id}/messages",
+                json={"content": content, "stream": True}, stream=True, timeout=self.timeout_seconds) as response:
+            self._check(response, session_id)
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+import logging
+from typing import Callable, Dict, Iterator, Union
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from cw_expert.graph import cw_state_to_json, CwState
+from utilities.graph import StreamEvent
+from utilities.sessions import SessionManager
+
+logger = logging.getLogger(__name__)
+
+#
+# A single chat turn: the user's message goes into the graph state, the graph runs, and the AI's reply is pulled back
+# out and recorded in the session's transcript.
+#
+
+StreamingRunner = Callable[[CwState, Union[int, str]], Iterator[StreamEvent]]
+
+@dataclass
+class TurnResult:
+    response: str
+    approval_in_progress: bool
+
+    def to_json(self) -> Dict[str, any]:
+        return {"response": self.response, "approval_in_progress": self.approval_in_progress}
+
+def add_user_message(graph_state: CwState, text: str) -> CwState:
+    """
+    Returns a copy of the state with the user's message added to whichever conversation is waiting on it: the approval
+    conversation if an operation is waiting on approval, the CloudWatch one otherwise.  The state passed in is left as
+    it was, so a turn that fails doesn't leave the message behind.
+    """
+    next_human_message = HumanMessage(content=text)
+    turns_key = "approval_turns" if graph_state.get("approval_in_progress", False) else "cw_turns"
+    logger.info(f"Adding human message to {turns_key}")
+    return {**graph_state, turns_key: [*graph_state[turns_key], next_human_message]}
+
+def get_ai_response(final_state: CwState) -> BaseMessage:
+    """
+    Returns the message to show the user from the state the graph finished in.
+    """
+    approval_in_progress = final_state.get("approval_in_progress", False)
+    is_handoff = final_state.get("is_approval_handoff", False)
+    logger.info(f"Approval in progress: {approval_in_progress}, is handoff: {is_handoff}")
+
+    if is_handoff or not approval_in_progress:
+        return final_state["cw_turns"][-1]
+    return final_state["approval_turns"][-1]
+
+def run_turn(session_manager: SessionManager, session_id: str, text: str, runner: StreamingRunner,
+        on_event: Callable[[StreamEvent], None] = lambda event: None) -> TurnResult:
+    """
+    Runs one turn of the session's conversation, passing each progress and token event to on_event as the graph runs.
+    The session's state and transcript are only updated once the turn has succeeded.
+    """
+    session = session_manager.get_session(session_id)
+    if session is None:
+        raise KeyError(f"Unknown session: {session_id}")
+
+    graph_state = add_user_message(session.graph_state, text)
+
+    final_state = None
+    for event in runner(graph_state, session.thread_id):
+        if event.kind == "final":
+            final_state = event.content
+        else:
+            on_event(event)
+
+    ai_response = get_ai_response(final_state)
+    logger.debug(f"End of session graph state: {cw_state_to_json(final_state)}")
+    session_manager.update_session(session_id, final_state)
+
+    session.conversation.append({"role": "user", "content": text})
+    session.conversation.append({"role": "ai", "content": ai_response.content})
+    return TurnResult(response=ai_response.content, approval_in_progress=final_state.get("approval_in_progress", False))
@@ -1,2 +1,3 @@
-from cw_expert.graph import CW_GRAPH, CW_GRAPH_RUNNER, CwState
-from cw_expert.prompting import CW_SYSTEM_MESSAGE
\ No newline at end of file
+from cw_expert.graph import CW_GRAPH, CW_GRAPH_ASYNC_RUNNER, CW_GRAPH_RUNNER, CW_GRAPH_STREAMING_RUNNER, CwState
+from cw_expert.prompting import CW_SYSTEM_MESSAGE
+from cw_expert.sessions import CW_SESSION_MANAGER
\ No newline at end of file
@@ -0,0 +1,210 @@
+import json
+import logging
+import re
+from typing import Any, Dict, List
+
+from aws_interactions.aws_client_provider import AwsClientProvider, get_partition
+
+logger = logging.getLogger(__name__)
+
+#
+# Local checks for CloudWatch dashboard bodies, so that a malformed dashboard written by the LLM can be sent back to it
+# to fix without asking the human operator to approve it first or calling AWS.  The checks follow the CloudWatch
+# dashboard body structure; they catch the mistakes LLMs tend to make rather than re-implementing every rule
+# PutDashboard applies.
+#
+
+MAX_WIDGETS = 500
+MAX_METRICS_PER_WIDGET = 500
+GRID_WIDTH = 24
+MAX_WIDGET_HEIGHT = 1000
+MAX_REPORTED_ERRORS = 20
+
+WIDGET_TYPES = {"metric", "text", "log", "alarm", "explorer", "custom"}
+METRIC_VIEWS = {"timeSeries", "singleValue", "gauge", "bar", "pie", "table"}
+STANDARD_STATS = {"SampleCount", "Average", "Sum", "Minimum", "Maximum"}
+# Percentiles (p99, p99.9), trimmed/winsorized means and counts (tm90, TM(10%:90%)), percentile ranks, and IQM
+EXTENDED_STAT_PATTERN = re.compile(
+    r"^(p\d{1,2}(\.\d+)?|p100|(tm|wm|tc|ts)\d{1,2}(\.\d+)?|(tm|wm|tc|ts|pr)\([^)]*:[^)]*\)|iqm)$", re.IGNORECASE
+)
+REGION_PATTERN = re.compile(r"^[a-z]{2}(-gov|-iso[a-z]?)?-[a-z]+-\d+$")
+DASHBOARD_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_\-]{1,255}$")
+HIGH_RESOLUTION_PERIODS = {1, 5, 10, 30}
+
+# Placeholders in a metric row meaning "same as the row above"
+SAME_AS_ABOVE = "."
+REST_SAME_AS_ABOVE = "..."
+
+def is_valid_region(region: Any) -> bool:
+    return isinstance(region, str) and REGION_PATTERN.match(region) is not None
+
+def is_valid_stat(stat: Any) -> bool:
+    return isinstance(stat, str) and (stat in STANDARD_STATS or EXTENDED_STAT_PATTERN.match(stat) is not None)
+
+def is_valid_period(period: Any) -> bool:
+    return isinstance(period, int) and not isinstance(period, bool) and period > 0 \
+        and (period in HIGH_RESOLUTION_PERIODS or period % 60 == 0)
+
+def _check_rendering(options: Dict[str, Any], path: str, errors: List[str]):
+    if "stat" in options and not is_valid_stat(options["stat"]):
+        errors.append(f"{path}: unknown stat {options['stat']!r}; use one of {sorted(STANDARD_STATS)} or a percentile "
+            "such as 'p99'")
+    if "period" in options and not is_valid_period(options["period"]):
+        errors.append(f"{path}: period must be 1, 5, 10, 30, or a multiple of 60 seconds, not {options['period']!r}")
+    if "region" in options and not is_valid_region(options["region"]):
+        errors.append(f"{path}: {options['region']!r} is not an AWS region")
+
+def _check_metric_row(row: Any, index: int, path: str, errors: List[str]):
+    if not isinstance(row, list) or not row:
+        errors.append(f"{path}: each metric must be a non-empty array, like [namespace, metric name, dimension name, "
+            "dimension value, ..., {rendering options}]")
+        return
+
+    options = row[-1] if isinstance(row[-1], dict) else None
+    fields = row[:-1] if options is not None else row
+    if options is not None:
+        _check_rendering(options, path, errors)
+    if not fields:
+        # A metric math expression or Metrics Insights query, e.g. [{"expression": "SUM(METRICS())", "id": "e1"}]
+        if options is None or not isinstance(options.get("expression"), str):
+            errors.append(f"{path}: a metric with no namespace or name must be an expression, like "
+                "[{\"expression\": \"m1 + m2\", \"id\": \"e1\"}]")
+        return
+
+    if any(not isinstance(field, str) for field in fields):
+        errors.append(f"{path}: namespace, metric name, and dimensions must all be strings; rendering options go in "
+            "an object at the end of the array")
+        return
+    if index == 0 and (SAME_AS_ABOVE in fields or REST_SAME_AS_ABOVE in fields):
+        errors.append(f"{path}: the first metric can't use the '.' or '...' shorthand, as there's no metric above it")
+        return
+    if REST_SAME_AS_ABOVE in fields:
+        return
+    if len(fields) < 2:
+        errors.append(f"{path}: a metric needs at least a namespace and a metric name")
+    elif len(fields) % 2 != 0:
+        errors.append(f"{path}: dimensions must come in name/value pairs after the namespace and metric name")
+
+def _check_metric_widget(properties: Dict[str, Any], path: str, errors: List[str]):
+    metrics = properties.get("metrics")
+    has_alarm = isinstance(properties.get("annotations"), dict) and properties["annotations"].get("alarms")
+    if metrics is None and not has_alarm:
+        errors.append(f"{path}.metrics: a metric widget needs a 'metrics' array")
+    elif metrics is not None:
+        if not isinstance(metrics, list) or not metrics:
+            errors.append(f"{path}.metrics: must be a non-empty array of metric arrays")
+        elif len(metrics) > MAX_METRICS_PER_WIDGET:
+            errors.append(f"{path}.metrics: a widget can show at most {MAX_METRICS_PER_WIDGET} metrics")
+        else:
+            for i, row in enumerate(metrics):
+                _check_metric_row(row, i, f"{path}.metrics[{i}]", errors)
+
+    if "region" not in properties:
+        errors.append(f"{path}.region: a metric widget needs a region, e.g. \"us-west-2\"")
+    _check_rendering(properties, path, errors)
+    if "view" in properties and properties["view"] not in METRIC_VIEWS:
+        errors.append(f"{path}.view: must be one of {sorted(METRIC_VIEWS)}, not {properties['view']!r}")
+
+def _check_widget(widget: Any, path: str, errors: List[str]):
+    if not isinstance(widget, dict):
+        errors.append(f"{path}: each widget must be an object")
+        return
+
+    widget_type = widget.get("type")
+    if widget_type not in WIDGET_TYPES:
+        errors.append(f"{path}.type: must be one of {sorted(WIDGET_TYPES)}, not {widget_type!r}")
+
+    geometry_valid = True
+    for key in ["x", "y", "width", "height"]:
+        value = widget.get(key)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            errors.append(f"{path}.{key}: must be a non-negative integer, not {value!r}")
+            geometry_valid = False
+    if geometry_valid:
+        x, width = widget.get("x", 0), widget.get("width", 6)
+        if not 1 <= width <= GRID_WIDTH or x + width > GRID_WIDTH:
+            errors.append(f"{path}: widgets must fit in the {GRID_WIDTH}-column grid (x={x}, width={width})")
+        if not 1 <= widget.get("height", 6) <= MAX_WIDGET_HEIGHT:
+            errors.append(f"{path}.height: must be between 1 and {MAX_WIDGET_HEIGHT}")
+
+    properties = widget.get("properties")
+    if not isinstance(properties, dict):
+        errors.append(f"{path}.properties: every widget needs a 'properties' object")
+        return
+    path = f"{path}.properties"
+
+    if widget_type == "metric":
+        _check_metric_widget(properties, path, errors)
+    elif widget_type == "text":
+        if not isinstance(properties.get("markdown"), str):
+            errors.append(f"{path}.markdown: a text widget needs a 'markdown' string")
+    elif widget_type == "log":
+        if not isinstance(properties.get("query"), str):
+            errors.append(f"{path}.query: a log widget needs a Logs Insights 'query' string")
+        if not is_valid_region(properties.get("region")):
+            errors.append(f"{path}.region: a log widget needs a valid region")
+    elif widget_type == "alarm":
+        alarms = properties.get("alarms")
+        if not isinstance(alarms, list) or not alarms or not all(isinstance(alarm, str) for alarm in alarms):
+            errors.append(f"{path}.alarms: an alarm widget needs a non-empty array of alarm ARNs")
+
+def validate_dashboard_body(body: Any) -> List[str]:
+    """
+    Returns the problems with a parsed dashboard body, or an empty list if it looks valid.
+    """
+    if not isinstance(body, dict):
+        return ["The dashboard body must be a JSON object with a 'widgets' array"]
+
+    errors: List[str] = []
+    widgets = body.get("widgets")
+    if not isinstance(widgets, list) or not widgets:
+        errors.append("widgets: the dashboard body needs a non-empty 'widgets' array")
+    elif len(widgets) > MAX_WIDGETS:
+        errors.append(f"widgets: a dashboard can have at most {MAX_WIDGETS} widgets, not {len(widgets)}")
+    else:
+        for i, widget in enumerate(widgets):
+            _check_widget(widget, f"widgets[{i}]", errors)
+
+    if "periodOverride" in body and body["periodOverride"] not in ("auto", "inherit"):
+        errors.append("periodOverride: must be 'auto' or 'inherit'")
+
+    if len(errors) > MAX_REPORTED_ERRORS:
+        errors = errors[:MAX_REPORTED_ERRORS] + [f"...and {len(errors) - MAX_REPORTED_ERRORS} more problems"]
+    return errors
+
+def validate_dashboard_json(dashboard_json: str) -> List[str]:
+    """
+    Returns the problems with a dashboard body JSON string, or an empty list if it looks valid.
+    """
+    try:
+        body = json.loads(dashboard_json)
+    except (TypeError, json.JSONDecodeError) as e:
+        return [f"The dashboard body is not valid JSON: {e}"]
+    return validate_dashboard_body(body)
+
+def validate_dashboard_request(dashboard_json: str, aws_region_name: str, dashboard_name: str = None) -> List[str]:
+    """
+    Everything we can check about a dashboard before creating it.
+    """
+    errors = []
+    if not is_valid_region(aws_region_name):
+        errors.append(f"{aws_region_name!r} is not an AWS region")
+    if dashboard_name is not None and not DASHBOARD_NAME_PATTERN.match(dashboard_name):
+        errors.append(f"Dashboard names can only contain letters, numbers, '-' and '_', and be at most 255 "
+            f"characters, unlike {dashboard_name!r}")
+    return errors + validate_dashboard_json(dashboard_json)
+
+def format_validation_errors(errors: List[str]) -> str:
+    return "\n".join(f"- {error}" for error in errors)
+
+#
+# Dashboard ARNs.  PutDashboard doesn't return the ARN, but it only depends on the partition, account, and name, so we
+# build it rather than reading the dashboard back.
+#
+
+def get_account_id(region: str) -> str:
+    return AwsClientProvider(aws_region=region).get_account_id()
+
+def get_dashboard_arn(dashboard_name: str, region: str) -> str:
+    # Dashboards are global within a partition, so their ARNs have no region
+    return f"arn:{get_partition(region)}:cloudwatch::{get_account_id(region)}:dashboard/{dashboard_name}"
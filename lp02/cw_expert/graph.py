@@ -1,30 +1,44 @@
-from functools import wraps
 import logging
-from typing import Annotated, Any, Callable, Dict, List, Literal
+from typing import Annotated, Any, Dict, Iterator, List, Literal, Optional, Union
 from typing_extensions import TypedDict
 
-from langchain_aws import ChatBedrockConverse
-from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolCall, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import END, START, StateGraph
 from langgraph.graph.message import add_messages
 from langgraph.graph.state import CompiledGraph
 
 from approval_expert import APPROVAL_GRAPH, get_approval_expert_system_message
-from cw_expert.tools import TOOLS_ALL, TOOLS_DIRECT_RESPONSE, TOOLS_NORMAL, TOOLS_NEED_APPROVAL
-from utilities.graph import add_messages_with_reset, ResetMessages
+from cw_expert.dashboards import format_validation_errors
+from cw_expert.tools import (APPROVAL_PRECHECKS, TOOL_PROGRESS_MESSAGES, TOOLS_ALL, TOOLS_DIRECT_RESPONSE, TOOLS_NORMAL,
+    TOOLS_NEED_APPROVAL)
+from utilities.checkpointing import get_default_checkpointer
+from utilities.context import ContextBudget, fit_to_budget
+from utilities.graph import (add_messages_with_reset, ainvoke_tool_calls, get_chunk_text, invoke_tool_calls, ResetMessages,
+    StreamEvent)
+from utilities.models import MODEL_ROUTER, ModelConfig, ModelRoute
+from utilities.prompt_caching import PromptCachingConfig
+from utilities.startup import Lazy
+from utilities.tracing import trace_node, TRACER
 
 logger = logging.getLogger(__name__)
 
 
-# Define our LLM
-llm = ChatBedrockConverse(
-    model="anthropic.claude-3-5-sonnet-20240620-v1:0",
-    temperature=0,
-    max_tokens=4096,
-    region_name="us-west-2"
+# The model used to author dashboards and answer questions.  Override with utilities.models.configure_model_routes().
+CW_MODEL_ROUTE = ModelRoute(
+    primary=ModelConfig(model_id="anthropic.claude-3-5-sonnet-20240620-v1:0", max_tokens=4096)
 )
-llm_with_tools = llm.bind_tools(TOOLS_ALL)
+MODEL_ROUTER.register("node_invoke_llm_cw", CW_MODEL_ROUTE, TOOLS_ALL)
+
+# Bedrock prompt caching of the system prompt, tool schemas, and recent history.  Off by default, as not every model
+# supports it.
+PROMPT_CACHING = PromptCachingConfig(enabled=False)
+
+# The full history is kept in the graph state, but the view we send to the LLM is trimmed to this many (estimated)
+# tokens.  Set CONTEXT_BUDGET to None to always send everything.
+CONTEXT_TOKEN_BUDGET = 100_000
+CONTEXT_BUDGET = ContextBudget(max_tokens=CONTEXT_TOKEN_BUDGET)
 
 # Define the state our graph will be operating on
 class CwState(TypedDict):
@@ -48,43 +62,52 @@ def cw_state_to_json(state: CwState) -> Dict[str, Any]:
         "approval_outcome": state.get("approval_outcome", None)
     }
     
-def trace_cw_node(func: Callable[[CwState], Dict[str, Any]]) -> Callable[[CwState], Dict[str, Any]]:
-    @wraps(func)
-    def wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
-        logging.info(f"Entering node: {func.__name__}")
-        state_json = cw_state_to_json(state)
-        logging.debug(f"Starting state: {str(state_json)}")
-        
-        result = func(state)
-        
-        logging.debug(f"Output of {func.__name__}: {result}")
-        
-        return result
-    
-    return wrapper
+# Log node entry/exit and record a tracing span for each node
+trace_cw_node = trace_node(cw_state_to_json)
 
 # Set up our tools
 tools_normal_by_name = {tool.name: tool for tool in TOOLS_NORMAL}
 tools_direct_by_name = {tool.name: tool for tool in TOOLS_DIRECT_RESPONSE}
 tools_approval_by_name = {tool.name: tool for tool in TOOLS_NEED_APPROVAL}
 
-# Initialize memory to persist state between graph runs
-checkpointer = MemorySaver()
-
 # Define our graph
 cw_graph = StateGraph(CwState)
 
-# Set up our graph nodes
+# Set up our graph nodes.  Nodes that call the LLM or tools have both a sync and an async implementation so that
+# the same compiled graph can be driven by either stream() or astream().
+def _normal_tool_results(tool_calls: List[ToolCall], observations: List[str]) -> Dict[str, any]:
+    result = [
+        ToolMessage(name=tool_call["name"], content=observation, tool_call_id=tool_call["id"])
+        for tool_call, observation in zip(tool_calls, observations)
+    ]
+    return {"cw_turns": result}
+
 @trace_cw_node
 def node_tools_normal(state: CwState) -> Dict[str, any]:
     """
-    Node to handle normal tool cals
+    Node to handle normal tool cals.  Every tool call from the LLM's turn is run in parallel, and the results are
+    returned in the order the calls were made.
     """
+    tool_calls = state["cw_turns"][-1].tool_calls
+    observations = invoke_tool_calls(tool_calls, tools_normal_by_name)
+    return _normal_tool_results(tool_calls, observations)
+
+@trace_cw_node
+async def node_tools_normal_async(state: CwState) -> Dict[str, any]:
+    tool_calls = state["cw_turns"][-1].tool_calls
+    observations = await ainvoke_tool_calls(tool_calls, tools_normal_by_name)
+    return _normal_tool_results(tool_calls, observations)
+
+def _direct_tool_results(tool_calls: List[ToolCall], observations: List[str]) -> Dict[str, any]:
     result = []
-    tool_call = state["cw_turns"][-1].tool_calls[-1]
-    tool = tools_normal_by_name[tool_call["name"]]
-    observation = tool.invoke(tool_call["args"])
-    result.append(ToolMessage(name=tool_call["name"], content=observation, tool_call_id=tool_call["id"]))
+    direct_observations = []
+    for tool_call, observation in zip(tool_calls, observations):
+        if tool_call["name"] in tools_direct_by_name:
+            result.append(ToolMessage(name="DummyToolNodeDirect", content=observation, tool_call_id=tool_call["id"]))
+            direct_observations.append(observation)
+        else:
+            result.append(ToolMessage(name=tool_call["name"], content=observation, tool_call_id=tool_call["id"]))
+    result.append(AIMessage(content="\n\n".join(direct_observations)))
 
     return {"cw_turns": result}
 
@@ -92,18 +115,27 @@ def node_tools_normal(state: CwState) -> Dict[str, any]:
 def node_tools_direct_resp(state: CwState):
     """
     Node to handle tool calls where we need to return the raw response from the tool directly
-    to the user rather than passing it through the LLM first.
+    to the user rather than passing it through the LLM first.  Any normal tool calls made in the same turn are run
+    alongside the direct ones so that every call is paired with a result.
 
     This requires special handling, as LLM APIs expect an AIMessage between each ToolMessage
     and any HumanMessage.  We spoof that by adding an AIMessage at the end of our calls here.
     """
-    result = []
-    tool_call = state["cw_turns"][-1].tool_calls[-1]
-    tool = tools_direct_by_name[tool_call["name"]]
-    observation = tool.invoke(tool_call["args"])
-    result.append(ToolMessage(name="DummyToolNodeDirect", content=observation, tool_call_id=tool_call["id"]))
-    result.append(AIMessage(content=observation))
+    tool_calls = state["cw_turns"][-1].tool_calls
+    observations = invoke_tool_calls(tool_calls, {**tools_normal_by_name, **tools_direct_by_name})
+    return _direct_tool_results(tool_calls, observations)
 
+@trace_cw_node
+async def node_tools_direct_resp_async(state: CwState):
+    tool_calls = state["cw_turns"][-1].tool_calls
+    observations = await ainvoke_tool_calls(tool_calls, {**tools_normal_by_name, **tools_direct_by_name})
+    return _direct_tool_results(tool_calls, observations)
+
+def _approval_tool_results(tool_calls: List[ToolCall], observations: List[str]) -> Dict[str, any]:
+    result = [
+        ToolMessage(name="DummyToolNodeApproval", content=observation, tool_call_id=tool_call["id"])
+        for tool_call, observation in zip(tool_calls, observations)
+    ]
     return {"cw_turns": result}
 
 @trace_cw_node
@@ -113,15 +145,49 @@ def node_tools_approval_req(state: CwState):
     operator.
 
     This requires special handling because we need to pull the tool details from the graph state
-    rather than the message state.
+    rather than the message state.  Every approved tool call is run in parallel.
     """
-    tool_call = state["ops_to_approve"][-1]
-    tool = tools_approval_by_name[tool_call["name"]]
-    observation = tool.invoke(tool_call["args"])
-    
-    result = ToolMessage(name="DummyToolNodeApproval", content=observation, tool_call_id=tool_call["id"])
+    tool_calls = state["ops_to_approve"]
+    observations = invoke_tool_calls(tool_calls, {**tools_normal_by_name, **tools_approval_by_name})
+    return _approval_tool_results(tool_calls, observations)
 
-    return {"cw_turns": [result]}
+@trace_cw_node
+async def node_tools_approval_req_async(state: CwState):
+    tool_calls = state["ops_to_approve"]
+    observations = await ainvoke_tool_calls(tool_calls, {**tools_normal_by_name, **tools_approval_by_name})
+    return _approval_tool_results(tool_calls, observations)
+
+def _precheck_errors(tool_calls: List[ToolCall]) -> Dict[str, List[str]]:
+    """
+    Runs the pre-approval checks on the tool calls, returning the problems found with each call, by tool call ID.
+    """
+    errors = {}
+    for tool_call in tool_calls:
+        precheck = APPROVAL_PRECHECKS.get(tool_call["name"])
+        call_errors = precheck(tool_call["args"]) if precheck else []
+        if call_errors:
+            errors[tool_call["id"]] = call_errors
+    return errors
+
+@trace_cw_node
+def node_reject_invalid_ops(state: CwState):
+    """
+    Node to send operations that failed their pre-approval checks back to the LLM, rather than asking the human
+    operator to approve something we know won't work.  None of the turn's tool calls are run, so that the LLM can
+    resubmit them together once they're fixed.
+    """
+    tool_calls = state["cw_turns"][-1].tool_calls
+    errors = _precheck_errors(tool_calls)
+    result = []
+    for tool_call in tool_calls:
+        if tool_call["id"] in errors:
+            content = ("Error: The operation is invalid, so it was not sent for approval:\n"
+                + format_validation_errors(errors[tool_call["id"]]))
+        else:
+            content = ("Error: Not run, as another operation in the same request is invalid.  Resubmit it with the "
+                "fixed operation.")
+        result.append(ToolMessage(name="DummyToolNodeRejected", content=content, tool_call_id=tool_call["id"]))
+    return {"cw_turns": result}
 
 @trace_cw_node
 def node_prep_approval_seq(state: CwState):
@@ -144,16 +210,23 @@ def node_prep_approval_seq(state: CwState):
 
 @trace_cw_node
 def node_invoke_llm_cw(state: CwState):
-    cw_turns = state['cw_turns']
-    response = llm_with_tools.invoke(cw_turns)
+    cw_turns = fit_to_budget(state['cw_turns'], CONTEXT_BUDGET)
+    response = MODEL_ROUTER.invoke("node_invoke_llm_cw", cw_turns, PROMPT_CACHING)
+    return {"cw_turns": [response]}
+
+@trace_cw_node
+async def node_invoke_llm_cw_async(state: CwState):
+    cw_turns = fit_to_budget(state['cw_turns'], CONTEXT_BUDGET)
+    response = await MODEL_ROUTER.ainvoke("node_invoke_llm_cw", cw_turns, PROMPT_CACHING)
     return {"cw_turns": [response]}
 
-cw_graph.add_node("node_invoke_llm_cw", node_invoke_llm_cw)
-cw_graph.add_node("node_tools_normal", node_tools_normal)
-cw_graph.add_node("node_tools_direct_resp", node_tools_direct_resp)
+cw_graph.add_node("node_invoke_llm_cw", RunnableLambda(node_invoke_llm_cw, afunc=node_invoke_llm_cw_async))
+cw_graph.add_node("node_tools_normal", RunnableLambda(node_tools_normal, afunc=node_tools_normal_async))
+cw_graph.add_node("node_tools_direct_resp", RunnableLambda(node_tools_direct_resp, afunc=node_tools_direct_resp_async))
+cw_graph.add_node("node_reject_invalid_ops", node_reject_invalid_ops)
 cw_graph.add_node("node_prep_approval_seq", node_prep_approval_seq)
-cw_graph.add_node("node_approval_seq", APPROVAL_GRAPH.compile(checkpointer=checkpointer))
-cw_graph.add_node("node_tools_approval_req", node_tools_approval_req)
+cw_graph.add_node("node_approval_seq", APPROVAL_GRAPH.compile())
+cw_graph.add_node("node_tools_approval_req", RunnableLambda(node_tools_approval_req, afunc=node_tools_approval_req_async))
 
 # Define our graph edges
 def starting_node(state: CwState) -> Literal["node_approval_seq", "node_invoke_llm_cw"]:
@@ -169,16 +242,22 @@ def starting_node(state: CwState) -> Literal["node_approval_seq", "node_invoke_l
     # Otherwise, we start with the LLM
     return "node_invoke_llm_cw"
 
-def next_node(state: CwState) -> Literal["node_prep_approval_seq", "node_tools_direct_resp", "node_tools_normal", END]:
+def next_node(state: CwState) -> Literal["node_reject_invalid_ops", "node_prep_approval_seq", "node_tools_direct_resp",
+        "node_tools_normal", END]:
     cw_turns = state['cw_turns']
     last_message = cw_turns[-1]
+    tool_names = [tool_call["name"] for tool_call in last_message.tool_calls]
+    # The tool request needs approval; route accordingly.  This takes priority, as nothing in the turn should run
+    # until the human operator has weighed in.
+    if any(name in tools_approval_by_name for name in tool_names):
+        # ...unless we can already tell it won't work, in which case it goes back to the LLM to fix
+        if _precheck_errors(last_message.tool_calls):
+            return "node_reject_invalid_ops"
+        return "node_prep_approval_seq"
     # Route to the tools needing a direct response
-    if last_message.tool_calls and last_message.tool_calls[-1]["name"] in tools_direct_by_name.keys():
+    if any(name in tools_direct_by_name for name in tool_names):
         return "node_tools_direct_resp"
-    # The tool request needs approval; route accordingly
-    if last_message.tool_calls and last_message.tool_calls[-1]["name"] in tools_approval_by_name.keys():
-        return "node_prep_approval_seq"
-    elif last_message.tool_calls:
+    elif tool_names:
         return "node_tools_normal"
     return END
 
@@ -219,29 +298,120 @@ cw_graph.add_conditional_edges("node_approval_seq", next_node_after_approval)
 
 cw_graph.add_edge("node_tools_normal", 'node_invoke_llm_cw')
 cw_graph.add_edge("node_tools_approval_req", 'node_invoke_llm_cw')
+cw_graph.add_edge("node_reject_invalid_ops", 'node_invoke_llm_cw')
 cw_graph.add_edge("node_tools_direct_resp", END)
 cw_graph.add_edge("node_prep_approval_seq", END)
 
-# Finally, compile the graph into a LangChain Runnable
-CW_GRAPH = cw_graph.compile(checkpointer=checkpointer)
+# Finally, compile the graph into a LangChain Runnable.  State is persisted between graph runs by a checkpointer; any
+# LangGraph checkpointer can be plugged in via compile_cw_graph().  The approval sub-graph is compiled without one so
+# that it shares whichever checkpointer the parent graph uses.
+def compile_cw_graph(checkpointer: BaseCheckpointSaver) -> CompiledGraph:
+    return cw_graph.compile(checkpointer=checkpointer)
+
+# Compiled (and the default checkpointer opened) on first use, so importing the package stays cheap
+CW_GRAPH: Lazy[CompiledGraph] = Lazy("compile CW graph", lambda: compile_cw_graph(get_default_checkpointer()))
+
+def create_runner(workflow: Union[CompiledGraph, Lazy[CompiledGraph]]):
+    def run_workflow(cw_state: CwState, thread: Union[int, str]) -> CwState:
+        with TRACER.span("CW_GRAPH", "graph", thread_id=thread):
+            states = workflow.stream(
+                cw_state,
+                config={"configurable": {"thread_id": thread}},
+                stream_mode="values"
+            )
+
+            final_state = None
+            for state in states:
+                if "cw_turns" in state:
+                    state["cw_turns"][-1].pretty_print()
+                    logger.info(state["cw_turns"][-1].to_json())
+                final_state = state
+
+        return final_state
+
+    return run_workflow
 
-def _create_runner(workflow: CompiledGraph):
-    def run_workflow(cw_state: CwState, thread: int) -> CwState:
-        states = workflow.stream(
-            cw_state,
-            config={"configurable": {"thread_id": thread}},
-            stream_mode="values"
-        )
+CW_GRAPH_RUNNER = create_runner(CW_GRAPH)
 
-        final_state = None
-        for state in states:
-            if "cw_turns" in state:
-                state["cw_turns"][-1].pretty_print()
-                logger.info(state["cw_turns"][-1].to_json())
-            final_state = state
+def create_async_runner(workflow: Union[CompiledGraph, Lazy[CompiledGraph]]):
+    """
+    Async equivalent of create_runner.  Many conversations can be in flight on a single event loop at once, as
+    long as each uses its own thread.
+    """
+    async def run_workflow(cw_state: CwState, thread: Union[int, str]) -> CwState:
+        with TRACER.span("CW_GRAPH", "graph", thread_id=thread):
+            states = workflow.astream(
+                cw_state,
+                config={"configurable": {"thread_id": thread}},
+                stream_mode="values"
+            )
+
+            final_state = None
+            async for state in states:
+                if "cw_turns" in state:
+                    logger.info(state["cw_turns"][-1].to_json())
+                final_state = state
 
         return final_state
 
     return run_workflow
 
-CW_GRAPH_RUNNER = _create_runner(CW_GRAPH)
\ No newline at end of file
+CW_GRAPH_ASYNC_RUNNER = create_async_runner(CW_GRAPH)
+
+# Status messages shown to the user when a node starts.  Tool nodes report on the tools they are running instead.
+NODE_PROGRESS_MESSAGES = {
+    "node_invoke_llm_cw": "Thinking...",
+    "node_invoke_llm_approval": "Reviewing your response...",
+}
+LLM_NODES = ["node_invoke_llm_cw", "node_invoke_llm_approval"]
+
+def _get_progress_message(node_name: str, node_input: Any) -> Optional[str]:
+    tool_calls = []
+    if node_name in ["node_tools_normal", "node_tools_direct_resp"]:
+        tool_calls = node_input["cw_turns"][-1].tool_calls
+    elif node_name == "node_tools_approval_req":
+        tool_calls = node_input["ops_to_approve"]
+
+    if tool_calls:
+        return " ".join(dict.fromkeys(
+            TOOL_PROGRESS_MESSAGES.get(tool_call["name"], f"Running {tool_call['name']}...") for tool_call in tool_calls
+        ))
+    return NODE_PROGRESS_MESSAGES.get(node_name)
+
+def create_streaming_runner(workflow: Union[CompiledGraph, Lazy[CompiledGraph]]):
+    """
+    Like create_runner, but yields StreamEvents while the graph runs: a "progress" event as each node starts, a
+    "token" event for each piece of LLM output text, and finally a "final" event with the final state.
+    """
+    def stream_workflow(cw_state: CwState, thread: Union[int, str]) -> Iterator[StreamEvent]:
+        with TRACER.span("CW_GRAPH", "graph", thread_id=thread):
+            chunks = workflow.stream(
+                cw_state,
+                config={"configurable": {"thread_id": thread}},
+                stream_mode=["messages", "debug", "values"],
+                subgraphs=True
+            )
+
+            final_state = None
+            for namespace, mode, chunk in chunks:
+                if mode == "messages":
+                    message, metadata = chunk
+                    if isinstance(message, AIMessageChunk) and metadata.get("langgraph_node") in LLM_NODES:
+                        text = get_chunk_text(message)
+                        if text:
+                            yield StreamEvent(kind="token", content=text)
+                elif mode == "debug" and chunk["type"] == "task":
+                    progress_message = _get_progress_message(chunk["payload"]["name"], chunk["payload"]["input"])
+                    if progress_message:
+                        yield StreamEvent(kind="progress", content=progress_message)
+                elif mode == "values" and not namespace:
+                    final_state = chunk
+
+            if final_state and "cw_turns" in final_state:
+                logger.info(final_state["cw_turns"][-1].to_json())
+            yield StreamEvent(kind="final", content=final_state)
+
+
+    return stream_workflow
+
+CW_GRAPH_STREAMING_RUNNER = create_streaming_runner(CW_GRAPH)
\ No newline at end of file
@@ -0,0 +1,169 @@
+from dataclasses import dataclass
+import difflib
+import json
+import logging
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+from utilities.startup import Lazy
+
+logger = logging.getLogger(__name__)
+
+#
+# A searchable catalog of the AWS/ES CloudWatch metrics, so the LLM can ask "which metrics relate to indexing?" and get
+# a short answer rather than the domain's whole metric listing.  The catalog itself (names, descriptions, units,
+# recommended statistics, and categories) is versioned data in metric_catalog.json; update its version when editing it.
+#
+# Queries are matched against an inverted index of the words in each metric's name, category, and description.  Words
+# are stemmed crudely and expanded with a few synonyms, and words the index doesn't know are matched to the closest
+# ones it does, so "latncy" and "heap" still find something.
+#
+
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), "metric_catalog.json")
+
+# How much a query word counts for depending on where it matched; a word found in several places counts for each
+NAME_WEIGHT = 3.0
+CATEGORY_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+FUZZY_MATCH_PENALTY = 0.7
+FUZZY_MATCH_CUTOFF = 0.8
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "i", "if", "in", "is", "it", "me", "metric",
+    "metrics", "my", "of", "on", "or", "relate", "related", "show", "that", "the", "to", "what", "which", "with",
+}
+
+# Words people ask with (or their beginnings, so "healthy" counts as "health") -> words the catalog uses
+SYNONYMS = {
+    "disk": ["storage", "ebs", "volume"],
+    "error": ["5xx", "4xx", "fail", "reject"],
+    "gc": ["garbage", "collection"],
+    "health": ["status", "cluster"],
+    "heap": ["jvm", "heap"],
+    "ingest": ["index", "write", "bulk"],
+    "latency": ["latency", "time"],
+    "performance": ["latency", "rate"],
+    "query": ["search"],
+    "read": ["search", "get", "read"],
+    "slow": ["latency", "queue"],
+    "space": ["storage"],
+    "throttl": ["throttl", "reject", "burst"],
+    "vector": ["knn"],
+    "warm": ["ultrawarm", "warm"],
+    "write": ["index", "write", "bulk"],
+}
+
+@dataclass
+class CatalogEntry:
+    name: str
+    category: str
+    unit: str
+    statistics: List[str]
+    description: str
+
+    def describe(self) -> str:
+        return f"{self.name} [{self.unit}; {'/'.join(self.statistics)}] ({self.category}): {self.description}"
+
+def _stem(word: str) -> str:
+    for suffix in ["ions", "ion", "ing", "es", "ed", "s"]:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+def split_metric_name(name: str) -> List[str]:
+    """
+    Splits a CamelCase metric name into lower-case words, keeping acronyms together.  For example,
+    "JVMGCOldCollectionTime" -> ["jvmgc", "old", "collection", "time"], "ClusterStatus.red" -> ["cluster", "status",
+    "red"].
+    """
+    return [word.lower() for word in re.findall(r"[A-Z]+(?![a-z])|[A-Z][a-z]*|[a-z]+|\d+[a-z]*", name)]
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-case, stemmed words of free text or metric names, without stop words.
+    """
+    words = []
+    for chunk in re.findall(r"[A-Za-z0-9]+", text):
+        words.extend(split_metric_name(chunk) if chunk != chunk.lower() else [chunk.lower()])
+    return [_stem(word) for word in words if word.lower() not in STOP_WORDS]
+
+class MetricCatalog:
+    def __init__(self, version: str, entries: List[CatalogEntry]):
+        """
+        The catalog's entries plus an inverted index of word -> {metric name: summed weight of where the word appears}.
+        """
+        self.version = version
+        self.entries: Dict[str, CatalogEntry] = {entry.name: entry for entry in entries}
+        self._index: Dict[str, Dict[str, float]] = {}
+        for entry in entries:
+            self._add(entry.name, tokenize(entry.name), NAME_WEIGHT)
+            self._add(entry.name, tokenize(entry.category), CATEGORY_WEIGHT)
+            self._add(entry.name, tokenize(entry.description), DESCRIPTION_WEIGHT)
+        self._vocabulary = sorted(self._index)
+
+    def _add(self, metric_name: str, words: Iterable[str], weight: float):
+        for word in set(words):
+            postings = self._index.setdefault(word, {})
+            postings[metric_name] = postings.get(metric_name, 0.0) + weight
+
+    def _expand(self, word: str) -> Dict[str, float]:
+        """
+        The indexed words a query word stands for, with how much each counts.
+        """
+        expansions = {word: 1.0}
+        for key, synonyms in SYNONYMS.items():
+            if word.startswith(key):
+                for synonym in synonyms:
+                    expansions.setdefault(_stem(synonym), 1.0)
+        # Prefixes ("thread" -> "threadpool") and near misses ("latncy" -> "latency") count for a bit less
+        for indexed_word in self._vocabulary:
+            if len(word) >= 3 and indexed_word.startswith(word) and indexed_word != word:
+                expansions.setdefault(indexed_word, FUZZY_MATCH_PENALTY)
+        if not any(expansion in self._index for expansion in expansions):
+            for close_word in difflib.get_close_matches(word, self._vocabulary, n=3, cutoff=FUZZY_MATCH_CUTOFF):
+                expansions.setdefault(close_word, FUZZY_MATCH_PENALTY)
+        return expansions
+
+    def score(self, query: str) -> Dict[str, float]:
+        """
+        Returns metric name -> relevance for every catalog metric that matches any word of the query.
+        """
+        scores: Dict[str, float] = {}
+        for word in dict.fromkeys(tokenize(query)):
+            word_scores: Dict[str, float] = {}
+            for expansion, factor in self._expand(word).items():
+                for metric_name, weight in self._index.get(expansion, {}).items():
+                    word_scores[metric_name] = max(word_scores.get(metric_name, 0.0), weight * factor)
+            for metric_name, word_score in word_scores.items():
+                scores[metric_name] = scores.get(metric_name, 0.0) + word_score
+        return scores
+
+    def search(self, query: str, metric_names: Optional[Iterable[str]] = None,
+            max_results: int = 20) -> List[CatalogEntry]:
+        """
+        Returns the catalog entries most relevant to the query, best first, optionally only those in metric_names.
+        """
+        scores = self.score(query)
+        if metric_names is not None:
+            allowed: Set[str] = set(metric_names)
+            scores = {name: score for name, score in scores.items() if name in allowed}
+        ranked = sorted(scores, key=lambda name: (-scores[name], name))
+        return [self.entries[name] for name in ranked[:max_results]]
+
+    def search_uncataloged(self, query: str, metric_names: Iterable[str]) -> List[str]:
+        """
+        Returns the metric names that aren't in the catalog but whose own words match the query, e.g. metrics added to
+        AWS/ES after the catalog was last updated.
+        """
+        query_words = {expansion for word in tokenize(query) for expansion in self._expand(word)}
+        return [name for name in metric_names if name not in self.entries and query_words & set(tokenize(name))]
+
+def load_catalog(path: str = CATALOG_PATH) -> MetricCatalog:
+    with open(path) as catalog_file:
+        data = json.load(catalog_file)
+    catalog = MetricCatalog(data["version"], [CatalogEntry(**entry) for entry in data["metrics"]])
+    logger.info(f"Loaded metric catalog version {catalog.version} ({len(catalog.entries)} metrics)")
+    return catalog
+
+METRIC_CATALOG: Lazy[MetricCatalog] = Lazy("metric_catalog", load_catalog)
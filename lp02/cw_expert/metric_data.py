@@ -0,0 +1,254 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+#
+# Fetch CloudWatch metric time series in bulk with GetMetricData and boil each one down to a handful of statistics.
+# The LLM only needs to know whether a metric is high, spiking, trending, or missing data, and a one-line summary
+# answers that at a small fraction of the tokens the raw datapoints would take.
+#
+
+# GetMetricData accepts at most 500 queries per request
+MAX_QUERIES_PER_REQUEST = 500
+
+@dataclass
+class MetricQuery:
+    metric_name: str
+    dimensions: Dict[str, str]
+    stat: str = "Average"
+    namespace: str = "AWS/ES"
+
+@dataclass
+class MetricSeries:
+    query: MetricQuery
+    timestamps: List[datetime] = field(default_factory=list)
+    values: List[float] = field(default_factory=list)
+
+@dataclass
+class SeriesSummary:
+    metric_name: str
+    stat: str
+    expected_points: int
+    points: int = 0
+    minimum: float = 0.0
+    maximum: float = 0.0
+    mean: float = 0.0
+    p50: float = 0.0
+    p99: float = 0.0
+    latest: float = 0.0
+    trend_per_hour: float = 0.0  # Slope of the least-squares line through the series, in units per hour
+    longest_gap_seconds: int = 0
+
+    @property
+    def has_data(self) -> bool:
+        return self.points > 0
+
+def _to_metric_data_query(query_id: str, query: MetricQuery, period_seconds: int) -> Dict[str, Any]:
+    return {
+        "Id": query_id,
+        "MetricStat": {
+            "Metric": {
+                "Namespace": query.namespace,
+                "MetricName": query.metric_name,
+                "Dimensions": [{"Name": name, "Value": value} for name, value in query.dimensions.items()],
+            },
+            "Period": period_seconds,
+            "Stat": query.stat,
+        },
+        "ReturnData": True,
+    }
+
+def _chunks(items: List[Any], size: int) -> Iterator[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def fetch_metric_series(cloudwatch_client: Any, queries: List[MetricQuery], start_time: datetime,
+        end_time: datetime, period_seconds: int) -> List[MetricSeries]:
+    """
+    Fetches every query's datapoints between start_time and end_time, packing up to MAX_QUERIES_PER_REQUEST queries
+    into each GetMetricData call and following NextToken until each batch is complete.  A query's datapoints can be
+    split across pages, so they're collected by query ID.  Returns one MetricSeries per query, in the same order.
+    """
+    series = [MetricSeries(query=query) for query in queries]
+
+    for batch_number, batch in enumerate(_chunks(list(enumerate(queries)), MAX_QUERIES_PER_REQUEST)):
+        # Query IDs must start with a lower-case letter, and only need to be unique within a request
+        series_by_id = {f"m{i}": series[i] for i, _ in batch}
+        request = {
+            "MetricDataQueries": [_to_metric_data_query(f"m{i}", query, period_seconds) for i, query in batch],
+            "StartTime": start_time,
+            "EndTime": end_time,
+            "ScanBy": "TimestampAscending",
+        }
+
+        pages = 0
+        while True:
+            response = cloudwatch_client.get_metric_data(**request)
+            pages += 1
+            for result in response.get("MetricDataResults", []):
+                metric_series = series_by_id[result["Id"]]
+                metric_series.timestamps.extend(result.get("Timestamps", []))
+                metric_series.values.extend(result.get("Values", []))
+            for message in response.get("Messages", []):
+                logger.warning(f"GetMetricData: {message.get('Code')}: {message.get('Value')}")
+
+            next_token = response.get("NextToken")
+            if not next_token:
+                break
+            request["NextToken"] = next_token
+        logger.debug(f"Fetched batch {batch_number} ({len(batch)} queries) in {pages} pages")
+
+    return series
+
+def get_slot_count(start_time: datetime, end_time: datetime, period_seconds: int) -> int:
+    return max(1, int((end_time - start_time).total_seconds()) // period_seconds)
+
+def series_to_matrix(series: List[MetricSeries], start_time: datetime, end_time: datetime,
+        period_seconds: int) -> "np.ndarray":
+    """
+    Lays the series out as rows of a (series x period) matrix, with NaN where a period has no datapoint.
+    """
+    # numpy is slow to import, so wait until there's data to summarize
+    import numpy as np
+
+    slot_count = get_slot_count(start_time, end_time, period_seconds)
+    start_epoch = start_time.timestamp()
+
+    matrix = np.full((len(series), slot_count), np.nan)
+    for row, metric_series in enumerate(series):
+        if not metric_series.values:
+            continue
+        epochs = np.fromiter(map(datetime.timestamp, metric_series.timestamps), dtype=np.float64,
+            count=len(metric_series.timestamps))
+        slots = ((epochs - start_epoch) // period_seconds).astype(np.int64)
+        in_window = (slots >= 0) & (slots < slot_count)
+        matrix[row, slots[in_window]] = np.asarray(metric_series.values, dtype=np.float64)[in_window]
+    return matrix
+
+def summarize_series(series: List[MetricSeries], start_time: datetime, end_time: datetime,
+        period_seconds: int) -> List[SeriesSummary]:
+    matrix = series_to_matrix(series, start_time, end_time, period_seconds)
+    return summarize_matrix([metric_series.query for metric_series in series], matrix, period_seconds)
+
+def summarize_matrix(queries: List[MetricQuery], matrix: "np.ndarray", period_seconds: int) -> List[SeriesSummary]:
+    """
+    Summarizes every row of a (series x period) matrix at once, as laid out by series_to_matrix(), so each statistic
+    is a single NumPy reduction over the whole matrix rather than a Python loop per series.
+    """
+    import numpy as np
+
+    slot_count = matrix.shape[1]
+    present = ~np.isnan(matrix)
+    points = present.sum(axis=1)
+    has_data = points > 0
+
+    summaries = [
+        SeriesSummary(metric_name=query.metric_name, stat=query.stat, expected_points=slot_count, points=int(count))
+        for query, count in zip(queries, points)
+    ]
+    if not has_data.any():
+        return summaries
+
+    data = matrix[has_data]
+    data_present = present[has_data]
+    minimums = np.nanmin(data, axis=1)
+    maximums = np.nanmax(data, axis=1)
+    means = np.nanmean(data, axis=1)
+    p50s, p99s = np.nanpercentile(data, [50, 99], axis=1)
+
+    # The latest value is the one in the last non-NaN column of each row
+    last_slots = slot_count - 1 - np.argmax(data_present[:, ::-1], axis=1)
+    latest = data[np.arange(len(data)), last_slots]
+
+    # Least-squares slope of each row against time, ignoring missing periods
+    hours = np.arange(slot_count) * (period_seconds / 3600)
+    counts = data_present.sum(axis=1)
+    hour_means = np.where(data_present, hours, 0.0).sum(axis=1) / counts
+    hour_deltas = np.where(data_present, hours - hour_means[:, None], 0.0)
+    value_deltas = np.where(data_present, data - means[:, None], 0.0)
+    spreads = (hour_deltas ** 2).sum(axis=1)
+    slopes = np.divide((hour_deltas * value_deltas).sum(axis=1), spreads, out=np.zeros(len(data)),
+        where=spreads > 0)
+
+    # The longest run of missing periods: at each present period, the distance back to the previous present one (with
+    # sentinel present periods just outside both ends of the window)
+    padded = np.pad(data_present, ((0, 0), (1, 1)), constant_values=True)
+    columns = np.arange(padded.shape[1])
+    last_present = np.maximum.accumulate(np.where(padded, columns, 0), axis=1)
+    longest_gaps = np.where(padded[:, 1:], columns[1:] - last_present[:, :-1] - 1, 0).max(axis=1)
+
+    for i, row in enumerate(np.flatnonzero(has_data)):
+        summary = summaries[row]
+        summary.minimum = float(minimums[i])
+        summary.maximum = float(maximums[i])
+        summary.mean = float(means[i])
+        summary.p50 = float(p50s[i])
+        summary.p99 = float(p99s[i])
+        summary.latest = float(latest[i])
+        summary.trend_per_hour = float(slopes[i])
+        summary.longest_gap_seconds = int(longest_gaps[i]) * period_seconds
+    return summaries
+
+# A trend that would move the series by less than this fraction of its mean across the window is reported as flat
+FLAT_TREND_THRESHOLD = 0.05
+
+def _format_number(value: float) -> str:
+    return f"{value:.4g}"
+
+def _format_duration(seconds: int) -> str:
+    if seconds >= 3600:
+        return f"{seconds / 3600:.3g}h"
+    if seconds >= 60:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
+
+def describe_trend(summary: SeriesSummary, window_hours: float) -> str:
+    change = summary.trend_per_hour * window_hours
+    scale = abs(summary.mean) or abs(summary.maximum) or 1.0
+    if abs(change) < FLAT_TREND_THRESHOLD * scale:
+        return "flat"
+    direction = "rising" if change > 0 else "falling"
+    return f"{direction} {_format_number(summary.trend_per_hour)}/h"
+
+def format_summary(summary: SeriesSummary, window_hours: float) -> str:
+    parts = [
+        f"min={_format_number(summary.minimum)}",
+        f"max={_format_number(summary.maximum)}",
+        f"mean={_format_number(summary.mean)}",
+        f"p50={_format_number(summary.p50)}",
+        f"p99={_format_number(summary.p99)}",
+        f"latest={_format_number(summary.latest)}",
+        f"trend={describe_trend(summary, window_hours)}",
+    ]
+    missing = summary.expected_points - summary.points
+    if missing:
+        parts.append(f"gaps={missing}/{summary.expected_points} periods missing, longest "
+            f"{_format_duration(summary.longest_gap_seconds)}")
+    return f"{summary.metric_name} ({summary.stat}): {' '.join(parts)}"
+
+def format_summaries(summaries: List[SeriesSummary], window_hours: float) -> str:
+    """
+    One line per metric with data, then a single line naming the metrics without any.
+    """
+    lines = [format_summary(summary, window_hours) for summary in summaries if summary.has_data]
+    no_data = [summary.metric_name for summary in summaries if not summary.has_data]
+    if no_data:
+        lines.append(f"No datapoints for: {', '.join(no_data)}")
+    return "\n".join(lines)
+
+def get_time_window(window_hours: float, period_seconds: int,
+        now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """
+    Returns the (start, end) of the window ending now, aligned to the period so that CloudWatch's buckets line up with
+    the summary's.
+    """
+    now = now or datetime.now(timezone.utc)
+    end_epoch = int(now.timestamp()) // period_seconds * period_seconds
+    end_time = datetime.fromtimestamp(end_epoch, tz=timezone.utc)
+    return end_time - timedelta(seconds=int(window_hours * 3600) // period_seconds * period_seconds), end_time
@@ -0,0 +1,347 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from cw_expert.metric_data import fetch_metric_series, MetricQuery, series_to_matrix
+from utilities.caching import CacheStats
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+#
+# A local store of the CloudWatch time series we've fetched, so that asking about the same domain's metrics again only
+# downloads the periods we haven't seen.  Each (domain ARN, metric, statistic, period) series is a file of float64
+# values, one per period on a fixed grid (period number = epoch seconds // period), with NaN for periods without a
+# datapoint.  The files are memory-mapped, so reading a window is a slice rather than a parse.  An index records which
+# periods of each series have been fetched, since a NaN can mean either "no datapoint" or "never asked".
+#
+# CloudWatch keeps filling in the most recent periods for a few minutes, so periods newer than settle_seconds are
+# always fetched again rather than recorded as fetched.
+#
+
+DEFAULT_STORE_DIRECTORY = "./metric_store"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_SETTLE_SECONDS = 10 * 60
+
+# A series is restarted rather than extended if covering both the old and new periods would take more than this
+MAX_PERIODS_PER_SERIES = 500_000
+
+INDEX_FILE_NAME = "index.json"
+INDEX_VERSION = 1
+VALUE_SIZE_BYTES = 8
+
+@dataclass
+class MetricStoreConfig:
+    """
+    enabled: whether to keep fetched series at all; when off, every window is fetched from CloudWatch
+    directory: where the series files and their index live
+    max_bytes: bound on the size of the series files; the least recently used series are evicted past it
+    settle_seconds: how far behind now a period has to be before it's treated as final
+    """
+    enabled: bool = True
+    directory: str = DEFAULT_STORE_DIRECTORY
+    max_bytes: int = DEFAULT_MAX_BYTES
+    settle_seconds: int = DEFAULT_SETTLE_SECONDS
+
+@dataclass
+class _SeriesEntry:
+    domain_arn: str
+    metric_name: str
+    stat: str
+    period_seconds: int
+    first_slot: int
+    slot_count: int
+    covered: List[List[int]]  # Sorted, non-overlapping [start, end) slot ranges that have been fetched
+    last_access: float
+
+    @property
+    def size_bytes(self) -> int:
+        return self.slot_count * VALUE_SIZE_BYTES
+
+    def to_json(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+def _series_id(domain_arn: str, metric_name: str, stat: str, period_seconds: int) -> str:
+    key = json.dumps([domain_arn, metric_name, stat, period_seconds])
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def _missing_span(covered: List[List[int]], start: int, end: int) -> Optional[Tuple[int, int]]:
+    """
+    The smallest single range that contains every period of [start, end) not yet covered, or None if all are.  One
+    request for the whole span beats several for its holes, which are usually just the newest periods anyway.
+    """
+    missing = []
+    cursor = start
+    for covered_start, covered_end in covered:
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            missing.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        missing.append((cursor, end))
+    return (missing[0][0], missing[-1][1]) if missing else None
+
+def _add_range(covered: List[List[int]], start: int, end: int) -> List[List[int]]:
+    merged: List[List[int]] = []
+    for range_start, range_end in sorted(covered + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+def _to_datetime(slot: int, period_seconds: int) -> datetime:
+    return datetime.fromtimestamp(slot * period_seconds, tz=timezone.utc)
+
+class MetricStore:
+    def __init__(self, config: MetricStoreConfig):
+        """
+        Size-bounded, thread-safe store of fetched CloudWatch series, laid out as described above.
+        """
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+        self.configure(config)
+
+    def configure(self, config: MetricStoreConfig):
+        with self._lock:
+            self.config = config
+            self._entries: Dict[str, _SeriesEntry] = {}
+            self._loaded = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.enabled
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._entries.values())
+
+    def _path(self, series_id: str) -> str:
+        return os.path.join(self.config.directory, f"{series_id}.f64")
+
+    def _ensure_loaded(self):
+        # The directory is only created and read on first use, so importing the store costs nothing
+        if not self._loaded:
+            os.makedirs(self.config.directory, exist_ok=True)
+            self._load_index()
+            self._loaded = True
+
+    def _load_index(self):
+        index_path = os.path.join(self.config.directory, INDEX_FILE_NAME)
+        try:
+            with open(index_path) as index_file:
+                index = json.load(index_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable metric store index {index_path}: {e}")
+            return
+        if index.get("version") != INDEX_VERSION:
+            logger.warning(f"Ignoring metric store index {index_path} with version {index.get('version')}")
+            return
+        for series_id, entry in index["series"].items():
+            if os.path.exists(self._path(series_id)):
+                self._entries[series_id] = _SeriesEntry(**entry)
+
+    def _save_index(self):
+        # Write and rename, so a crash never leaves a half-written index behind
+        index_path = os.path.join(self.config.directory, INDEX_FILE_NAME)
+        temp_path = f"{index_path}.tmp"
+        with open(temp_path, "w") as index_file:
+            json.dump({
+                "version": INDEX_VERSION,
+                "series": {series_id: entry.to_json() for series_id, entry in self._entries.items()}
+            }, index_file)
+        os.replace(temp_path, index_path)
+
+    def _open(self, series_id: str, entry: _SeriesEntry, mode: str = "r+") -> "np.memmap":
+        import numpy as np
+        return np.memmap(self._path(series_id), dtype=np.float64, mode=mode, shape=(entry.slot_count,))
+
+    def _read(self, series_id: str, start: int, end: int) -> "np.ndarray":
+        """
+        The stored values of [start, end), with NaN for periods outside the file.
+        """
+        import numpy as np
+        values = np.full(end - start, np.nan)
+        entry = self._entries.get(series_id)
+        if entry is None:
+            return values
+        overlap_start, overlap_end = max(start, entry.first_slot), min(end, entry.first_slot + entry.slot_count)
+        if overlap_start < overlap_end:
+            stored = self._open(series_id, entry, mode="r")
+            values[overlap_start - start:overlap_end - start] = \
+                stored[overlap_start - entry.first_slot:overlap_end - entry.first_slot]
+            del stored
+        return values
+
+    def _write(self, series_id: str, query: MetricQuery, domain_arn: str, period_seconds: int, start: int,
+            values: "np.ndarray", settled_end: int):
+        """
+        Stores the values fetched for [start, start + len(values)), growing the file if needed, and records the
+        settled part of the range as fetched.
+        """
+        import numpy as np
+        end = start + len(values)
+        entry = self._entries.get(series_id)
+
+        if entry is not None:
+            first_slot = min(entry.first_slot, start)
+            slot_count = max(entry.first_slot + entry.slot_count, end) - first_slot
+            if slot_count > MAX_PERIODS_PER_SERIES:
+                self._remove(series_id)
+                entry = None
+
+        if entry is None:
+            entry = _SeriesEntry(domain_arn=domain_arn, metric_name=query.metric_name, stat=query.stat,
+                period_seconds=period_seconds, first_slot=start, slot_count=end - start, covered=[],
+                last_access=time.time())
+            stored = self._open(series_id, entry, mode="w+")
+            stored[:] = np.nan
+        elif first_slot < entry.first_slot or slot_count > entry.slot_count:
+            # Copy into a bigger file, then swap it in
+            grown = _SeriesEntry(**{**entry.to_json(), "first_slot": first_slot, "slot_count": slot_count})
+            temp_id = f"{series_id}.grow"
+            stored = self._open(temp_id, grown, mode="w+")
+            stored[:] = np.nan
+            old = self._open(series_id, entry, mode="r")
+            offset = entry.first_slot - first_slot
+            stored[offset:offset + entry.slot_count] = old
+            del old
+            stored.flush()
+            os.replace(self._path(temp_id), self._path(series_id))
+            entry = grown
+        else:
+            stored = self._open(series_id, entry)
+
+        stored[start - entry.first_slot:end - entry.first_slot] = values
+        stored.flush()
+        del stored
+
+        if min(end, settled_end) > start:
+            entry.covered = _add_range(entry.covered, start, min(end, settled_end))
+        entry.last_access = time.time()
+        self._entries[series_id] = entry
+
+    def _remove(self, series_id: str):
+        self._entries.pop(series_id, None)
+        try:
+            os.remove(self._path(series_id))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep: set):
+        """
+        Removes the least recently used series, other than those in keep, until the store fits in max_bytes.  The
+        series just read are kept even if they alone don't fit, so the store can briefly run over.
+        """
+        size_bytes = self.size_bytes
+        if size_bytes <= self.config.max_bytes:
+            return
+        evicted = 0
+        for series_id, entry in sorted(self._entries.items(), key=lambda item: item[1].last_access):
+            if size_bytes <= self.config.max_bytes:
+                break
+            if series_id in keep:
+                continue
+            size_bytes -= entry.size_bytes
+            self._remove(series_id)
+            evicted += 1
+        if evicted:
+            self.stats.record_eviction(evicted)
+            logger.info(f"Evicted {evicted} series from the metric store")
+
+    def fetch_matrix(self, cloudwatch_client: Any, domain_arn: str, queries: List[MetricQuery],
+            start_time: datetime, end_time: datetime, period_seconds: int) -> "np.ndarray":
+        """
+        Returns the (query x period) matrix of values for the window, as metric_data.series_to_matrix() would from a
+        fresh fetch, but only fetches the periods of each series that aren't stored yet.  Queries that are missing
+        the same periods are fetched together, so they're still batched into as few GetMetricData calls as possible.
+        The window should be aligned to the period, as metric_data.get_time_window() does.
+        """
+        if not self.enabled:
+            series = fetch_metric_series(cloudwatch_client, queries, start_time, end_time, period_seconds)
+            return series_to_matrix(series, start_time, end_time, period_seconds)
+
+        import numpy as np
+        start = int(start_time.timestamp()) // period_seconds
+        end = start + (int((end_time - start_time).total_seconds()) // period_seconds or 1)
+        settled_end = int(time.time() - self.config.settle_seconds) // period_seconds
+        series_ids = [_series_id(domain_arn, query.metric_name, query.stat, period_seconds) for query in queries]
+
+        # Group the queries by the span they're missing
+        to_fetch: Dict[Tuple[int, int], List[int]] = {}
+        with self._lock:
+            self._ensure_loaded()
+            for i, series_id in enumerate(series_ids):
+                entry = self._entries.get(series_id)
+                span = _missing_span(entry.covered if entry else [], start, end)
+                # Counted in periods, as the newest few are fetched every time
+                fetched_periods = span[1] - span[0] if span else 0
+                self.stats.record_hit(end - start - fetched_periods)
+                if span is not None:
+                    self.stats.record_miss(fetched_periods)
+                    to_fetch.setdefault(span, []).append(i)
+
+        fetched: List[Tuple[int, "np.ndarray"]] = []
+        for (span_start, span_end), rows in to_fetch.items():
+            span_start_time, span_end_time = _to_datetime(span_start, period_seconds), _to_datetime(span_end, period_seconds)
+            logger.debug(f"Fetching periods {span_start}-{span_end} for {len(rows)} series of {domain_arn}")
+            series = fetch_metric_series(cloudwatch_client, [queries[i] for i in rows], span_start_time, span_end_time,
+                period_seconds)
+            matrix = series_to_matrix(series, span_start_time, span_end_time, period_seconds)
+            fetched.append((span_start, matrix))
+            with self._lock:
+                for row, i in enumerate(rows):
+                    self._write(series_ids[i], queries[i], domain_arn, period_seconds, span_start, matrix[row],
+                        settled_end)
+
+        with self._lock:
+            result = np.vstack([self._read(series_id, start, end) for series_id in series_ids]) if queries \
+                else np.full((0, end - start), np.nan)
+            now = time.time()
+            for series_id in series_ids:
+                if series_id in self._entries:
+                    self._entries[series_id].last_access = now
+            self._evict(keep=set(series_ids))
+            # When only the access times changed, they're saved with the next fetch rather than on every read
+            if to_fetch:
+                self._save_index()
+        return result
+
+    def clear(self):
+        with self._lock:
+            if not self.enabled:
+                return
+            self._ensure_loaded()
+            for series_id in list(self._entries):
+                self._remove(series_id)
+            self._save_index()
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "series": len(self._entries),
+            "bytes": self.size_bytes,
+            **self.stats.to_json(),
+        }
+
+METRIC_STORE = MetricStore(MetricStoreConfig())
+
+def configure_metric_store(config: MetricStoreConfig):
+    """
+    Turns the local metric store on or off and sets its bounds, e.g.
+    configure_metric_store(MetricStoreConfig(directory="/var/tmp/lp02_metrics", max_bytes=1024 ** 3)).
+    """
+    METRIC_STORE.configure(config)
@@ -0,0 +1,24 @@
+from typing import Optional
+
+from cw_expert.graph import CW_GRAPH, CwState
+from cw_expert.prompting import CW_SYSTEM_MESSAGE
+from utilities.checkpointing import get_default_checkpointer
+from utilities.sessions import SessionManager
+
+
+def new_cw_state() -> CwState:
+    return CwState(
+        cw_turns = [CW_SYSTEM_MESSAGE],
+        approval_turns = [],
+        approval_in_progress=False
+    )
+
+def load_cw_state(thread_id: str) -> Optional[CwState]:
+    snapshot = CW_GRAPH.get().get_state({"configurable": {"thread_id": thread_id}})
+    return snapshot.values or None
+
+CW_SESSION_MANAGER = SessionManager(
+    new_state=new_cw_state,
+    load_state=load_cw_state,
+    delete_thread=lambda thread_id: get_default_checkpointer().delete_thread(thread_id)
+)
@@ -1,12 +1,23 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
 from dataclasses import dataclass
 import logging
 import re
+import threading
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Literal, Optional, Tuple, Union
 import uuid
 
 from langchain_core.tools import StructuredTool
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 
 from aws_interactions.aws_client_provider import AwsClientProvider
+from cw_expert.dashboards import (format_validation_errors, get_dashboard_arn, is_valid_period, is_valid_stat,
+    validate_dashboard_request)
+from cw_expert.metric_catalog import METRIC_CATALOG
+from cw_expert.metric_data import format_summaries, get_time_window, MetricQuery, summarize_matrix
+from cw_expert.metric_store import METRIC_STORE
+from utilities.caching import TtlLruCache
 
 logger = logging.getLogger(__name__)
 
@@ -40,51 +51,128 @@ def parse_domain_arn(domain_arn: str) -> DomainDetails:
     return DomainDetails(domain_name=domain_name, domain_arn=domain_arn, region=region, account_id=account_id)
 
 
-def get_raw_metric_names_for_opensearch_domain(domain_arn: str) -> str:
+# Domain metric listings change rarely, so we keep them around for a while to avoid re-paging CloudWatch every time
+# the LLM asks about the same domain
+METRIC_LISTING_CACHE_MAX_ENTRIES = 256
+METRIC_LISTING_CACHE_TTL_SECONDS = 15 * 60
+
+METRIC_LISTING_CACHE = TtlLruCache(
+    max_entries=METRIC_LISTING_CACHE_MAX_ENTRIES,
+    ttl_seconds=METRIC_LISTING_CACHE_TTL_SECONDS
+)
+
+# Above this many unique metric names, "auto" output switches from the full listing to the grouped summary
+COMPACT_OUTPUT_THRESHOLD = 100
+GROUPED_OUTPUT_EXAMPLES_PER_FAMILY = 5
+
+MetricOutputFormat = Literal["auto", "full", "grouped"]
+
+def iter_metric_names_for_opensearch_domain(domain_details: DomainDetails) -> Iterator[str]:
+    """
+    Streams the unique metric names for the domain as ListMetrics pages arrive.  Domains with node-level dimensions
+    report the same metric name once per node, so only the set of names seen so far is held in memory rather than
+    every metric entry.
+    """
+    aws_client_provider = AwsClientProvider.for_account(domain_details.account_id, domain_details.region)
+    cloudwatch_client = aws_client_provider.get_cloudwatch()
+
+    paginator = cloudwatch_client.get_paginator("list_metrics")
+    pages = paginator.paginate(
+        Namespace="AWS/ES",
+        Dimensions=[
+            {"Name": "ClientId", "Value": domain_details.account_id},
+            {"Name": "DomainName", "Value": domain_details.domain_name},
+        ]
+    )
+
+    seen_metric_names = set()
+    for page in pages:
+        new_metric_count = 0
+        for metric in page["Metrics"]:
+            metric_name = metric["MetricName"]
+            if metric_name in seen_metric_names:
+                continue
+            seen_metric_names.add(metric_name)
+            new_metric_count += 1
+            yield metric_name
+        print(f"Found {len(page['Metrics'])} metrics ({new_metric_count} new)")
+
+def list_metric_names_for_opensearch_domain(domain_details: DomainDetails) -> List[str]:
+    """
+    Returns the sorted, unique metric names for the domain, served from METRIC_LISTING_CACHE when possible.  Raises on
+    CloudWatch errors; failed listings are not cached.
+    """
+    cached_metric_names = METRIC_LISTING_CACHE.get(domain_details.domain_arn)
+    if cached_metric_names is not None:
+        print(f"Using cached metrics for OpenSearch domain: {domain_details.domain_name}")
+        return cached_metric_names
+
+    print(f"Listing metrics for OpenSearch domain: {domain_details.domain_name}")
+    metric_names = sorted(iter_metric_names_for_opensearch_domain(domain_details))
+    METRIC_LISTING_CACHE.put(domain_details.domain_arn, metric_names)
+    return metric_names
+
+def get_metric_family(metric_name: str) -> str:
+    """
+    Returns the leading word of a CamelCase metric name, treating acronyms as a single word.  For example,
+    "JVMMemoryPressure" -> "JVM", "ThreadpoolWriteQueue" -> "Threadpool", "ClusterStatus.green" -> "Cluster".
+    """
+    match = re.match(r"[A-Z]+(?![a-z])|[A-Z][a-z0-9]*|[a-z0-9]+", metric_name)
+    return match.group(0) if match else metric_name
+
+def format_metric_names(metric_names: Iterable[str], output_format: MetricOutputFormat = "full") -> str:
+    """
+    Renders metric names either as the full comma-separated listing or, for "grouped", as one line per metric family
+    with its count and a few example names.  "auto" picks "grouped" once there are more than COMPACT_OUTPUT_THRESHOLD
+    names.
+    """
+    if output_format == "auto":
+        metric_names = list(metric_names)
+        output_format = "grouped" if len(metric_names) > COMPACT_OUTPUT_THRESHOLD else "full"
+
+    if output_format == "full":
+        return ", ".join(metric_names)
+
+    # Only the counts and the first few names of each family are kept, so this works on a stream of any size
+    family_counts: Dict[str, int] = {}
+    family_examples: Dict[str, List[str]] = {}
+    for metric_name in metric_names:
+        family = get_metric_family(metric_name)
+        family_counts[family] = family_counts.get(family, 0) + 1
+        examples = family_examples.setdefault(family, [])
+        if len(examples) < GROUPED_OUTPUT_EXAMPLES_PER_FAMILY:
+            examples.append(metric_name)
+
+    lines = []
+    for family in sorted(family_counts):
+        count = family_counts[family]
+        examples = ", ".join(family_examples[family])
+        remainder = count - len(family_examples[family])
+        more = f", ... (+{remainder} more)" if remainder else ""
+        lines.append(f"{family} ({count}): {examples}{more}")
+    return "\n".join(lines)
+
+def get_raw_metric_names_for_opensearch_domain(domain_arn: str, output_format: MetricOutputFormat = "full") -> str:
     try:
         domain_details = parse_domain_arn(domain_arn)
     except InvalidDomainArnError as e:
         return f"Error: {str(e)}"
-    
-    print(f"Listing metrics for OpenSearch domain: {domain_details.domain_name}")
-    
-    aws_client_provider = AwsClientProvider(aws_region=domain_details.region)
-    cloudwatch_client = aws_client_provider.get_cloudwatch()
-    
-    # Pull metrics names until we don't have a NextToken
-    metric_names = []
-    next_token = None
-    try:
-        while True:
-            args = {
-                "Namespace": "AWS/ES",
-                "Dimensions": [
-                    {"Name": "ClientId", "Value": domain_details.account_id},
-                    {"Name": "DomainName", "Value": domain_details.domain_name},
-                ]
-            }
-            if next_token:
-                args["NextToken"] = next_token
-            response = cloudwatch_client.list_metrics(**args)
-            new_metric_names = [metric["MetricName"] for metric in response["Metrics"]]
-            print(f"Found {len(new_metric_names)} metrics")
-
-            metric_names.extend(new_metric_names)
-            next_token = response.get("NextToken", None)
-            if not next_token:
-                break
 
+    try:
+        metric_names = list_metric_names_for_opensearch_domain(domain_details)
     except Exception as e:
         return f"Error: {str(e)}"
     
-    metric_names.sort()
     final_response = f"""
     Metrics for OpenSearch domain '{domain_details.domain_arn}':
 
-    {", ".join(metric_names)}
+    {format_metric_names(metric_names, output_format)}
     """
     return final_response
 
+def explain_metric_names_for_opensearch_domain(domain_arn: str, output_format: MetricOutputFormat = "auto") -> str:
+    return get_raw_metric_names_for_opensearch_domain(domain_arn, output_format)
+
 class PrintRawMetricNamesForOpenSearchDomainArgs(BaseModel):
     """Returns a listing of the raw metric names for an Amazon OpenSearch Service domain directly to the User.  DO NOT USE UNLESS SPECIFICALLY REQUESTED."""
     domain_arn: str = Field(description="The full Amazon ARN of the domain.")
@@ -98,29 +186,282 @@ list_raw_metrics_for_opensearch_domain_tool = StructuredTool.from_function(
 class ExplainMetricsForOpenSearchDomainArgs(BaseModel):
     """PREFERRED way to List, Explain, or Explore the metrics available for an Amazon OpenSearch Service domain.  Queries the CloudWatch API to get a list of metrics then passes it to the LLM to consider."""
     domain_arn: str = Field(description="The full Amazon ARN of the domain.")
+    output_format: MetricOutputFormat = Field(default="auto", description="'full' for every metric name, 'grouped' for metric families with counts and examples, or 'auto' to group only large listings.")
 
 explain_metrics_for_opensearch_domain_tool = StructuredTool.from_function(
-    func=get_raw_metric_names_for_opensearch_domain,
+    func=explain_metric_names_for_opensearch_domain,
     name="ExplainMetricsForOpenSearchDomain",
     args_schema=ExplainMetricsForOpenSearchDomainArgs
 )
 
+#
+# Define a tool to find a domain's metrics about a topic, using the metric catalog
+#
+
+SEARCH_METRICS_DEFAULT_MAX_RESULTS = 20
+
+def search_metrics_for_opensearch_domain(domain_arn: str, query: str,
+        max_results: int = SEARCH_METRICS_DEFAULT_MAX_RESULTS) -> str:
+    try:
+        domain_details = parse_domain_arn(domain_arn)
+    except InvalidDomainArnError as e:
+        return f"Error: {str(e)}"
+
+    try:
+        metric_names = list_metric_names_for_opensearch_domain(domain_details)
+        catalog = METRIC_CATALOG.get()
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+    # Only the domain's own metrics are worth mentioning, however well others match
+    matches = catalog.search(query, metric_names=metric_names, max_results=max_results)
+    uncataloged = catalog.search_uncataloged(query, metric_names)
+    if not matches and not uncataloged:
+        return (f"None of the {len(metric_names)} metrics of OpenSearch domain '{domain_details.domain_arn}' match "
+            f"'{query}'.  Try other words, or ExplainMetricsForOpenSearchDomain for the full listing.")
+
+    lines = [f"Metrics of OpenSearch domain '{domain_details.domain_arn}' matching '{query}', most relevant first "
+        f"(catalog version {catalog.version}):", ""]
+    lines.extend(f"- {entry.describe()}" for entry in matches)
+    if uncataloged:
+        more = f", ... (+{len(uncataloged) - max_results} more)" if len(uncataloged) > max_results else ""
+        lines.append(f"Also matching, but not in the catalog: {', '.join(uncataloged[:max_results])}{more}")
+    return "\n".join(lines)
+
+class SearchMetricsForOpenSearchDomainArgs(BaseModel):
+    """PREFERRED way to find which metrics of an Amazon OpenSearch Service domain relate to a topic (e.g. indexing, JVM memory, disk space, errors, thread pool rejections).  Searches a catalog of AWS/ES metric descriptions, units, and recommended statistics, and returns only the matching metrics the domain actually reports."""
+    domain_arn: str = Field(description="The full Amazon ARN of the domain.")
+    query: str = Field(description="What the metrics should be about, in a few words.")
+    max_results: int = Field(default=SEARCH_METRICS_DEFAULT_MAX_RESULTS, description="The most metrics to return.")
+
+search_metrics_for_opensearch_domain_tool = StructuredTool.from_function(
+    func=search_metrics_for_opensearch_domain,
+    name="SearchMetricsForOpenSearchDomain",
+    args_schema=SearchMetricsForOpenSearchDomainArgs
+)
+
+#
+# Define tools to list the metrics for many Amazon OpenSearch Service domains at once
+#
+
+# CloudWatch's ListMetrics quota is per account/region, so we cap how many domains we page at once in each region
+# on top of the overall worker count
+MULTI_DOMAIN_MAX_WORKERS = 32
+MULTI_DOMAIN_MAX_CONCURRENCY_PER_REGION = 4
+
+@dataclass
+class DomainMetricListing:
+    domain_arn: str
+    metric_names: Optional[List[str]] = None
+    error: Optional[str] = None
+
+class _RegionSlots:
+    def __init__(self, max_concurrency_per_region: int):
+        """
+        Process-wide count of the calls in flight in each region, shared by every session.  Callers take a slot
+        before starting a call and wait for releases when a region is full, rather than blocking a worker on it.
+        """
+        self.max_concurrency_per_region = max_concurrency_per_region
+        self._condition = threading.Condition()
+        self._in_use: Dict[str, int] = {}
+        self._releases = 0
+
+    @property
+    def releases(self) -> int:
+        return self._releases
+
+    def try_acquire(self, region: str) -> bool:
+        with self._condition:
+            if self._in_use.get(region, 0) >= self.max_concurrency_per_region:
+                return False
+            self._in_use[region] = self._in_use.get(region, 0) + 1
+            return True
+
+    def release(self, region: str):
+        with self._condition:
+            self._in_use[region] -= 1
+            if not self._in_use[region]:
+                del self._in_use[region]
+            self._releases += 1
+            self._condition.notify_all()
+
+    def wait_for_release(self, seen_releases: int):
+        """
+        Blocks until a slot is released in any region, if none has been since releases was seen_releases.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._releases != seen_releases)
+
+LIST_METRICS_REGION_SLOTS = _RegionSlots(MULTI_DOMAIN_MAX_CONCURRENCY_PER_REGION)
+
+def _run_by_region(tasks: List[Tuple[str, Callable[[], Any]]], region_slots: _RegionSlots,
+        max_workers: int) -> Iterator[Tuple[int, Any]]:
+    """
+    Runs each (region, task) pair on a thread pool and yields (position, result) as each finishes.  A task is only
+    handed to the pool once its region has a free slot, so tasks waiting on a busy region never hold a worker that a
+    task in another region could be using.
+    """
+    if not tasks:
+        return
+    pending: Dict[str, Deque[Tuple[int, Callable[[], Any]]]] = {}
+    for position, (region, task) in enumerate(tasks):
+        pending.setdefault(region, deque()).append((position, task))
+    running: Dict[Future, int] = {}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        while pending or running:
+            # Read before starting or collecting anything, so a release in between isn't missed by the wait below
+            seen_releases = region_slots.releases
+
+            for region in list(pending):
+                while pending[region] and len(running) < max_workers and region_slots.try_acquire(region):
+                    position, task = pending[region].popleft()
+                    future = executor.submit(copy_context().run, task)
+                    future.add_done_callback(lambda _, region=region: region_slots.release(region))
+                    running[future] = position
+                if not pending[region]:
+                    del pending[region]
+
+            finished = [future for future in running if future.done()]
+            for future in finished:
+                yield running.pop(future), future.result()
+            if not finished and (pending or running):
+                # Our own calls finishing release slots too, so this also wakes us when there's a result
+                region_slots.wait_for_release(seen_releases)
+
+def _list_domain_metrics(domain_details: DomainDetails) -> DomainMetricListing:
+    try:
+        metric_names = list_metric_names_for_opensearch_domain(domain_details)
+    except Exception as e:
+        return DomainMetricListing(domain_arn=domain_details.domain_arn, error=str(e))
+    return DomainMetricListing(domain_arn=domain_details.domain_arn, metric_names=metric_names)
+
+def list_metric_names_for_opensearch_domains(domain_arns: List[str], max_workers: int = MULTI_DOMAIN_MAX_WORKERS,
+        region_slots: _RegionSlots = LIST_METRICS_REGION_SLOTS) -> Iterator[DomainMetricListing]:
+    """
+    Lists the metrics for many domains in parallel, yielding each domain's result as soon as it finishes.  Invalid
+    ARNs and CloudWatch failures are reported on the individual DomainMetricListing rather than raised.  The
+    per-region limits are shared with every other caller in the process.
+    """
+    # Report malformed ARNs up front, and don't list the same domain twice
+    domains_to_list = []
+    for domain_arn in dict.fromkeys(domain_arns):
+        try:
+            domains_to_list.append(parse_domain_arn(domain_arn))
+        except InvalidDomainArnError as e:
+            yield DomainMetricListing(domain_arn=domain_arn, error=str(e))
+
+    if not domains_to_list:
+        return
+
+    tasks = [
+        (domain_details.region, lambda domain_details=domain_details: _list_domain_metrics(domain_details))
+        for domain_details in domains_to_list
+    ]
+    for _, listing in _run_by_region(tasks, region_slots, max_workers):
+        yield listing
+
+def get_raw_metric_names_for_opensearch_domains(domain_arns: List[str], output_format: MetricOutputFormat = "auto") -> str:
+    sections = []
+    failures = 0
+    for listing in list_metric_names_for_opensearch_domains(domain_arns):
+        if listing.error:
+            failures += 1
+            sections.append(f"Metrics for OpenSearch domain '{listing.domain_arn}':\n\nError: {listing.error}")
+        else:
+            sections.append(f"Metrics for OpenSearch domain '{listing.domain_arn}':\n\n{format_metric_names(listing.metric_names, output_format)}")
+
+    summary = f"Listed metrics for {len(sections) - failures} of {len(sections)} OpenSearch domains."
+    return "\n\n".join([summary] + sections)
+
+class ExplainMetricsForOpenSearchDomainsArgs(BaseModel):
+    """PREFERRED way to List, Explain, or Explore the metrics available for SEVERAL Amazon OpenSearch Service domains at once.  Queries the CloudWatch API for every domain in parallel then passes the results to the LLM to consider."""
+    domain_arns: List[str] = Field(description="The full Amazon ARNs of the domains.")
+    output_format: MetricOutputFormat = Field(default="auto", description="'full' for every metric name, 'grouped' for metric families with counts and examples, or 'auto' to group only large listings.")
+
+explain_metrics_for_opensearch_domains_tool = StructuredTool.from_function(
+    func=get_raw_metric_names_for_opensearch_domains,
+    name="ExplainMetricsForOpenSearchDomains",
+    args_schema=ExplainMetricsForOpenSearchDomainsArgs
+)
+
+#
+# Define a tool to summarize the recent values of a domain's metrics
+#
+
+def summarize_metric_data_for_opensearch_domain(domain_arn: str, metric_names: Optional[List[str]] = None,
+        stat: str = "Average", period_seconds: int = 300, hours: float = 3.0) -> str:
+    try:
+        domain_details = parse_domain_arn(domain_arn)
+    except InvalidDomainArnError as e:
+        return f"Error: {str(e)}"
+
+    if not is_valid_stat(stat):
+        return f"Error: Unknown statistic '{stat}'; use Average, Maximum, Minimum, Sum, SampleCount, or a percentile such as p99"
+    if not is_valid_period(period_seconds):
+        return f"Error: The period must be 1, 5, 10, 30, or a multiple of 60 seconds, not {period_seconds}"
+    if hours * 3600 < period_seconds:
+        return f"Error: The time window ({hours} hours) must be at least one period ({period_seconds} seconds) long"
+
+    try:
+        if not metric_names:
+            metric_names = list_metric_names_for_opensearch_domain(domain_details)
+        dimensions = {"ClientId": domain_details.account_id, "DomainName": domain_details.domain_name}
+        queries = [MetricQuery(metric_name=name, dimensions=dimensions, stat=stat) for name in dict.fromkeys(metric_names)]
+
+        start_time, end_time = get_time_window(hours, period_seconds)
+        print(f"Fetching {len(queries)} metrics for OpenSearch domain: {domain_details.domain_name}")
+        aws_client_provider = AwsClientProvider.for_account(domain_details.account_id, domain_details.region)
+        cloudwatch_client = aws_client_provider.get_cloudwatch()
+        # Only the periods we haven't fetched before come from CloudWatch; the rest are read from local disk
+        matrix = METRIC_STORE.fetch_matrix(cloudwatch_client, domain_details.domain_arn, queries, start_time, end_time,
+            period_seconds)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+    summaries = summarize_matrix(queries, matrix, period_seconds)
+    return (f"Metric data for OpenSearch domain '{domain_details.domain_arn}', {start_time:%Y-%m-%d %H:%M} to "
+        f"{end_time:%H:%M} UTC, {period_seconds}s periods:\n\n{format_summaries(summaries, hours)}")
+
+class SummarizeMetricDataForOpenSearchDomainArgs(BaseModel):
+    """PREFERRED way to answer questions about the VALUES of an Amazon OpenSearch Service domain's metrics (e.g. is a metric high, spiking, trending, or missing data).  Fetches the recent datapoints of many metrics at once from CloudWatch and returns a one-line summary of each (min, max, mean, p50, p99, latest value, trend, and gaps) rather than the raw datapoints."""
+    domain_arn: str = Field(description="The full Amazon ARN of the domain.")
+    metric_names: Optional[List[str]] = Field(default=None, description="The metrics to summarize; every metric of the domain if omitted.")
+    stat: str = Field(default="Average", description="The statistic to fetch for each period: Average, Maximum, Minimum, Sum, SampleCount, or a percentile such as p99.")
+    period_seconds: int = Field(default=300, description="The length of each datapoint's period, in seconds: 1, 5, 10, 30, or a multiple of 60.")
+    hours: float = Field(default=3.0, description="How many hours back from now to summarize.")
+
+summarize_metric_data_for_opensearch_domain_tool = StructuredTool.from_function(
+    func=summarize_metric_data_for_opensearch_domain,
+    name="SummarizeMetricDataForOpenSearchDomain",
+    args_schema=SummarizeMetricDataForOpenSearchDomainArgs
+)
+
+def _put_dashboard(dashboard_name: str, dashboard_json: str, aws_region_name: str) -> str:
+    """
+    Creates (or overwrites) the dashboard and returns its ARN, followed by any warnings CloudWatch had about it.
+    """
+    cloudwatch_client = AwsClientProvider(aws_region=aws_region_name).get_cloudwatch()
+    response = cloudwatch_client.put_dashboard(DashboardName=dashboard_name, DashboardBody=dashboard_json)
+    logger.info(f"Created dashboard {dashboard_name} in {aws_region_name}: {response}")
+
+    dashboard_arn = get_dashboard_arn(dashboard_name, aws_region_name)
+    warnings = [message.get("Message", "") for message in response.get("DashboardValidationMessages", [])]
+    if warnings:
+        return f"{dashboard_arn} (with warnings: {'; '.join(warnings)})"
+    return dashboard_arn
+
 def create_new_cloudwatch_dashboard_from_json(dashboard_json: str, aws_region_name: str) -> str:
     """
     Create a new CloudWatch dashboard from a JSON string.  Returns the ARN of the created dashboard.
     """
-    aws_client_provider = AwsClientProvider(aws_region=aws_region_name)
-    cloudwatch_client = aws_client_provider.get_cloudwatch()
+    errors = validate_dashboard_request(dashboard_json, aws_region_name)
+    if errors:
+        return f"Error: The dashboard was not created, as it is invalid:\n{format_validation_errors(errors)}"
 
     # Create the dashboard with a random name
     random_name = f"dashboard-{uuid.uuid4().hex}"
-    response = cloudwatch_client.put_dashboard(DashboardName=random_name, DashboardBody=dashboard_json)
-    print(response)
-
-    # Return the ARN of the created dashboard
-    dashboard_arn = cloudwatch_client.get_dashboard(DashboardName=random_name)["DashboardArn"]
-    
-    return dashboard_arn
+    return _put_dashboard(random_name, dashboard_json, aws_region_name)
 
 class CreateNewCloudwatchDashboardFromJsonArgs(BaseModel):
     """Creates a completely new CloudWatch dashboard from a JSON string, assigning it a random UUID for a name. Returns the ARN of the created dashboard.  Do not invoke without first having shown the Dashboard JSON to the human operator."""
@@ -133,7 +474,116 @@ create_new_cloudwatch_dashboard_from_json_tool = StructuredTool.from_function(
     args_schema=CreateNewCloudwatchDashboardFromJsonArgs
 )
 
-TOOLS_NORMAL = [explain_metrics_for_opensearch_domain_tool]
+#
+# Define a tool to create many CloudWatch dashboards at once
+#
+
+# PutDashboard is throttled per account/region, so as with ListMetrics we cap the calls in flight in each region
+BULK_DASHBOARD_MAX_WORKERS = 16
+BULK_DASHBOARD_MAX_CONCURRENCY_PER_REGION = 4
+
+PUT_DASHBOARD_REGION_SLOTS = _RegionSlots(BULK_DASHBOARD_MAX_CONCURRENCY_PER_REGION)
+
+class DashboardDefinition(BaseModel):
+    dashboard_json: str = Field(description="The JSON string representing the dashboard's full body definition.")
+    aws_region_name: str = Field(description="The AWS Region to create the dashboard in (example: us-east-1, us-west-2, etc...).")
+    dashboard_name: Optional[str] = Field(default=None, description="The dashboard's name (letters, numbers, '-' and '_'); a random one is assigned if omitted.")
+
+def _as_definition(dashboard: Union[DashboardDefinition, Dict[str, str]]) -> DashboardDefinition:
+    return dashboard if isinstance(dashboard, DashboardDefinition) else DashboardDefinition(**dashboard)
+
+def validate_dashboard_definitions(dashboards: List[Union[DashboardDefinition, Dict[str, str]]]) -> List[str]:
+    """
+    Returns the problems with any of the definitions, each prefixed with the definition's position in the list.
+    """
+    errors = []
+    if not dashboards:
+        errors.append("No dashboards were given")
+    names = [_as_definition(dashboard).dashboard_name for dashboard in dashboards]
+    for name in {name for name in names if name is not None and names.count(name) > 1}:
+        errors.append(f"The name {name!r} is used by more than one dashboard")
+    for i, dashboard in enumerate(dashboards):
+        definition = _as_definition(dashboard)
+        errors.extend(
+            f"dashboards[{i}]: {error}"
+            for error in validate_dashboard_request(definition.dashboard_json, definition.aws_region_name,
+                definition.dashboard_name)
+        )
+    return errors
+
+def _put_dashboard_reporting_errors(definition: DashboardDefinition, dashboard_name: str) -> str:
+    try:
+        return _put_dashboard(dashboard_name, definition.dashboard_json, definition.aws_region_name)
+    except Exception as e:
+        logger.exception(f"Failed to create dashboard {dashboard_name}")
+        return f"Error: {str(e)}"
+
+def create_new_cloudwatch_dashboards_from_json(dashboards: List[Union[DashboardDefinition, Dict[str, str]]],
+        max_workers: int = BULK_DASHBOARD_MAX_WORKERS,
+        region_slots: _RegionSlots = PUT_DASHBOARD_REGION_SLOTS) -> str:
+    """
+    Creates the dashboards in parallel and reports each one's ARN or error.  Every definition is validated first, and
+    if any is invalid none are created.
+    """
+    errors = validate_dashboard_definitions(dashboards)
+    if errors:
+        return f"Error: No dashboards were created, as some are invalid:\n{format_validation_errors(errors)}"
+
+    definitions = [_as_definition(dashboard) for dashboard in dashboards]
+    names = [definition.dashboard_name or f"dashboard-{uuid.uuid4().hex}" for definition in definitions]
+    tasks = [
+        (definition.aws_region_name,
+            lambda definition=definition, name=name: _put_dashboard_reporting_errors(definition, name))
+        for definition, name in zip(definitions, names)
+    ]
+    results = [""] * len(tasks)
+    for position, result in _run_by_region(tasks, region_slots, max_workers):
+        results[position] = result
+
+    created = sum(1 for result in results if not result.startswith("Error:"))
+    lines = [f"Created {created} of {len(results)} dashboards."]
+    lines.extend(f"{name}: {result}" for name, result in zip(names, results))
+    return "\n".join(lines)
+
+class CreateNewCloudwatchDashboardsFromJsonArgs(BaseModel):
+    """Creates SEVERAL new CloudWatch dashboards at once, in parallel.  Returns the ARN of each created dashboard.  PREFERRED over repeated calls to CreateNewCloudwatchDashboardFromJson when creating more than one dashboard.  Do not invoke without first having shown the Dashboard JSON to the human operator."""
+    dashboards: List[DashboardDefinition] = Field(description="The dashboards to create.")
+
+create_new_cloudwatch_dashboards_from_json_tool = StructuredTool.from_function(
+    func=create_new_cloudwatch_dashboards_from_json,
+    name="CreateNewCloudwatchDashboardsFromJson",
+    args_schema=CreateNewCloudwatchDashboardsFromJsonArgs
+)
+
+def _precheck_create_dashboard(args: Dict[str, Any]) -> List[str]:
+    return validate_dashboard_request(args.get("dashboard_json"), args.get("aws_region_name"))
+
+def _precheck_create_dashboards(args: Dict[str, Any]) -> List[str]:
+    try:
+        return validate_dashboard_definitions(args.get("dashboards") or [])
+    except ValidationError as e:
+        return [f"The dashboard definitions are malformed: {e}"]
+
+TOOLS_NORMAL = [explain_metrics_for_opensearch_domain_tool, explain_metrics_for_opensearch_domains_tool,
+    search_metrics_for_opensearch_domain_tool, summarize_metric_data_for_opensearch_domain_tool]
 TOOLS_DIRECT_RESPONSE = [list_raw_metrics_for_opensearch_domain_tool]
-TOOLS_NEED_APPROVAL = [create_new_cloudwatch_dashboard_from_json_tool]
+TOOLS_NEED_APPROVAL = [create_new_cloudwatch_dashboard_from_json_tool, create_new_cloudwatch_dashboards_from_json_tool]
 TOOLS_ALL = TOOLS_NORMAL + TOOLS_DIRECT_RESPONSE + TOOLS_NEED_APPROVAL
+
+# Status messages shown to the user while a tool is running
+TOOL_PROGRESS_MESSAGES = {
+    explain_metrics_for_opensearch_domain_tool.name: "Listing metrics for the domain...",
+    explain_metrics_for_opensearch_domains_tool.name: "Listing metrics for the domains...",
+    search_metrics_for_opensearch_domain_tool.name: "Searching the domain's metrics...",
+    list_raw_metrics_for_opensearch_domain_tool.name: "Listing metrics for the domain...",
+    summarize_metric_data_for_opensearch_domain_tool.name: "Fetching metric data for the domain...",
+    create_new_cloudwatch_dashboard_from_json_tool.name: "Creating the dashboard...",
+    create_new_cloudwatch_dashboards_from_json_tool.name: "Creating the dashboards...",
+}
+
+# Tool name -> a check of a proposed call's arguments, returning its problems.  Calls needing approval are checked
+# before the human operator is asked, so that calls we know would fail go straight back to the LLM to fix.
+APPROVAL_PRECHECKS = {
+    create_new_cloudwatch_dashboard_from_json_tool.name: _precheck_create_dashboard,
+    create_new_cloudwatch_dashboards_from_json_tool.name: _precheck_create_dashboards,
+}
@@ -1,4 +1,5 @@
 import logging
+import os
 
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 
@@ -6,8 +7,10 @@ from approval_expert import get_approval_expert_system_message, APPROVAL_GRAPH_R
 from cw_expert import CW_GRAPH, CW_GRAPH_RUNNER, CW_SYSTEM_MESSAGE, CwState
 from utilities.ux import stringify_simplified_history
 from utilities.logging import configure_logging
+from utilities.tracing import configure_tracing, JsonlSpanExporter
 
 configure_logging("./debug.log", "./info.log")
+configure_tracing(JsonlSpanExporter("./traces.jsonl"))
 
 logger = logging.getLogger(__name__)
 
@@ -92,5 +95,7 @@ logger = logging.getLogger(__name__)
 # )
 # final_state = CW_GRAPH_RUNNER(final_state, 42)
 
-# Setting xray to 1 will show the internal structure of the nested graph
-CW_GRAPH.get_graph(xray=1).draw_mermaid_png(output_file_path="cw_graph.png")
\ No newline at end of file
+# Rendering the graph calls out to mermaid.ink, so only do it when asked (LP02_DRAW_GRAPH=1).  Setting xray to 1 will
+# show the internal structure of the nested graph.
+if os.environ.get("LP02_DRAW_GRAPH") == "1":
+    CW_GRAPH.get().get_graph(xray=1).draw_mermaid_png(output_file_path="cw_graph.png")
\ No newline at end of file
@@ -0,0 +1,22 @@
+import os
+
+import uvicorn
+
+from chat_service import ChatApp
+from chat_service.app import DEFAULT_MAX_CONCURRENT_TURNS, DEFAULT_MAX_QUEUED_TURNS
+from cw_expert import CW_GRAPH_STREAMING_RUNNER, CW_SESSION_MANAGER
+from utilities.logging import configure_logging
+
+configure_logging("./debug.log", "./info.log")
+
+# The ASGI app serving the CloudWatch graph.  Run with `python serve_chat.py`, or point any ASGI server at
+# serve_chat:CHAT_APP.
+CHAT_APP = ChatApp(
+    session_manager=CW_SESSION_MANAGER,
+    runner=CW_GRAPH_STREAMING_RUNNER,
+    max_concurrent_turns=int(os.environ.get("CHAT_MAX_CONCURRENT_TURNS", DEFAULT_MAX_CONCURRENT_TURNS)),
+    max_queued_turns=int(os.environ.get("CHAT_MAX_QUEUED_TURNS", DEFAULT_MAX_QUEUED_TURNS))
+)
+
+if __name__ == "__main__":
+    uvicorn.run(CHAT_APP, host=os.environ.get("CHAT_HOST", "127.0.0.1"), port=int(os.environ.get("CHAT_PORT", 8000)))
@@ -1,30 +1,31 @@
 import logging
+import os
 
-from langchain_core.messages import HumanMessage
 import streamlit as st
 
-from cw_expert import CW_GRAPH_RUNNER, CW_SYSTEM_MESSAGE, CwState
-from cw_expert.graph import cw_state_to_json
+from chat_service.client import ChatServiceClient, DEFAULT_SERVICE_URL, ServiceBusy, SessionNotFound
 from utilities.logging import configure_logging
-from utilities.ux import stringify_simplified_history
 
 configure_logging("./debug.log", "./info.log")
 
 logger = logging.getLogger(__name__)
 
+# The UI is a thin client of the chat service (see serve_chat.py), which must be running at CHAT_SERVICE_URL
+client = ChatServiceClient(os.environ.get("CHAT_SERVICE_URL", DEFAULT_SERVICE_URL))
+
 
 # Set page configuration to 'wide' to use the full width of the screen
 st.set_page_config(layout="wide")
 
-# Initialize session state to keep track of conversation history and LLM messages
-if 'conversation' not in st.session_state:
-    st.session_state.conversation = []
-if 'graph_state' not in st.session_state:
-    st.session_state.graph_state = CwState(
-        cw_turns = [CW_SYSTEM_MESSAGE],
-        approval_turns = [],
-        approval_in_progress=False
-    )
+# Each browser session gets its own session in the chat service, which holds the conversation history and LLM
+# messages.  Sessions the service has removed for being idle are started over.
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = client.create_session()
+try:
+    conversation = client.get_history(st.session_state.session_id)
+except SessionNotFound:
+    st.session_state.session_id = client.create_session()
+    conversation = []
 
 st.title("Validation Librarian")
 
@@ -54,55 +55,37 @@ with left_col:
 
 # When the user submits a message
 if submit_button and user_input:
-    # Invoke the LLM with the user input
-    next_human_message = HumanMessage(content=user_input)
-
-    approval_in_progress = st.session_state.graph_state.get("approval_in_progress", False)
-    logging.info(f"Approval in progress: {approval_in_progress}")
-
-    if approval_in_progress:
-        logging.info("Adding human message to approval turns")
-        st.session_state.graph_state["approval_turns"].append(next_human_message)
-    else:
-        logging.info("Adding human message to cw turns")
-        st.session_state.graph_state["cw_turns"].append(next_human_message)
-
-    final_state = CW_GRAPH_RUNNER(
-        st.session_state.graph_state,
-        42
-    )
-
-    approval_in_progress = final_state.get("approval_in_progress", False)
-    logging.info(f"Approval in progress: {approval_in_progress}")
-    is_handoff = final_state.get("is_approval_handoff", False)
-    logging.info(f"Is handoff: {is_handoff}")
-
-    if is_handoff:
-        logging.info("Pulling AI response from cw turns")
-        turns = final_state.get("cw_turns", [])
-    elif approval_in_progress:
-        logging.info("Pulling AI response from approval turns")
-        turns = final_state.get("approval_turns", [])
-    else:
-        logging.info("Pulling AI response from cw turns")
-        turns = final_state.get("cw_turns")
-
-    ai_response = turns[-1]
-
-    # Update the graph state
-    logger.debug(f"End of session graph state: {cw_state_to_json(final_state)}")
-    st.session_state.graph_state = final_state
-
-    # Add the User Input and LLM response to the chat history, but ensure they are at the top for easy reading
-    st.session_state.conversation.insert(0, "---")
-    st.session_state.conversation.insert(0, ai_response.content)
-    st.session_state.conversation.insert(0, "**-- AI --**")
-    st.session_state.conversation.insert(0, user_input)
-    st.session_state.conversation.insert(0, "**-- You --**")
-
-# Conversation log on the right side
+    # Render progress updates and LLM tokens live while the service runs the graph.  The placeholders sit at the top of
+    # the conversation log and are cleared once the final response is added to the history below.
+    with right_col:
+        progress_placeholder = st.empty()
+        response_placeholder = st.empty()
+
+    streamed_response = ""
+    try:
+        for event in client.send_message(st.session_state.session_id, user_input):
+            if event["kind"] == "progress":
+                progress_placeholder.caption(event["content"])
+            elif event["kind"] == "token":
+                streamed_response += event["content"]
+                response_placeholder.markdown(streamed_response)
+            elif event["kind"] == "final":
+                logger.info(f"Approval in progress: {event['content']['approval_in_progress']}")
+                conversation.append({"role": "user", "content": user_input})
+                conversation.append({"role": "ai", "content": event["content"]["response"]})
+            elif event["kind"] == "error":
+                st.error(f"The request failed: {event['content']}")
+    except ServiceBusy as e:
+        st.warning(f"The service is busy; please try again in {e.retry_after_seconds or 'a few'} seconds.")
+
+    progress_placeholder.empty()
+    response_placeholder.empty()
+
+# Conversation log on the right side, with the latest exchange at the top for easy reading
 with right_col:
-    # Display the conversation history
-    for entry in st.session_state.conversation:
-        st.markdown(entry)
-
+    for i in range(len(conversation) - 2, -1, -2):
+        st.markdown("**-- You --**")
+        st.markdown(conversation[i]["content"])
+        st.markdown("**-- AI --**")
+        st.markdown(conversation[i + 1]["content"])
+        st.markdown("---")
@@ -0,0 +1,16 @@
+import pytest
+
+from approval_expert.benchmark import LABELLED_REPLIES, run_benchmark
+from approval_expert.classifier import classify_approval_response
+
+@pytest.mark.parametrize("reply", ["No, go ahead", "Nah, it's fine", "Don't stop, proceed", "No, proceed",
+    "Yes, no problem"])
+def test_mixed_replies_are_left_to_the_llm(reply):
+    assert classify_approval_response(reply) == "ambiguous"
+
+@pytest.mark.parametrize("reply", ["No, don't proceed", "I don't approve", "Stop, don't proceed"])
+def test_negated_approvals_are_denials(reply):
+    assert classify_approval_response(reply) == "denied"
+
+def test_fast_path_never_decides_wrongly():
+    assert run_benchmark(LABELLED_REPLIES, repetitions=1)["errors"] == 0
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import botocore.session
+from botocore.credentials import Credentials, RefreshableCredentials
+
+from aws_interactions.aws_client_provider import AwsClientCache
+
+def _session_with(credentials):
+    botocore_session = botocore.session.get_session()
+    botocore_session._credentials = credentials
+    return boto3.Session(botocore_session=botocore_session, region_name="us-west-2")
+
+def _refreshable_credentials(expires_in: timedelta) -> RefreshableCredentials:
+    def metadata():
+        return {"access_key": "AKID", "secret_key": "secret", "token": "token",
+            "expiry_time": (datetime.now(timezone.utc) + expires_in).isoformat()}
+    return RefreshableCredentials.create_from_metadata(metadata(), metadata, "test")
+
+def _cache_building(credentials_factory) -> AwsClientCache:
+    cache = AwsClientCache()
+    cache._build_session = lambda *args: _session_with(credentials_factory())
+    return cache
+
+def test_clients_are_reused():
+    cache = _cache_building(lambda: Credentials("AKID", "secret"))
+    client = cache.get_client("default", "us-west-2", "cloudwatch", False)
+    assert cache.get_client("default", "us-west-2", "cloudwatch", False) is client
+    assert cache.get_client("default", "us-east-1", "cloudwatch", False) is not client
+    assert (cache.stats.hits, cache.stats.misses) == (1, 2)
+
+def test_clients_with_credentials_near_expiry_are_rebuilt():
+    cache = _cache_building(lambda: _refreshable_credentials(timedelta(minutes=2)))
+    client = cache.get_client("default", "us-west-2", "cloudwatch", False)
+    assert cache.get_client("default", "us-west-2", "cloudwatch", False) is not client
+    assert cache.stats.evictions == 1
+
+def test_clients_with_fresh_credentials_are_kept():
+    cache = _cache_building(lambda: _refreshable_credentials(timedelta(hours=1)))
+    client = cache.get_client("default", "us-west-2", "cloudwatch", False)
+    assert cache.get_client("default", "us-west-2", "cloudwatch", False) is client
+    assert cache.stats.evictions == 0
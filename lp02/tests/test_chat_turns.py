@@ -0,0 +1,32 @@
+from langchain_core.messages import AIMessage
+import pytest
+
+from chat_service.turns import run_turn
+from utilities.graph import StreamEvent
+from utilities.sessions import SessionManager
+
+def _new_state():
+    return {"cw_turns": [], "approval_turns": [], "approval_in_progress": False}
+
+def _replying_runner(graph_state, thread_id):
+    yield StreamEvent(kind="final", content={**graph_state,
+        "cw_turns": [*graph_state["cw_turns"], AIMessage(content="hello")]})
+
+def _failing_runner(graph_state, thread_id):
+    raise RuntimeError("Bedrock is down")
+    yield
+
+def test_failed_turn_leaves_the_session_as_it_was():
+    session_manager = SessionManager(new_state=_new_state)
+    session = session_manager.create_session()
+
+    with pytest.raises(RuntimeError):
+        run_turn(session_manager, session.session_id, "first try", _failing_runner)
+    assert session_manager.get_session(session.session_id).graph_state["cw_turns"] == []
+    assert session.conversation == []
+
+    result = run_turn(session_manager, session.session_id, "second try", _replying_runner)
+    assert result.response == "hello"
+    assert [turn.content for turn in session_manager.get_session(session.session_id).graph_state["cw_turns"]] == \
+        ["second try", "hello"]
+    assert session.conversation == [{"role": "user", "content": "second try"}, {"role": "ai", "content": "hello"}]
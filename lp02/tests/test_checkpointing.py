@@ -0,0 +1,65 @@
+from typing import Annotated, List, TypedDict
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+from utilities.checkpointing import SqliteCheckpointer
+
+class ChatState(TypedDict):
+    turns: Annotated[List[BaseMessage], add_messages]
+
+def _build_graph(checkpointer: SqliteCheckpointer):
+    def reply(state: ChatState):
+        return {"turns": [AIMessage(content=f"reply {len(state['turns'])}")]}
+
+    workflow = StateGraph(ChatState)
+    workflow.add_node("reply", reply)
+    workflow.add_edge(START, "reply")
+    workflow.add_edge("reply", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+def _contents(state) -> List[str]:
+    return [message.content for message in state.values["turns"]]
+
+def test_sessions_survive_restart(tmp_path):
+    db_path = str(tmp_path / "checkpoints.db")
+    config = {"configurable": {"thread_id": "session-1"}}
+
+    with SqliteCheckpointer(db_path) as checkpointer:
+        graph = _build_graph(checkpointer)
+        graph.invoke({"turns": [SystemMessage(content="sys"), HumanMessage(content="hi")]}, config)
+        graph.invoke({"turns": [HumanMessage(content="again")]}, config)
+        before_restart = graph.get_state(config)
+
+    # A new checkpointer has none of the old one's caches, like a restarted process
+    with SqliteCheckpointer(db_path) as checkpointer:
+        graph = _build_graph(checkpointer)
+        reloaded = graph.get_state(config)
+        assert _contents(reloaded) == ["sys", "hi", "reply 2", "again", "reply 4"]
+        assert [message.id for message in reloaded.values["turns"]] == \
+            [message.id for message in before_restart.values["turns"]]
+        assert all(message.id is not None for message in reloaded.values["turns"])
+
+        # add_messages matches on IDs, so the next turn must append rather than re-add the history
+        graph.invoke({"turns": [HumanMessage(content="fourth")]}, config)
+        assert _contents(graph.get_state(config)) == ["sys", "hi", "reply 2", "again", "reply 4", "fourth", "reply 6"]
+
+def test_messages_are_stored_once(tmp_path):
+    config = {"configurable": {"thread_id": "session-1"}}
+    with SqliteCheckpointer(str(tmp_path / "checkpoints.db")) as checkpointer:
+        graph = _build_graph(checkpointer)
+        for i in range(3):
+            graph.invoke({"turns": [HumanMessage(content=f"message {i}")]}, config)
+        # Each checkpoint references the whole history, but each message is stored once (plus the ID-less copy of
+        # each human message in the graph input)
+        assert len(checkpointer.messages) <= 2 * 6
+
+def test_delete_thread_releases_messages(tmp_path):
+    config = {"configurable": {"thread_id": "session-1"}}
+    with SqliteCheckpointer(str(tmp_path / "checkpoints.db")) as checkpointer:
+        graph = _build_graph(checkpointer)
+        graph.invoke({"turns": [HumanMessage(content="hi")]}, config)
+        checkpointer.delete_thread("session-1")
+        assert graph.get_state(config).values == {}
+        assert len(checkpointer.messages) == 0
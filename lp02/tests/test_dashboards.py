@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from cw_expert.dashboards import (is_valid_period, is_valid_region, is_valid_stat, MAX_REPORTED_ERRORS,
+    validate_dashboard_json, validate_dashboard_request)
+
+def _metric_widget(**properties):
+    return {"type": "metric", "x": 0, "y": 0, "width": 12, "height": 6, "properties": {
+        "metrics": [
+            ["AWS/ES", "CPUUtilization", "DomainName", "d", "ClientId", "123456789012"],
+            [".", "JVMMemoryPressure", ".", "."],
+        ],
+        "region": "us-west-2",
+        "stat": "Average",
+        "period": 300,
+        "view": "timeSeries",
+        **properties,
+    }}
+
+def _dashboard(*widgets):
+    return json.dumps({"widgets": list(widgets)})
+
+def test_valid_dashboard_has_no_errors():
+    text = {"type": "text", "x": 12, "y": 0, "width": 12, "height": 6, "properties": {"markdown": "# Domain health"}}
+    assert validate_dashboard_json(_dashboard(_metric_widget(), text)) == []
+
+@pytest.mark.parametrize("properties,expected", [
+    ({"stat": "avg"}, "widgets[0].properties: unknown stat 'avg'"),
+    ({"period": 45}, "widgets[0].properties: period must be 1, 5, 10, 30, or a multiple of 60 seconds, not 45"),
+    ({"view": "line"}, "widgets[0].properties.view: must be one of"),
+    ({"region": "mars-1"}, "widgets[0].properties: 'mars-1' is not an AWS region"),
+    ({"metrics": [[".", "CPUUtilization"]]}, "widgets[0].properties.metrics[0]: the first metric can't use the '.'"),
+    ({"metrics": [["AWS/ES", "CPUUtilization", "DomainName"]]},
+        "widgets[0].properties.metrics[0]: dimensions must come in name/value pairs"),
+])
+def test_metric_widget_mistakes_are_reported(properties, expected):
+    errors = validate_dashboard_json(_dashboard(_metric_widget(**properties)))
+    assert len(errors) == 1
+    assert errors[0].startswith(expected)
+
+def test_widget_must_fit_the_grid():
+    widget = {**_metric_widget(), "x": 20, "width": 6}
+    assert validate_dashboard_json(_dashboard(widget)) == \
+        ["widgets[0]: widgets must fit in the 24-column grid (x=20, width=6)"]
+
+def test_malformed_bodies_are_reported():
+    assert validate_dashboard_json("{nope")[0].startswith("The dashboard body is not valid JSON")
+    assert validate_dashboard_json("[]") == ["The dashboard body must be a JSON object with a 'widgets' array"]
+    assert validate_dashboard_json("{}") == ["widgets: the dashboard body needs a non-empty 'widgets' array"]
+
+def test_error_count_is_capped():
+    widgets = [{"type": "graph"} for _ in range(MAX_REPORTED_ERRORS + 5)]
+    errors = validate_dashboard_json(_dashboard(*widgets))
+    assert len(errors) == MAX_REPORTED_ERRORS + 1
+    assert errors[-1].startswith("...and")
+
+def test_request_checks_region_and_name():
+    errors = validate_dashboard_request(_dashboard(_metric_widget()), "mars-1", "bad name!")
+    assert errors[0] == "'mars-1' is not an AWS region"
+    assert errors[1].startswith("Dashboard names can only contain")
+    assert validate_dashboard_request(_dashboard(_metric_widget()), "us-gov-west-1", "domain-health_1") == []
+
+def test_stats_periods_and_regions():
+    assert all(is_valid_stat(stat) for stat in ["Average", "p99", "p99.9", "tm90", "TM(10%:90%)", "IQM"])
+    assert not any(is_valid_stat(stat) for stat in ["avg", "P99x", "p101", None])
+    assert all(is_valid_period(period) for period in [1, 30, 60, 300, 86400])
+    assert not any(is_valid_period(period) for period in [0, 45, 90, True, "60"])
+    assert all(is_valid_region(region) for region in ["us-west-2", "cn-north-1", "us-iso-east-1"])
+    assert not any(is_valid_region(region) for region in ["mars-1", "US-WEST-2", ""])
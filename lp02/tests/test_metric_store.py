@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+import numpy as np
+
+from benchmarks.stubs import StubCloudWatchClient
+from cw_expert.metric_data import fetch_metric_series, get_time_window, MetricQuery, series_to_matrix
+from cw_expert.metric_store import MetricStore, MetricStoreConfig
+
+ARN = "arn:aws:es:us-west-2:123456789012:domain/d"
+PERIOD = 60
+
+class _RecordingCloudWatchClient(StubCloudWatchClient):
+    def __init__(self):
+        super().__init__()
+        self.windows = []
+
+    def get_metric_data(self, **kwargs):
+        self.windows.append((kwargs["StartTime"], kwargs["EndTime"]))
+        return super().get_metric_data(**kwargs)
+
+def _queries(count: int):
+    return [MetricQuery(name, {"DomainName": "d"}) for name in StubCloudWatchClient().metric_names[:count]]
+
+def _fetch_directly(client, queries, start_time, end_time):
+    return series_to_matrix(fetch_metric_series(client, queries, start_time, end_time, PERIOD), start_time, end_time,
+        PERIOD)
+
+def test_only_missing_periods_are_fetched(tmp_path):
+    client = _RecordingCloudWatchClient()
+    store = MetricStore(MetricStoreConfig(directory=str(tmp_path), settle_seconds=0))
+    queries = _queries(3)
+    # A window well in the past, so every period has settled
+    start_time, end_time = get_time_window(2, PERIOD)
+    start_time, end_time = start_time - timedelta(days=1), end_time - timedelta(days=1)
+
+    first = store.fetch_matrix(client, ARN, queries, start_time, end_time, PERIOD)
+    assert np.array_equal(first, _fetch_directly(client, queries, start_time, end_time), equal_nan=True)
+
+    # Asking again fetches nothing; widening the window fetches only the new hour before it
+    client.windows.clear()
+    store.fetch_matrix(client, ARN, queries, start_time, end_time, PERIOD)
+    assert client.windows == []
+
+    earlier_start = start_time - timedelta(hours=1)
+    widened = store.fetch_matrix(client, ARN, queries, earlier_start, end_time, PERIOD)
+    assert client.windows == [(earlier_start, start_time)]
+    assert np.array_equal(widened, _fetch_directly(client, queries, earlier_start, end_time), equal_nan=True)
+
+def test_gaps_between_windows_are_filled(tmp_path):
+    client = _RecordingCloudWatchClient()
+    store = MetricStore(MetricStoreConfig(directory=str(tmp_path), settle_seconds=0))
+    queries = _queries(2)
+    start_time, _ = get_time_window(6, PERIOD)
+    start_time -= timedelta(days=1)
+    hour = timedelta(hours=1)
+
+    store.fetch_matrix(client, ARN, queries, start_time, start_time + hour, PERIOD)
+    store.fetch_matrix(client, ARN, queries, start_time + 3 * hour, start_time + 4 * hour, PERIOD)
+
+    client.windows.clear()
+    matrix = store.fetch_matrix(client, ARN, queries, start_time, start_time + 4 * hour, PERIOD)
+    assert client.windows == [(start_time + hour, start_time + 3 * hour)]
+    assert matrix.shape == (2, 240)
+    assert np.array_equal(matrix, _fetch_directly(client, queries, start_time, start_time + 4 * hour), equal_nan=True)
+
+def test_unsettled_periods_are_fetched_again(tmp_path):
+    client = _RecordingCloudWatchClient()
+    store = MetricStore(MetricStoreConfig(directory=str(tmp_path), settle_seconds=30 * 60))
+    queries = _queries(1)
+    start_time, end_time = get_time_window(2, PERIOD)
+
+    store.fetch_matrix(client, ARN, queries, start_time, end_time, PERIOD)
+    client.windows.clear()
+    store.fetch_matrix(client, ARN, queries, start_time, end_time, PERIOD)
+    assert len(client.windows) == 1
+    refetched_start, refetched_end = client.windows[0]
+    assert refetched_end == end_time
+    assert end_time - timedelta(minutes=32) <= refetched_start <= end_time - timedelta(minutes=30)
+
+def test_stored_series_survive_restart(tmp_path):
+    client = _RecordingCloudWatchClient()
+    queries = _queries(2)
+    start_time, end_time = get_time_window(1, PERIOD)
+    start_time, end_time = start_time - timedelta(days=1), end_time - timedelta(days=1)
+
+    first = MetricStore(MetricStoreConfig(directory=str(tmp_path))).fetch_matrix(client, ARN, queries, start_time,
+        end_time, PERIOD)
+    client.windows.clear()
+    second = MetricStore(MetricStoreConfig(directory=str(tmp_path))).fetch_matrix(client, ARN, queries, start_time,
+        end_time, PERIOD)
+    assert client.windows == []
+    assert np.array_equal(first, second, equal_nan=True)
@@ -0,0 +1,41 @@
+from botocore.exceptions import ClientError
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+import pytest
+
+from utilities.models import ModelConfig, ModelRoute, ModelRouter
+from utilities.response_cache import LLM_RESPONSE_CACHE, configure_response_cache, ResponseCacheConfig
+
+PRIMARY = ModelConfig(model_id="primary")
+FALLBACK = ModelConfig(model_id="fallback")
+
+@pytest.fixture
+def response_cache():
+    configure_response_cache(ResponseCacheConfig(enabled=True))
+    yield LLM_RESPONSE_CACHE
+    configure_response_cache(ResponseCacheConfig())
+
+def _router(primary_available: dict) -> ModelRouter:
+    def create_llm(config: ModelConfig):
+        def respond(messages):
+            if config == PRIMARY and not primary_available["value"]:
+                raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "slow down"}}, "Converse")
+            return AIMessage(content=f"answer from {config.model_id}")
+        return RunnableLambda(respond)
+
+    router = ModelRouter(llm_factory=create_llm)
+    router.register("node", ModelRoute(primary=PRIMARY, fallback=FALLBACK))
+    return router
+
+def test_fallback_answers_are_not_cached_as_the_primarys(response_cache):
+    primary_available = {"value": False}
+    router = _router(primary_available)
+    messages = [HumanMessage(content="hi")]
+
+    assert router.invoke("node", messages).content == "answer from fallback"
+    primary_available["value"] = True
+    assert router.invoke("node", messages).content == "answer from primary"
+    # Now the primary's answer is cached
+    primary_available["value"] = False
+    assert router.invoke("node", messages).content == "answer from primary"
+    assert response_cache.memory_stats.hits == 1
@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+
+from aws_interactions import rate_limiting
+from aws_interactions.rate_limiting import TokenBucket
+
+def test_calls_past_the_burst_wait_for_tokens():
+    bucket = TokenBucket(max_rate=20.0)
+    start = time.monotonic()
+    for _ in range(25):
+        bucket.acquire()
+    # The first 20 calls are the burst; the other 5 are refilled at 20 per second
+    assert time.monotonic() - start == pytest.approx(0.25, abs=0.1)
+    stats = bucket.to_json()
+    assert stats["acquired"] == 25
+    assert stats["delayed"] >= 4
+
+def test_throttle_pauses_and_slows_the_bucket(monkeypatch):
+    monkeypatch.setattr(rate_limiting.random, "uniform", lambda low, high: high)
+    bucket = TokenBucket(max_rate=10.0)
+
+    assert bucket.record_throttle() == pytest.approx(rate_limiting.BACKOFF_INITIAL_SECONDS)
+    assert bucket.rate == pytest.approx(10.0 * rate_limiting.THROTTLE_RATE_FACTOR)
+    # The pause doubles with each throttle in a row
+    assert bucket.record_throttle() == pytest.approx(2 * rate_limiting.BACKOFF_INITIAL_SECONDS)
+
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 2 * rate_limiting.BACKOFF_INITIAL_SECONDS - 0.01
+
+def test_rate_recovers_after_successes():
+    bucket = TokenBucket(max_rate=10.0)
+    for _ in range(10):
+        bucket.record_throttle()
+    assert bucket.rate == pytest.approx(10.0 * rate_limiting.MIN_RATE_FRACTION)
+
+    bucket.record_success()
+    assert bucket.rate == pytest.approx(10.0 * (rate_limiting.MIN_RATE_FRACTION + rate_limiting.RECOVERY_RATE_FRACTION))
+    for _ in range(100):
+        bucket.record_success()
+    assert bucket.rate == 10.0
+
+def test_concurrent_callers_share_the_rate():
+    bucket = TokenBucket(max_rate=50.0)
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(10)]) for _ in range(8)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 80 calls: a burst of 50, then 30 more at 50 per second
+    assert time.monotonic() - start == pytest.approx(0.6, abs=0.15)
+    stats = bucket.to_json()
+    assert stats["acquired"] == 80
+    assert stats["max_queue_depth"] > 1
@@ -0,0 +1,53 @@
+import threading
+import time
+
+from cw_expert.tools import _RegionSlots, _run_by_region
+
+class _ConcurrencyTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = {}
+        self.max_in_flight = {}
+        self.finished = []
+
+    def task(self, region: str, name: str, seconds: float):
+        def run():
+            with self._lock:
+                self.in_flight[region] = self.in_flight.get(region, 0) + 1
+                self.max_in_flight[region] = max(self.max_in_flight.get(region, 0), self.in_flight[region])
+            time.sleep(seconds)
+            with self._lock:
+                self.in_flight[region] -= 1
+                self.finished.append(name)
+            return name
+        return region, run
+
+def test_busy_region_does_not_hold_up_other_regions():
+    tracker = _ConcurrencyTracker()
+    tasks = [tracker.task("us-east-1", f"east-{i}", 0.2) for i in range(8)]
+    tasks += [tracker.task("eu-west-1", f"west-{i}", 0.01) for i in range(2)]
+
+    results = dict(_run_by_region(tasks, _RegionSlots(2), max_workers=4))
+
+    assert [results[position] for position in range(10)] == \
+        [f"east-{i}" for i in range(8)] + [f"west-{i}" for i in range(2)]
+    assert tracker.max_in_flight == {"us-east-1": 2, "eu-west-1": 2}
+    # The other region's tasks don't wait for the busy region's queue to drain
+    assert set(tracker.finished[:2]) == {"west-0", "west-1"}
+
+def test_region_limits_are_shared_between_callers():
+    tracker = _ConcurrencyTracker()
+    region_slots = _RegionSlots(3)
+
+    def caller(prefix: str):
+        tasks = [tracker.task("us-east-1", f"{prefix}-{i}", 0.02) for i in range(6)]
+        assert len(list(_run_by_region(tasks, region_slots, max_workers=6))) == 6
+
+    callers = [threading.Thread(target=caller, args=(prefix,)) for prefix in ["a", "b", "c"]]
+    for thread in callers:
+        thread.start()
+    for thread in callers:
+        thread.join()
+
+    assert len(tracker.finished) == 18
+    assert tracker.max_in_flight["us-east-1"] == 3
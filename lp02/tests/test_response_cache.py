@@ -0,0 +1,54 @@
+from langchain_aws.chat_models.bedrock_converse import _messages_to_bedrock, _parse_response
+from langchain_core.messages import HumanMessage, ToolMessage
+
+from utilities.response_cache import LlmResponseCache, ResponseCacheConfig, make_cache_key
+
+def _tool_calling_response():
+    # What Bedrock's Converse API returns for a turn that calls a tool
+    return _parse_response({
+        "output": {"message": {"role": "assistant", "content": [
+            {"text": "Let me look up the metrics."},
+            {"toolUse": {"toolUseId": "tooluse_original", "name": "ListMetrics", "input": {"domain": "arn"}}},
+        ]}},
+        "usage": {"inputTokens": 10, "outputTokens": 5, "totalTokens": 15},
+        "stopReason": "tool_use",
+    })
+
+def _tool_use_ids(bedrock_message):
+    return [block["toolUse"]["toolUseId"] for block in bedrock_message["content"] if "toolUse" in block]
+
+def test_replayed_tool_calls_round_trip_to_bedrock(tmp_path):
+    cache = LlmResponseCache(ResponseCacheConfig(enabled=True, disk_path=str(tmp_path / "responses.db")))
+    cache.put("key", _tool_calling_response())
+    # Clear the memory tier so the response is read back from disk
+    cache.configure(cache.config)
+
+    for _ in range(2):
+        replayed = cache.get("key")
+        tool_call_id = replayed.tool_calls[0]["id"]
+        assert tool_call_id != "tooluse_original"
+
+        bedrock_messages, _ = _messages_to_bedrock([
+            HumanMessage(content="What metrics does my domain have?"),
+            replayed,
+            ToolMessage(content="CPUUtilization", tool_call_id=tool_call_id),
+        ])
+        # Exactly one tool use, answered by the tool result
+        assert _tool_use_ids(bedrock_messages[1]) == [tool_call_id]
+        assert bedrock_messages[2]["content"][0]["toolResult"]["toolUseId"] == tool_call_id
+
+def test_replays_get_distinct_ids():
+    cache = LlmResponseCache(ResponseCacheConfig(enabled=True))
+    cache.put("key", _tool_calling_response())
+    first, second = cache.get("key"), cache.get("key")
+    assert first.tool_calls[0]["id"] != second.tool_calls[0]["id"]
+    assert cache.get("other") is None
+
+def test_cache_key_ignores_tool_call_ids():
+    first, second = _tool_calling_response(), _tool_calling_response()
+    second = second.model_copy(update={"tool_calls": [{**second.tool_calls[0], "id": "tooluse_other"}]})
+    params = {"model_id": "model", "temperature": 0}
+    assert make_cache_key([HumanMessage(content="hi"), first], params, []) == \
+        make_cache_key([HumanMessage(content="hi"), second], params, [])
+    assert make_cache_key([HumanMessage(content="hi")], params, []) != \
+        make_cache_key([HumanMessage(content="hello")], params, [])
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from langchain_core.tools import tool
+import pytest
+
+from utilities import graph
+
+@tool
+def sleepy(seconds: float) -> str:
+    """Sleeps for the given number of seconds."""
+    time.sleep(seconds)
+    return f"slept {seconds}"
+
+@pytest.fixture
+def single_worker_pool(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(graph, "_tool_executor", executor)
+    yield
+    executor.shutdown(wait=True)
+
+def _call(call_id: str, seconds: float):
+    return {"name": "sleepy", "args": {"seconds": seconds}, "id": call_id, "type": "tool_call"}
+
+def test_timeout_excludes_time_spent_queued(single_worker_pool):
+    # Together the calls take longer than the timeout, but each on its own doesn't
+    tool_calls = [_call("a", 0.2), _call("b", 0.2), _call("c", 0.2)]
+    observations = graph.invoke_tool_calls(tool_calls, {"sleepy": sleepy}, timeout_seconds=0.5)
+    assert observations == ["slept 0.2", "slept 0.2", "slept 0.2"]
+
+def test_timed_out_call_is_reported_as_still_running():
+    release = threading.Event()
+
+    @tool
+    def hangs() -> str:
+        """Blocks until released."""
+        release.wait()
+        return "done"
+
+    tool_calls = [{"name": "hangs", "args": {}, "id": "a", "type": "tool_call"}, _call("b", 0),
+        {"name": "missing", "args": {}, "id": "c", "type": "tool_call"}]
+    try:
+        observations = graph.invoke_tool_calls(tool_calls, {"hangs": hangs, "sleepy": sleepy}, timeout_seconds=0.2)
+    finally:
+        release.set()
+    assert observations[0].startswith("Error: The tool call timed out after 0.2 seconds")
+    assert "still be running" in observations[0]
+    assert observations[1:] == ["slept 0.0", "Error: Unknown tool 'missing'"]
+
+def test_call_that_cannot_start_is_cancelled(single_worker_pool):
+    tool_calls = [_call("a", 0.4), _call("b", 0)]
+    observations = graph.invoke_tool_calls(tool_calls, {"sleepy": sleepy}, timeout_seconds=0.2)
+    assert "still be running" in observations[0]
+    assert observations[1] == "Error: The tool call could not be started within 0.2 seconds"
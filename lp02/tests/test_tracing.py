@@ -0,0 +1,22 @@
+import pytest
+
+from utilities.tracing import configure_tracing, InMemorySpanCollector, SpanExporter, TRACER
+
+def test_incomplete_exporter_cannot_be_created():
+    class NoExport(SpanExporter):
+        pass
+
+    with pytest.raises(TypeError):
+        NoExport()
+
+def test_collector_receives_finished_spans():
+    collector = InMemorySpanCollector()
+    configure_tracing(collector)
+    try:
+        with TRACER.span("outer", "graph"):
+            with TRACER.span("inner", "tool"):
+                pass
+    finally:
+        configure_tracing()
+    assert [span.name for span in collector.spans] == ["inner", "outer"]
+    assert collector.spans[0].parent_span_id == collector.spans[1].span_id
@@ -0,0 +1,99 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+@dataclass
+class CacheStats:
+    """
+    Simple thread-safe hit/miss counters shared by the various caches in the package.
+    """
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def record_hit(self, count: int = 1):
+        with self._lock:
+            self.hits += count
+
+    def record_miss(self, count: int = 1):
+        with self._lock:
+            self.misses += count
+
+    def record_eviction(self, count: int = 1):
+        with self._lock:
+            self.evictions += count
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate
+        }
+
+class TtlLruCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        """
+        Bounded, thread-safe cache whose entries expire after ttl_seconds and are evicted least-recently-used first
+        once more than max_entries are stored.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.stats = CacheStats()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.record_miss()
+                return None
+
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.stats.record_eviction()
+                self.stats.record_miss()
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats.record_hit()
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.record_eviction()
+
+    def invalidate(self, key: Hashable = None):
+        """
+        Drop a single entry, or every entry if no key is given.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,563 @@
+import asyncio
+import atexit
+from collections import Counter
+from contextlib import AbstractAsyncContextManager, AbstractContextManager
+import hashlib
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+
+from utilities.caching import TtlLruCache
+
+logger = logging.getLogger(__name__)
+
+#
+# A disk-backed replacement for LangGraph's MemorySaver.  Checkpoints live in a SQLite database in WAL mode; writes
+# are committed in batches rather than one transaction per step, and only the most recent checkpoints of each thread
+# are retained so the database stays flat over long uptimes.  Messages are stored once in a content-addressed table
+# and referenced by digest from each checkpoint, since consecutive checkpoints mostly hold the same messages.
+#
+
+# How many checkpoints to keep for each thread.  LangGraph only needs the latest one (and its parent) to
+# resume a conversation; the rest are history.
+DEFAULT_KEEP_LAST = 10
+
+# Commit buffered writes once this many statements are pending, or after this many seconds, whichever is first
+DEFAULT_COMMIT_EVERY = 64
+DEFAULT_COMMIT_INTERVAL_SECONDS = 1.0
+
+# Messages are stored once, by content hash, and checkpoints hold references to them.  These caches let us skip
+# re-serializing messages we've already stored and re-loading messages we've already read.
+MESSAGE_REF_KEY = "__message_ref__"
+STORED_MESSAGE_CACHE_SIZE = 10_000
+LOADED_MESSAGE_CACHE_SIZE = 10_000
+
+# SQLite's default limit on the number of parameters in one statement
+SQLITE_MAX_PARAMETERS = 999
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    checkpoint_type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    message_refs TEXT,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    value_type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    digest TEXT PRIMARY KEY,
+    value_type TEXT,
+    value BLOB,
+    refcount INTEGER NOT NULL
+);
+"""
+
+class MessageStore:
+    def __init__(self, conn: sqlite3.Connection, serde: SerializerProtocol):
+        """
+        Content-addressed, refcounted storage for the messages in checkpointed state.  Each distinct message is
+        serialized and stored once no matter how many checkpoints contain it; checkpoints hold its digest instead.
+        The caller is responsible for locking and committing.
+        """
+        self._conn = conn
+        self.serde = serde
+        # id(message) -> (message, message ID, digest).  Holding the message keeps its id() from being reused while
+        # cached.  Like the token counts in utilities.context, this relies on messages not being modified once they're
+        # in the state, with one exception: add_messages gives new messages their ID in place, after they've already
+        # been checkpointed in the graph input.  So messages are only cached once they have an ID, and only while it's
+        # the same one.
+        self._stored = TtlLruCache(max_entries=STORED_MESSAGE_CACHE_SIZE, ttl_seconds=float("inf"))
+        self._loaded = TtlLruCache(max_entries=LOADED_MESSAGE_CACHE_SIZE, ttl_seconds=float("inf"))
+
+    def _serialize(self, message: BaseMessage) -> Tuple[str, str, bytes]:
+        value_type, value = self.serde.dumps_typed(message)
+        digest = hashlib.sha256(value_type.encode() + b"\0" + value).hexdigest()
+        return digest, value_type, value
+
+    def add_references(self, messages: List[BaseMessage]) -> List[str]:
+        """
+        Takes a reference to each message, storing the ones we haven't seen before.  Returns their digests.
+        """
+        digests = []
+        new_rows: Dict[str, Tuple[str, bytes]] = {}
+        for message in messages:
+            cached = self._stored.get(id(message))
+            if cached is not None and cached[0] is message and cached[1] == message.id:
+                digests.append(cached[2])
+                continue
+            digest, value_type, value = self._serialize(message)
+            if message.id is not None:
+                self._stored.put(id(message), (message, message.id, digest))
+                self._loaded.put(digest, message)
+            new_rows[digest] = (value_type, value)
+            digests.append(digest)
+
+        counts = Counter(digests)
+        self._conn.executemany(
+            "UPDATE messages SET refcount = refcount + ? WHERE digest = ?",
+            [(count, digest) for digest, count in counts.items()]
+        )
+        missing = self._missing(list(counts))
+        if missing:
+            # Messages we skipped serializing thanks to the cache, but which have since been collected
+            for message, digest in zip(messages, digests):
+                if digest in missing and digest not in new_rows:
+                    new_rows[digest] = self._serialize(message)[1:]
+            self._conn.executemany(
+                "INSERT INTO messages VALUES (?, ?, ?, ?)",
+                [(digest, *new_rows[digest], counts[digest]) for digest in missing]
+            )
+        return digests
+
+    def remove_references(self, digests: List[str]):
+        """
+        Drops a reference to each message, deleting messages that are no longer referenced by any checkpoint.
+        """
+        counts = Counter(digests)
+        if not counts:
+            return
+        self._conn.executemany(
+            "UPDATE messages SET refcount = refcount - ? WHERE digest = ?",
+            [(count, digest) for digest, count in counts.items()]
+        )
+        self._conn.execute("DELETE FROM messages WHERE refcount <= 0")
+
+    def _missing(self, digests: List[str]) -> set:
+        found = set()
+        for i in range(0, len(digests), SQLITE_MAX_PARAMETERS):
+            chunk = digests[i:i + SQLITE_MAX_PARAMETERS]
+            rows = self._conn.execute(
+                f"SELECT digest FROM messages WHERE digest IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update(row[0] for row in rows)
+        return set(digests) - found
+
+    def load(self, digests: List[str]) -> Dict[str, BaseMessage]:
+        """
+        Returns the messages with the given digests.
+        """
+        messages = {}
+        to_fetch = []
+        for digest in set(digests):
+            message = self._loaded.get(digest)
+            if message is None:
+                to_fetch.append(digest)
+            else:
+                messages[digest] = message
+
+        for i in range(0, len(to_fetch), SQLITE_MAX_PARAMETERS):
+            chunk = to_fetch[i:i + SQLITE_MAX_PARAMETERS]
+            rows = self._conn.execute(
+                f"SELECT digest, value_type, value FROM messages WHERE digest IN ({', '.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            for digest, value_type, value in rows:
+                message = self.serde.loads_typed((value_type, value))
+                self._loaded.put(digest, message)
+                messages[digest] = message
+        return messages
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+def _is_message_list(value: Any) -> bool:
+    return isinstance(value, list) and any(isinstance(item, BaseMessage) for item in value)
+
+def _is_message_ref(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and MESSAGE_REF_KEY in value
+
+class SqliteCheckpointer(BaseCheckpointSaver[str], AbstractContextManager, AbstractAsyncContextManager):
+    def __init__(self, db_path: str, keep_last: Optional[int] = DEFAULT_KEEP_LAST,
+            commit_every: int = DEFAULT_COMMIT_EVERY, commit_interval_seconds: float = DEFAULT_COMMIT_INTERVAL_SECONDS,
+            *, serde: Optional[SerializerProtocol] = None):
+        """
+        db_path: the SQLite database file; created if it doesn't exist
+        keep_last: how many checkpoints to retain per thread; None keeps everything
+        commit_every/commit_interval_seconds: batching policy for commits.  All access goes through one connection,
+            so reads always see uncommitted writes; batching only affects what survives a crash.
+        """
+        super().__init__(serde=serde)
+        self.db_path = db_path
+        self.keep_last = keep_last
+        self.commit_every = commit_every
+        self.commit_interval_seconds = commit_interval_seconds
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level="DEFERRED")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(checkpoints)")]
+        if "message_refs" not in columns:
+            # Databases created before checkpoints referenced the message store; their checkpoints hold no refs
+            self._conn.execute("ALTER TABLE checkpoints ADD COLUMN message_refs TEXT")
+        self._conn.commit()
+        self.messages = MessageStore(self._conn, self.serde)
+
+        self._pending_statements = 0
+        self._closed = False
+        self._flusher = threading.Thread(target=self._flush_periodically, name="checkpoint-flusher", daemon=True)
+        self._flusher.start()
+
+    def __enter__(self) -> "SqliteCheckpointer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> Optional[bool]:
+        self.close()
+        return None
+
+    async def __aenter__(self) -> "SqliteCheckpointer":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> Optional[bool]:
+        self.close()
+        return None
+
+    def _flush_periodically(self):
+        while not self._closed:
+            time.sleep(self.commit_interval_seconds)
+            self.flush()
+
+    def flush(self):
+        """
+        Commits any buffered writes.
+        """
+        with self._lock:
+            if self._pending_statements and not self._closed:
+                self._conn.commit()
+                self._pending_statements = 0
+
+    def _statement_done(self, count: int = 1):
+        self._pending_statements += count
+        if self._pending_statements >= self.commit_every:
+            self._conn.commit()
+            self._pending_statements = 0
+
+    def compact(self):
+        """
+        Flushes, then folds the WAL back into the main database file and releases free pages.
+        """
+        with self._lock:
+            self.flush()
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._conn.commit()
+            self._closed = True
+            self._conn.close()
+
+    def _load_tuple(self, thread_id: str, checkpoint_ns: str, row: Tuple) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata = row
+
+        writes = self._conn.execute(
+            "SELECT task_id, channel, value_type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        sends = []
+        if parent_checkpoint_id:
+            sends = self._conn.execute(
+                "SELECT value_type, value FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? AND channel = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS)
+            ).fetchall()
+
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **self._resolve_message_refs(self.serde.loads_typed((checkpoint_type, checkpoint))),
+                "pending_sends": [self.serde.loads_typed(send) for send in sends],
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+            parent_config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": parent_checkpoint_id,
+                }
+            }
+            if parent_checkpoint_id
+            else None,
+        )
+
+    def _to_refs(self, value: Any, digests: List[str]) -> Any:
+        if _is_message_list(value):
+            stored = iter(self.messages.add_references([item for item in value if isinstance(item, BaseMessage)]))
+            value = [{MESSAGE_REF_KEY: next(stored)} if isinstance(item, BaseMessage) else item for item in value]
+            digests.extend(item[MESSAGE_REF_KEY] for item in value if _is_message_ref(item))
+            return value
+        if isinstance(value, dict):
+            # e.g. the graph input in the __start__ channel, which holds whole message lists
+            return {key: self._to_refs(item, digests) for key, item in value.items()}
+        return value
+
+    def _replace_messages_with_refs(self, checkpoint: Checkpoint) -> List[str]:
+        """
+        Swaps the messages in the checkpoint's channel values for references into the message store, in place.
+        Returns the digests referenced.
+        """
+        digests: List[str] = []
+        checkpoint["channel_values"] = self._to_refs(checkpoint["channel_values"], digests)
+        return digests
+
+    def _collect_refs(self, value: Any, digests: List[str]):
+        if isinstance(value, list):
+            digests.extend(item[MESSAGE_REF_KEY] for item in value if _is_message_ref(item))
+        elif isinstance(value, dict):
+            for item in value.values():
+                self._collect_refs(item, digests)
+
+    def _from_refs(self, value: Any, messages: Dict[str, BaseMessage]) -> Any:
+        if isinstance(value, list):
+            return [messages[item[MESSAGE_REF_KEY]] if _is_message_ref(item) else item for item in value]
+        if isinstance(value, dict):
+            return {key: self._from_refs(item, messages) for key, item in value.items()}
+        return value
+
+    def _resolve_message_refs(self, checkpoint: Checkpoint) -> Checkpoint:
+        digests: List[str] = []
+        self._collect_refs(checkpoint.get("channel_values", {}), digests)
+        if digests:
+            checkpoint["channel_values"] = self._from_refs(checkpoint["channel_values"], self.messages.load(digests))
+        return checkpoint
+
+    def _release_message_refs(self, where: str, params: Tuple):
+        # Must be called before the matching checkpoint rows are deleted
+        rows = self._conn.execute(f"SELECT message_refs FROM checkpoints WHERE {where}", params).fetchall()
+        self.messages.remove_references([digest for (refs,) in rows if refs for digest in json.loads(refs)])
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata"
+
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+
+            if row is None:
+                return None
+            return self._load_tuple(thread_id, checkpoint_ns, row)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+            before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, " \
+            "metadata_type, metadata FROM checkpoints"
+        clauses: List[str] = []
+        params: List[Any] = []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(str(config["configurable"]["thread_id"]))
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_checkpoint_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+
+            metadata = self.serde.loads_typed((row[4], row[5]))
+            if filter and not all(metadata.get(key) == value for key, value in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+
+            with self._lock:
+                yield self._load_tuple(thread_id, checkpoint_ns, tuple(row))
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        c = checkpoint.copy()
+        c.pop("pending_sends")  # type: ignore[misc]
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        metadata_type, metadata_blob = self.serde.dumps_typed(metadata)
+
+        with self._lock:
+            digests = self._replace_messages_with_refs(c)
+            checkpoint_type, checkpoint_blob = self.serde.dumps_typed(c)
+            key = (thread_id, checkpoint_ns, checkpoint["id"])
+            self._release_message_refs("thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", key)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, config["configurable"].get("checkpoint_id"), checkpoint_type, checkpoint_blob, metadata_type,
+                    metadata_blob, json.dumps(digests))
+            )
+            self._statement_done()
+            self._apply_retention(thread_id, checkpoint_ns)
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def _apply_retention(self, thread_id: str, checkpoint_ns: str):
+        # Sub-graphs checkpoint under a new namespace each time they run, so retention is driven by the thread's root
+        # namespace and applied to every namespace: anything older than the oldest root checkpoint we keep is
+        # history from a finished step.  Checkpoint IDs are time-ordered, so they can be compared across namespaces.
+        if self.keep_last is None or checkpoint_ns != "":
+            return
+
+        cutoff = self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, self.keep_last - 1)
+        ).fetchone()
+        if cutoff is None:
+            return
+
+        self._release_message_refs("thread_id = ? AND checkpoint_id < ?", (thread_id, cutoff[0]))
+        for table in ["checkpoints", "writes"]:
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_id < ?",
+                (thread_id, cutoff[0])
+            )
+        self._statement_done(2)
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_blob = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel,
+                value_type, value_blob))
+
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._statement_done(len(rows))
+
+    def delete_thread(self, thread_id: Any):
+        """
+        Removes every checkpoint and write for the thread, and any messages only they referenced.
+        """
+        with self._lock:
+            self._release_message_refs("thread_id = ?", (str(thread_id),))
+            for table in ["checkpoints", "writes"]:
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (str(thread_id),))
+            self._statement_done(2)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+            before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        loop = asyncio.get_running_loop()
+        items = await loop.run_in_executor(
+            None, lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.put_writes, config, writes, task_id
+        )
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        # Same string versions as MemorySaver, so the two are interchangeable
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        next_v = current_v + 1
+        next_h = random.random()
+        return f"{next_v:032}.{next_h:016}"
+
+# Where the graphs keep their checkpoints by default
+CHECKPOINT_DB_PATH = "./checkpoints.db"
+
+_default_checkpointer: Optional[SqliteCheckpointer] = None
+_default_checkpointer_lock = threading.Lock()
+
+def get_default_checkpointer() -> SqliteCheckpointer:
+    """
+    Returns the process-wide checkpointer shared by the graphs, creating it on first use.  Buffered writes are
+    committed at interpreter exit.
+    """
+    global _default_checkpointer
+    with _default_checkpointer_lock:
+        if _default_checkpointer is None:
+            _default_checkpointer = SqliteCheckpointer(CHECKPOINT_DB_PATH)
+            atexit.register(_default_checkpointer.close)
+        return _default_checkpointer
@@ -0,0 +1,134 @@
+from dataclasses import dataclass, field
+from json import dumps
+import logging
+from typing import Callable, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from utilities.caching import TtlLruCache
+
+logger = logging.getLogger(__name__)
+
+#
+# Keep the messages we send to the LLM within a token budget.  The graph state keeps the full history; only the
+# view passed to the LLM is trimmed.
+#
+
+# Rough characters-per-token ratio for Claude models.  We don't have the tokenizer locally, and an estimate is good
+# enough to keep us clear of the context limit.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Messages are immutable once they're in the graph state, so their counts can be cached by ID
+TOKEN_COUNT_CACHE = TtlLruCache(max_entries=50_000, ttl_seconds=float("inf"))
+
+ELIDED_TOOL_OUTPUT = "[Tool output removed to save space ({tokens} tokens).  Call the tool again if it is needed.]"
+SUMMARY_PREFIX = "[Earlier parts of this conversation were removed to save space.  Summary of what was removed:]"
+
+def _count_tokens(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else dumps(message.content, default=str)
+    characters = len(content)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        characters += len(dumps([tool_call["args"] for tool_call in message.tool_calls], default=str))
+    return characters // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+def count_tokens(message: BaseMessage) -> int:
+    """
+    Estimates the number of tokens the message will use, caching the result for messages that have an ID.
+    """
+    if message.id is None:
+        return _count_tokens(message)
+
+    key = (message.id, type(message).__name__)
+    count = TOKEN_COUNT_CACHE.get(key)
+    if count is None:
+        count = _count_tokens(message)
+        TOKEN_COUNT_CACHE.put(key, count)
+    return count
+
+def summarize_turns(messages: List[BaseMessage]) -> str:
+    """
+    Cheap extractive summary of removed turns: what the user asked for, in order.
+    """
+    requests = []
+    for message in messages:
+        if isinstance(message, HumanMessage) and isinstance(message.content, str):
+            request = message.content.strip().replace("\n", " ")
+            requests.append(f"- The user said: {request[:200]}{'...' if len(request) > 200 else ''}")
+    return "\n".join(requests) if requests else "- Earlier tool calls and their results."
+
+@dataclass
+class ContextBudget:
+    """
+    max_tokens: the most (estimated) tokens to send to the LLM
+    summarizer: turns a list of removed messages into a short summary that is sent in their place
+    """
+    max_tokens: int
+    summarizer: Callable[[List[BaseMessage]], str] = field(default=summarize_turns)
+
+def _split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """
+    Splits the history into turns, each starting with a HumanMessage.  An AIMessage's tool calls and the
+    ToolMessages answering them always land in the same turn, so dropping whole turns keeps them paired.
+    """
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+def fit_to_budget(messages: List[BaseMessage], budget: Optional[ContextBudget]) -> List[BaseMessage]:
+    """
+    Returns the messages to send to the LLM, trimmed to fit the budget.  Leading system messages and the latest turn
+    are never touched.  Otherwise, we first replace old tool outputs with a short placeholder (oldest first), and if
+    that isn't enough we drop the oldest turns and send a summary of them instead.
+    """
+    if budget is None:
+        return messages
+
+    total = sum(count_tokens(message) for message in messages)
+    if total <= budget.max_tokens:
+        return messages
+
+    prefix_length = 0
+    while prefix_length < len(messages) and isinstance(messages[prefix_length], SystemMessage):
+        prefix_length += 1
+    prefix = messages[:prefix_length]
+    turns = _split_turns(messages[prefix_length:])
+    if len(turns) <= 1:
+        return messages
+
+    # Stage 1: elide old tool outputs, keeping the ToolMessage (and its tool_call_id) so the pairing stays valid
+    old_turns = [list(turn) for turn in turns[:-1]]
+    for turn in old_turns:
+        for i, message in enumerate(turn):
+            if total <= budget.max_tokens:
+                break
+            if not isinstance(message, ToolMessage):
+                continue
+            tokens = count_tokens(message)
+            elided = ToolMessage(
+                content=ELIDED_TOOL_OUTPUT.format(tokens=tokens),
+                tool_call_id=message.tool_call_id,
+                name=message.name
+            )
+            elided_tokens = _count_tokens(elided)
+            if elided_tokens < tokens:
+                turn[i] = elided
+                total -= tokens - elided_tokens
+
+    # Stage 2: drop the oldest turns and summarize them
+    removed: List[BaseMessage] = []
+    while total > budget.max_tokens and old_turns:
+        turn = old_turns.pop(0)
+        removed.extend(turn)
+        total -= sum(count_tokens(message) for message in turn)
+
+    trimmed = [message for turn in old_turns for message in turn] + turns[-1]
+    if removed:
+        logger.info(f"Dropped {len(removed)} messages from the LLM context to fit within {budget.max_tokens} tokens")
+        summary = HumanMessage(content=f"{SUMMARY_PREFIX}\n{budget.summarizer(removed)}")
+        trimmed = [summary] + trimmed
+
+    return prefix + trimmed
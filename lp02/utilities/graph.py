@@ -1,12 +1,43 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from contextvars import copy_context
 from dataclasses import dataclass
+import logging
+import threading
+import time
 
-from typing import Union
+from typing import Any, Dict, List, Literal, Optional, Union
+from langchain_core.messages import BaseMessage, ToolCall
+from langchain_core.tools import BaseTool
 from langgraph.graph.message import add_messages, Messages
 
+from utilities.tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
 @dataclass
 class ResetMessages:
     messages: Messages
 
+@dataclass
+class StreamEvent:
+    """
+    An event yielded by a streaming graph runner.
+    kind: "progress" (content is a short status string), "token" (content is a piece of LLM output text), or
+        "final" (content is the final graph state)
+    """
+    kind: Literal["progress", "token", "final"]
+    content: Any
+
+def get_chunk_text(chunk: BaseMessage) -> str:
+    """
+    Pulls the text out of a streamed message chunk.  Bedrock's Converse API streams content as a list of typed
+    blocks, so tool-use blocks need to be skipped.
+    """
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(block.get("text", "") for block in chunk.content if isinstance(block, dict) and block.get("type") == "text")
+
 def add_messages_with_reset(left: Messages, right: Union[Messages | ResetMessages]) -> Messages:
     """
     Performs the usual merge behavior, but if the right side is a ResetMessages object, it returns
@@ -14,4 +45,109 @@ def add_messages_with_reset(left: Messages, right: Union[Messages | ResetMessage
     """
     if isinstance(right, ResetMessages):
         return right.messages
-    return add_messages(left, right)
\ No newline at end of file
+    return add_messages(left, right)
+
+# Tool calls from a single LLM turn are run on this shared, bounded pool.  It is shared so that a hung tool call that
+# has timed out doesn't stop the caller from returning while the thread finishes in the background.
+TOOL_MAX_WORKERS = 16
+TOOL_CALL_TIMEOUT_SECONDS = 120
+
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool-call")
+
+def _invoke_tool(tool: BaseTool, tool_call: ToolCall) -> str:
+    with TRACER.span(tool_call["name"], "tool", tool_call_id=tool_call["id"]):
+        return tool.invoke(tool_call["args"])
+
+async def _ainvoke_tool(tool: BaseTool, tool_call: ToolCall) -> str:
+    with TRACER.span(tool_call["name"], "tool", tool_call_id=tool_call["id"]):
+        return await tool.ainvoke(tool_call["args"])
+
+def _timed_out_observation(tool_call: ToolCall, timeout_seconds: float) -> str:
+    # Python can't stop a running thread, so the tool carries on in the background and its result is discarded
+    logger.warning(f"Tool call {tool_call['name']} ({tool_call['id']}) timed out after {timeout_seconds}s and is "
+        "still running")
+    return (f"Error: The tool call timed out after {timeout_seconds} seconds.  It may still be running in the "
+        "background, but its result will not be reported.")
+
+class _PooledToolCall:
+    def __init__(self, tool: BaseTool, tool_call: ToolCall):
+        """
+        A tool call queued on the tool pool, which records when a worker picks it up so that its timeout doesn't
+        include the time spent waiting for one.
+        """
+        self.tool = tool
+        self.tool_call = tool_call
+        self.queued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.started = threading.Event()
+
+    def run(self) -> str:
+        self.started_at = time.monotonic()
+        self.started.set()
+        return _invoke_tool(self.tool, self.tool_call)
+
+    def get_observation(self, future: Future, timeout_seconds: float) -> str:
+        # A call still queued after timeout_seconds (because the pool is full of hung calls) is cancelled before it
+        # starts
+        self.started.wait(max(0, self.queued_at + timeout_seconds - time.monotonic()))
+        if not self.started.is_set() and future.cancel():
+            logger.warning(f"Tool call {self.tool_call['name']} ({self.tool_call['id']}) was not started within "
+                f"{timeout_seconds}s")
+            return f"Error: The tool call could not be started within {timeout_seconds} seconds"
+        self.started.wait()
+
+        try:
+            return future.result(timeout=max(0, self.started_at + timeout_seconds - time.monotonic()))
+        except FuturesTimeoutError:
+            return _timed_out_observation(self.tool_call, timeout_seconds)
+        except Exception as e:
+            logger.exception(f"Tool call {self.tool_call['name']} ({self.tool_call['id']}) failed")
+            return f"Error: {str(e)}"
+
+def invoke_tool_calls(tool_calls: List[ToolCall], tools_by_name: Dict[str, BaseTool],
+        timeout_seconds: float = TOOL_CALL_TIMEOUT_SECONDS) -> List[str]:
+    """
+    Invokes every tool call from an LLM turn in parallel and returns their observations in the same order as the
+    calls.  Unknown tools, tool exceptions, and calls that run longer than timeout_seconds (timed from when each call
+    starts) produce an "Error: ..." observation rather than raising, so each call is always paired with a result.
+    """
+    submitted = []
+    for tool_call in tool_calls:
+        tool = tools_by_name.get(tool_call["name"])
+        if tool is None:
+            submitted.append(None)
+        else:
+            pooled_call = _PooledToolCall(tool, tool_call)
+            # Run in a copy of the caller's context so that tracing spans are parented correctly
+            submitted.append((pooled_call, _tool_executor.submit(copy_context().run, pooled_call.run)))
+
+    observations = []
+    for tool_call, entry in zip(tool_calls, submitted):
+        if entry is None:
+            observations.append(f"Error: Unknown tool '{tool_call['name']}'")
+        else:
+            pooled_call, future = entry
+            observations.append(pooled_call.get_observation(future, timeout_seconds))
+
+    return observations
+
+async def ainvoke_tool_calls(tool_calls: List[ToolCall], tools_by_name: Dict[str, BaseTool],
+        timeout_seconds: float = TOOL_CALL_TIMEOUT_SECONDS) -> List[str]:
+    """
+    Async equivalent of invoke_tool_calls, running the calls concurrently on the current event loop.
+    """
+    async def invoke(tool_call: ToolCall) -> str:
+        tool = tools_by_name.get(tool_call["name"])
+        if tool is None:
+            return f"Error: Unknown tool '{tool_call['name']}'"
+
+        try:
+            return await asyncio.wait_for(_ainvoke_tool(tool, tool_call), timeout=timeout_seconds)
+        except asyncio.TimeoutError:
+            # Sync tools run in an executor thread, which the cancellation doesn't stop
+            return _timed_out_observation(tool_call, timeout_seconds)
+        except Exception as e:
+            logger.exception(f"Tool call {tool_call['name']} ({tool_call['id']}) failed")
+            return f"Error: {str(e)}"
+
+    return list(await asyncio.gather(*[invoke(tool_call) for tool_call in tool_calls]))
@@ -0,0 +1,248 @@
+from dataclasses import dataclass
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from botocore.exceptions import ClientError, ConnectTimeoutError, ReadTimeoutError
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+
+from aws_interactions.aws_client_provider import AwsClientProvider
+from utilities.prompt_caching import (add_cache_points, bind_tools_with_cache_point, PROMPT_CACHE_USAGE,
+    PromptCachingConfig)
+from utilities.response_cache import is_deterministic, LLM_RESPONSE_CACHE, make_cache_key, model_params_for_key
+from utilities.startup import startup_phase
+from utilities.tracing import record_llm_usage, TRACER
+
+logger = logging.getLogger(__name__)
+
+#
+# Per-node model routing.  Each graph node that calls an LLM registers the model it should use by default; the
+# routes can be overridden with configure_model_routes().  A route can name a fallback model that is used when the
+# primary one times out or is throttled.
+#
+
+DEFAULT_REGION = "us-west-2"
+
+# Bedrock errors that mean "try somewhere else" rather than "this request is bad"
+FALLBACK_ERROR_CODES = frozenset([
+    "ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException", "ModelNotReadyException",
+    "ModelTimeoutException"
+])
+
+@dataclass(frozen=True)
+class ModelConfig:
+    """
+    model_id: the Bedrock model ID
+    timeout_seconds: how long to wait on the model before giving up; None uses the Boto default
+    max_attempts: how many times Boto tries the call before giving up; None uses the Boto default.  Keep this low when
+        there's a fallback, so we fail over quickly.
+    """
+    model_id: str
+    max_tokens: int = 4096
+    temperature: float = 0
+    region_name: str = DEFAULT_REGION
+    timeout_seconds: Optional[float] = None
+    max_attempts: Optional[int] = None
+
+@dataclass(frozen=True)
+class ModelRoute:
+    primary: ModelConfig
+    fallback: Optional[ModelConfig] = None
+
+def create_bedrock_llm(config: ModelConfig) -> BaseChatModel:
+    """
+    Creates a Bedrock chat model on the shared bedrock-runtime client for its region, so every model (and graph) with
+    the same timeout settings reuses one client and its connection pool.
+    """
+    # langchain_aws (and the numpy it pulls in) is slow to import, so wait until a model is actually needed
+    with startup_phase("import langchain_aws"):
+        from langchain_aws import ChatBedrockConverse
+
+    client = AwsClientProvider(aws_region=config.region_name, aws_compute=True).get_bedrock_runtime(
+        config.timeout_seconds, config.max_attempts
+    )
+    return ChatBedrockConverse(
+        model=config.model_id,
+        temperature=config.temperature,
+        max_tokens=config.max_tokens,
+        region_name=config.region_name,
+        client=client
+    )
+
+def is_fallback_error(error: BaseException) -> bool:
+    """
+    Whether the error is a timeout or throttling, so the call is worth retrying on the fallback model.
+    """
+    if isinstance(error, (ReadTimeoutError, ConnectTimeoutError, TimeoutError)):
+        return True
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in FALLBACK_ERROR_CODES
+    return False
+
+class ModelRouter:
+    def __init__(self, llm_factory: Callable[[ModelConfig], BaseChatModel] = create_bedrock_llm):
+        """
+        Hands each graph node the model it's routed to.  Models, and the models with the node's tools bound to them,
+        are created on first use and then shared.
+        """
+        self._lock = threading.RLock()
+        self._llm_factory = llm_factory
+        self._default_routes: Dict[str, ModelRoute] = {}
+        self._configured_routes: Dict[str, ModelRoute] = {}
+        self._tools: Dict[str, List[BaseTool]] = {}
+        self._llms: Dict[ModelConfig, BaseChatModel] = {}
+        self._runnables: Dict[Tuple[str, ModelConfig, bool], Runnable] = {}
+
+    def register(self, node_name: str, default_route: ModelRoute, tools: Sequence[BaseTool] = ()):
+        """
+        Registers a node's default route and the tools its model is given.
+        """
+        with self._lock:
+            self._default_routes[node_name] = default_route
+            self._tools[node_name] = list(tools)
+            self._runnables = {key: value for key, value in self._runnables.items() if key[0] != node_name}
+
+    def configure(self, routes: Dict[str, ModelRoute]):
+        """
+        Overrides the routes of the given nodes.  Nodes not mentioned go back to their defaults.
+        """
+        with self._lock:
+            self._configured_routes = dict(routes)
+            self._runnables.clear()
+
+    def set_llm_factory(self, llm_factory: Callable[[ModelConfig], BaseChatModel]):
+        """
+        Changes how models are created (e.g. to stub them out for benchmarking).  Drops every model created so far.
+        """
+        with self._lock:
+            self._llm_factory = llm_factory
+            self._llms.clear()
+            self._runnables.clear()
+
+    def get_route(self, node_name: str) -> ModelRoute:
+        with self._lock:
+            route = self._configured_routes.get(node_name) or self._default_routes.get(node_name)
+        if route is None:
+            raise KeyError(f"No model route for node: {node_name}")
+        return route
+
+    def get_llm(self, config: ModelConfig) -> BaseChatModel:
+        with self._lock:
+            if config not in self._llms:
+                with startup_phase(f"create LLM {config.model_id}"):
+                    self._llms[config] = self._llm_factory(config)
+            return self._llms[config]
+
+    def _get_runnable(self, node_name: str, config: ModelConfig, use_cache_points: bool) -> Runnable:
+        key = (node_name, config, use_cache_points)
+        with self._lock:
+            if key not in self._runnables:
+                llm = self.get_llm(config)
+                tools = self._tools.get(node_name, [])
+                if not tools:
+                    runnable = llm
+                elif use_cache_points:
+                    runnable = bind_tools_with_cache_point(llm, tools)
+                else:
+                    runnable = llm.bind_tools(tools)
+                self._runnables[key] = runnable
+            return self._runnables[key]
+
+    def _attempts(self, node_name: str, messages: List[BaseMessage], prompt_caching: Optional[PromptCachingConfig]):
+        route = self.get_route(node_name)
+        configs = [route.primary] + ([route.fallback] if route.fallback else [])
+        use_cache_points = prompt_caching is not None and prompt_caching.enabled
+        request = add_cache_points(messages, prompt_caching) if use_cache_points else messages
+        for i, config in enumerate(configs):
+            yield config, self._get_runnable(node_name, config, use_cache_points), request, i == len(configs) - 1
+
+    def _lookup_cached_response(self, node_name: str,
+            messages: List[BaseMessage]) -> Tuple[Optional[str], Optional[BaseMessage]]:
+        """
+        Returns the response cache key for the call (None if it can't be cached) and the cached response, if any.
+        """
+        if not LLM_RESPONSE_CACHE.enabled:
+            return None, None
+
+        primary = self.get_route(node_name).primary
+        model_params = model_params_for_key(primary)
+        if not is_deterministic(model_params):
+            return None, None
+
+        with self._lock:
+            tools = self._tools.get(node_name, [])
+        key = make_cache_key(messages, model_params, tools)
+        response = LLM_RESPONSE_CACHE.get(key)
+        if response is not None:
+            logger.info(f"LLM response cache hit for {node_name}")
+            with TRACER.span("llm_invoke", "llm", model=primary.model_id, node=node_name, cache_hit=True):
+                pass
+        return key, response
+
+    def _record(self, span, response: BaseMessage, prompt_caching: Optional[PromptCachingConfig]):
+        record_llm_usage(span, response)
+        if prompt_caching is not None and prompt_caching.enabled:
+            PROMPT_CACHE_USAGE.record(response, span)
+
+    def _log_fallback(self, node_name: str, config: ModelConfig, error: BaseException):
+        logger.warning(f"Model {config.model_id} failed for {node_name} ({type(error).__name__}: {error}); "
+            "falling back")
+
+    def invoke(self, node_name: str, messages: List[BaseMessage],
+            prompt_caching: Optional[PromptCachingConfig] = None) -> BaseMessage:
+        """
+        Calls the node's model with the messages, falling back to the route's fallback model on timeouts and
+        throttling.  Each attempt is recorded as an "llm" span.  If the response cache is enabled, identical
+        deterministic requests are answered from it; only the primary model's responses are cached.
+        """
+        cache_key, cached_response = self._lookup_cached_response(node_name, messages)
+        if cached_response is not None:
+            return cached_response
+
+        for attempt, (config, runnable, request, is_last) in enumerate(self._attempts(node_name, messages,
+                prompt_caching)):
+            try:
+                with TRACER.span("llm_invoke", "llm", model=config.model_id, node=node_name) as span:
+                    response = runnable.invoke(request)
+                    self._record(span, response, prompt_caching)
+                # The key is the primary model's, so the fallback model's answers aren't cached under it
+                if cache_key is not None and attempt == 0:
+                    LLM_RESPONSE_CACHE.put(cache_key, response)
+                return response
+            except Exception as e:
+                if is_last or not is_fallback_error(e):
+                    raise
+                self._log_fallback(node_name, config, e)
+
+    async def ainvoke(self, node_name: str, messages: List[BaseMessage],
+            prompt_caching: Optional[PromptCachingConfig] = None) -> BaseMessage:
+        cache_key, cached_response = self._lookup_cached_response(node_name, messages)
+        if cached_response is not None:
+            return cached_response
+
+        for attempt, (config, runnable, request, is_last) in enumerate(self._attempts(node_name, messages,
+                prompt_caching)):
+            try:
+                with TRACER.span("llm_invoke", "llm", model=config.model_id, node=node_name) as span:
+                    response = await runnable.ainvoke(request)
+                    self._record(span, response, prompt_caching)
+                # The key is the primary model's, so the fallback model's answers aren't cached under it
+                if cache_key is not None and attempt == 0:
+                    LLM_RESPONSE_CACHE.put(cache_key, response)
+                return response
+            except Exception as e:
+                if is_last or not is_fallback_error(e):
+                    raise
+                self._log_fallback(node_name, config, e)
+
+MODEL_ROUTER = ModelRouter()
+
+def configure_model_routes(routes: Dict[str, ModelRoute]):
+    """
+    Overrides which model each node uses, e.g. {"node_invoke_llm_approval": ModelRoute(ModelConfig(...))}.  Nodes not
+    mentioned use the defaults their graphs registered.
+    """
+    MODEL_ROUTER.configure(routes)
@@ -0,0 +1,121 @@
+from dataclasses import dataclass
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_function
+
+from utilities.tracing import Span
+
+logger = logging.getLogger(__name__)
+
+#
+# Bedrock Converse prompt caching.  We insert cache points after the static prefix (system prompt and tool schemas)
+# and after the most recent user messages, so that the growing conversation history is read from the cache on later
+# calls instead of being re-processed.  Only some Bedrock models support prompt caching, so this is off by default.
+#
+
+# A Converse request may contain at most four cache points: system, tools, and two in the message history
+CACHE_POINT_BLOCK = {"cachePoint": {"type": "default"}}
+MAX_HISTORY_CACHE_POINTS = 2
+
+@dataclass
+class PromptCachingConfig:
+    """
+    enabled: whether to insert cache points at all
+    history_cache_points: how many of the most recent user messages get a cache point (0 to 2)
+    """
+    enabled: bool = False
+    history_cache_points: int = MAX_HISTORY_CACHE_POINTS
+
+def bind_tools_with_cache_point(llm: BaseChatModel, tools: Sequence[BaseTool]) -> Runnable:
+    """
+    Equivalent to llm.bind_tools(tools), but with a cache point after the tool schemas.  The llm must be a
+    ChatBedrockConverse; it isn't imported here, as langchain_aws is slow to import.
+    """
+    tool_specs = []
+    for tool in tools:
+        spec = convert_to_openai_function(tool)
+        spec["inputSchema"] = {"json": spec.pop("parameters")}
+        tool_specs.append({"toolSpec": spec})
+    return llm.bind(toolConfig={"tools": tool_specs + [CACHE_POINT_BLOCK]})
+
+def _with_cache_point(message: BaseMessage) -> BaseMessage:
+    content = message.content
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    return message.model_copy(update={"content": list(content) + [CACHE_POINT_BLOCK]})
+
+def add_cache_points(messages: List[BaseMessage], config: Optional[PromptCachingConfig]) -> List[BaseMessage]:
+    """
+    Returns a copy of the messages with a cache point after the system prompt and after each of the most recent
+    user messages.  The messages in the graph state are not modified.
+    """
+    if config is None or not config.enabled:
+        return messages
+
+    result = list(messages)
+
+    # Bedrock merges the leading system messages into one system block, so only the last of them needs a cache point
+    system_count = 0
+    while system_count < len(result) and isinstance(result[system_count], SystemMessage):
+        system_count += 1
+    if system_count:
+        result[system_count - 1] = _with_cache_point(result[system_count - 1])
+
+    remaining_history_points = min(config.history_cache_points, MAX_HISTORY_CACHE_POINTS)
+    for i in reversed(range(system_count, len(result))):
+        if remaining_history_points <= 0:
+            break
+        if isinstance(result[i], HumanMessage):
+            result[i] = _with_cache_point(result[i])
+            remaining_history_points -= 1
+
+    return result
+
+class PromptCacheUsage:
+    def __init__(self):
+        """
+        Running totals of the prompt caching token usage reported by Bedrock.
+        """
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.input_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cache_write_input_tokens = 0
+
+    def record(self, response: Any, span: Optional[Span] = None) -> Dict[str, int]:
+        """
+        Records the cache usage of a single LLM response, logs it, and copies it onto the LLM span if there is one.
+        """
+        usage = getattr(response, "usage_metadata", None) or {}
+        call_usage = {
+            "input_tokens": usage.get("input_tokens", 0),
+            "cache_read_input_tokens": usage.get("cache_read_input_tokens", 0),
+            "cache_write_input_tokens": usage.get("cache_write_input_tokens", 0),
+        }
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += call_usage["input_tokens"]
+            self.cache_read_input_tokens += call_usage["cache_read_input_tokens"]
+            self.cache_write_input_tokens += call_usage["cache_write_input_tokens"]
+
+        logger.info(f"Prompt cache usage: {call_usage}")
+        if span is not None:
+            span.set_attribute("llm.cache_read_input_tokens", call_usage["cache_read_input_tokens"])
+            span.set_attribute("llm.cache_write_input_tokens", call_usage["cache_write_input_tokens"])
+        return call_usage
+
+    def to_json(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "cache_read_input_tokens": self.cache_read_input_tokens,
+            "cache_write_input_tokens": self.cache_write_input_tokens
+        }
+
+PROMPT_CACHE_USAGE = PromptCacheUsage()
@@ -0,0 +1,217 @@
+from dataclasses import asdict, dataclass
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+import uuid
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from utilities.caching import CacheStats, TtlLruCache
+
+logger = logging.getLogger(__name__)
+
+#
+# An opt-in cache of LLM responses.  With temperature 0 the same request gets (near enough) the same answer, so for
+# repeated requests - the same opening question, the same metric explanation for the same domain - we can skip the
+# Bedrock call.  The key covers everything that shapes the answer: the conversation, the model parameters, and the
+# tool schemas.  Responses from non-deterministic settings are never cached.
+#
+
+DEFAULT_MAX_ENTRIES = 1_000
+DEFAULT_TTL_SECONDS = 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value_type TEXT,
+    value BLOB,
+    created_at REAL NOT NULL
+);
+"""
+
+@dataclass
+class ResponseCacheConfig:
+    """
+    enabled: whether to cache responses at all
+    max_entries/ttl_seconds: bounds on the in-memory tier; the TTL also applies to the disk tier
+    disk_path: a SQLite file for a second tier that survives restarts; None keeps the cache in memory only
+    """
+    enabled: bool = False
+    max_entries: int = DEFAULT_MAX_ENTRIES
+    ttl_seconds: float = DEFAULT_TTL_SECONDS
+    disk_path: Optional[str] = None
+
+def _normalize_content(content: Any) -> Any:
+    if isinstance(content, str):
+        return content.strip()
+    # Drop prompt caching markers and anything else that doesn't change what the model sees
+    return [
+        block.strip() if isinstance(block, str) else {key: value for key, value in block.items() if key != "id"}
+        for block in content
+        if not (isinstance(block, dict) and "cachePoint" in block)
+    ]
+
+def normalize_messages(messages: List[BaseMessage]) -> List[Dict[str, Any]]:
+    """
+    Reduces messages to what the model sees.  Message IDs, metadata, and usage are dropped, and tool call IDs (which
+    are random) are replaced by their position in the conversation, so equivalent conversations get the same key.
+    """
+    tool_call_positions: Dict[str, int] = {}
+    normalized = []
+    for message in messages:
+        entry: Dict[str, Any] = {"type": message.type, "content": _normalize_content(message.content)}
+        if isinstance(message, AIMessage) and message.tool_calls:
+            calls = []
+            for tool_call in message.tool_calls:
+                tool_call_positions.setdefault(tool_call["id"], len(tool_call_positions))
+                calls.append({"name": tool_call["name"], "args": tool_call["args"],
+                    "id": tool_call_positions[tool_call["id"]]})
+            entry["tool_calls"] = calls
+        if isinstance(message, ToolMessage):
+            entry["tool_call_id"] = tool_call_positions.get(message.tool_call_id, message.tool_call_id)
+        normalized.append(entry)
+    return normalized
+
+def make_cache_key(messages: List[BaseMessage], model_params: Dict[str, Any], tools: Sequence[BaseTool]) -> str:
+    payload = {
+        "messages": normalize_messages(messages),
+        "model": model_params,
+        "tools": [convert_to_openai_tool(tool) for tool in tools],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def _with_fresh_tool_use_id(block: Any, fresh_ids: Dict[str, str]) -> Any:
+    if isinstance(block, dict) and block.get("type") == "tool_use" and block.get("id") in fresh_ids:
+        return {**block, "id": fresh_ids[block["id"]]}
+    if isinstance(block, dict) and isinstance(block.get("toolUse"), dict) \
+            and block["toolUse"].get("toolUseId") in fresh_ids:
+        return {**block, "toolUse": {**block["toolUse"], "toolUseId": fresh_ids[block["toolUse"]["toolUseId"]]}}
+    return block
+
+def _with_fresh_ids(response: AIMessage) -> AIMessage:
+    # A cached response can be returned more than once in the same conversation, so it needs new message and tool call
+    # IDs each time; the graph state de-duplicates messages by ID.  The tool use blocks in the content carry the same
+    # IDs as the tool calls, and both are sent back to Bedrock, so they have to agree.
+    fresh_ids = {tool_call["id"]: f"tooluse_{uuid.uuid4().hex[:22]}" for tool_call in response.tool_calls}
+    content = response.content
+    if isinstance(content, list):
+        content = [_with_fresh_tool_use_id(block, fresh_ids) for block in content]
+    return response.model_copy(update={
+        "id": None,
+        "content": content,
+        "tool_calls": [{**tool_call, "id": fresh_ids[tool_call["id"]]} for tool_call in response.tool_calls]
+    })
+
+class LlmResponseCache:
+    def __init__(self, config: ResponseCacheConfig):
+        """
+        Two-tier cache of LLM responses: an in-memory LRU, backed by an optional SQLite file.
+        """
+        self._lock = threading.Lock()
+        self.serde = JsonPlusSerializer()
+        self.disk_stats = CacheStats()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.configure(config)
+
+    def configure(self, config: ResponseCacheConfig):
+        with self._lock:
+            self.config = config
+            self._memory = TtlLruCache(max_entries=config.max_entries, ttl_seconds=config.ttl_seconds)
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            if config.enabled and config.disk_path:
+                self._conn = sqlite3.connect(config.disk_path, check_same_thread=False)
+                self._conn.executescript(_SCHEMA)
+                self._conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.enabled
+
+    @property
+    def memory_stats(self) -> CacheStats:
+        return self._memory.stats
+
+    def get(self, key: str) -> Optional[AIMessage]:
+        """
+        Returns a copy of the cached response, with fresh IDs, or None.
+        """
+        response = self._memory.get(key)
+        if response is None and self._conn is not None:
+            response = self._get_from_disk(key)
+            if response is not None:
+                self._memory.put(key, response)
+        return _with_fresh_ids(response) if response is not None else None
+
+    def _get_from_disk(self, key: str) -> Optional[AIMessage]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value_type, value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[2] > self.config.ttl_seconds:
+                self.disk_stats.record_miss()
+                return None
+        self.disk_stats.record_hit()
+        return self.serde.loads_typed((row[0], row[1]))
+
+    def put(self, key: str, response: BaseMessage):
+        if not isinstance(response, AIMessage):
+            return
+        self._memory.put(key, response)
+        if self._conn is not None:
+            value_type, value = self.serde.dumps_typed(response)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, value_type, value, time.time())
+                )
+                self._conn.execute(
+                    "DELETE FROM responses WHERE created_at < ?", (time.time() - self.config.ttl_seconds,)
+                )
+                self._conn.commit()
+
+    def clear(self):
+        self._memory.invalidate()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM responses")
+                self._conn.commit()
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "memory_entries": len(self._memory),
+            "memory": self.memory_stats.to_json(),
+            "disk": self.disk_stats.to_json() if self._conn is not None else None,
+        }
+
+LLM_RESPONSE_CACHE = LlmResponseCache(ResponseCacheConfig())
+
+def configure_response_cache(config: ResponseCacheConfig):
+    """
+    Turns the LLM response cache on or off and sets its bounds, e.g.
+    configure_response_cache(ResponseCacheConfig(enabled=True, disk_path="./llm_responses.db")).
+    """
+    LLM_RESPONSE_CACHE.configure(config)
+
+def is_deterministic(model_params: Dict[str, Any]) -> bool:
+    """
+    Only responses sampled at temperature 0 are safe to replay.
+    """
+    return model_params.get("temperature") == 0 and model_params.get("top_p") in (None, 1)
+
+def model_params_for_key(config: Any) -> Dict[str, Any]:
+    """
+    The model parameters that shape a response (not timeouts or retries, which only affect whether we get one).
+    """
+    params = asdict(config)
+    params.pop("timeout_seconds", None)
+    params.pop("max_attempts", None)
+    return params
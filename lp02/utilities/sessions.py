@@ -0,0 +1,247 @@
+from dataclasses import dataclass, field
+from json import dumps
+import logging
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+import uuid
+
+from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+#
+# Per-user sessions.  Each session gets its own checkpoint thread, and the manager keeps the in-memory graph state of
+# recently active sessions only: under memory pressure the least recently used sessions are offloaded (their state is
+# dropped from memory and reloaded from the checkpointer on next use), and sessions idle past the timeout are removed
+# entirely.
+#
+
+DEFAULT_MAX_SESSIONS = 1_000
+DEFAULT_MEMORY_CEILING_BYTES = 256 * 1024 * 1024
+DEFAULT_IDLE_TIMEOUT_SECONDS = 60 * 60
+
+# Rough per-message overhead of the Python objects around the message content
+MESSAGE_OVERHEAD_BYTES = 512
+
+def _estimate_message_bytes(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else dumps(message.content, default=str)
+    size = len(content) + MESSAGE_OVERHEAD_BYTES
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        size += len(dumps(tool_calls, default=str))
+    return size
+
+def estimate_state_bytes(state: Optional[Dict[str, Any]]) -> int:
+    """
+    Estimates how much memory a graph state holds, counting message contents and tool calls.
+    """
+    if not state:
+        return 0
+
+    size = 0
+    for value in state.values():
+        if isinstance(value, list):
+            size += sum(
+                _estimate_message_bytes(item) if isinstance(item, BaseMessage) else sys.getsizeof(item)
+                for item in value
+            )
+        else:
+            size += sys.getsizeof(value)
+    return size
+
+@dataclass
+class Session:
+    """
+    session_id: the ID the client uses to refer to the session
+    thread_id: the checkpoint thread holding the session's graph state
+    graph_state: the latest graph state, or None while the session is offloaded
+    conversation: the user-facing transcript, oldest first, as {"role": "user"|"ai", "content": ...} entries
+    """
+    session_id: str
+    thread_id: str
+    graph_state: Optional[Dict[str, Any]]
+    conversation: List[Dict[str, Any]] = field(default_factory=list)
+    created_at: float = field(default_factory=time.monotonic)
+    last_active: float = field(default_factory=time.monotonic)
+    memory_bytes: int = 0
+    has_saved_state: bool = False  # Whether the graph has run on the session's thread, so its state can be reloaded
+
+    @property
+    def offloaded(self) -> bool:
+        return self.graph_state is None
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "thread_id": self.thread_id,
+            "offloaded": self.offloaded,
+            "memory_bytes": self.memory_bytes,
+            "idle_seconds": round(time.monotonic() - self.last_active, 1),
+            "conversation_entries": len(self.conversation)
+        }
+
+class SessionManager:
+    def __init__(self, new_state: Callable[[], Dict[str, Any]],
+            load_state: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+            delete_thread: Optional[Callable[[str], None]] = None,
+            max_sessions: int = DEFAULT_MAX_SESSIONS,
+            memory_ceiling_bytes: int = DEFAULT_MEMORY_CEILING_BYTES,
+            idle_timeout_seconds: float = DEFAULT_IDLE_TIMEOUT_SECONDS):
+        """
+        Tracks the sessions hosted by this process.
+
+        new_state: builds the graph state for a new session
+        load_state: reloads an offloaded session's graph state from its thread ID (e.g. from the checkpointer)
+        delete_thread: removes a thread's checkpoints once its session has been removed
+        max_sessions: the most sessions to track; the least recently used are removed beyond this
+        memory_ceiling_bytes: the most (estimated) graph state to hold in memory across all sessions
+        idle_timeout_seconds: sessions idle for longer than this are removed
+        """
+        self.new_state = new_state
+        self.load_state = load_state
+        self.delete_thread = delete_thread
+        self.max_sessions = max_sessions
+        self.memory_ceiling_bytes = memory_ceiling_bytes
+        self.idle_timeout_seconds = idle_timeout_seconds
+
+        self._lock = threading.RLock()
+        self._sessions: Dict[str, Session] = {}  # In least-to-most recently used order
+        self._memory_bytes = 0
+        self.offload_count = 0
+        self.removal_count = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+    def create_session(self) -> Session:
+        """
+        Starts a session with a fresh graph state on its own thread.
+        """
+        session_id = uuid.uuid4().hex
+        state = self.new_state()
+        session = Session(session_id=session_id, thread_id=session_id, graph_state=state,
+            memory_bytes=estimate_state_bytes(state))
+
+        with self._lock:
+            self._sessions[session_id] = session
+            self._memory_bytes += session.memory_bytes
+            self._enforce_limits(keep=session_id)
+        logger.info(f"Created session {session_id}")
+        return session
+
+    def get_session(self, session_id: str) -> Optional[Session]:
+        """
+        Returns the session, reloading its graph state if it was offloaded, and marks it as recently used.  Returns
+        None if the session doesn't exist or has been removed.
+        """
+        with self._lock:
+            self.remove_idle_sessions()
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return None
+            self._sessions[session_id] = session
+            session.last_active = time.monotonic()
+
+            if session.offloaded:
+                self._reload(session)
+                self._enforce_limits(keep=session_id)
+            return session
+
+    def update_session(self, session_id: str, graph_state: Dict[str, Any]):
+        """
+        Records the session's latest graph state and re-checks the memory ceiling.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise KeyError(f"Unknown session: {session_id}")
+
+            memory_bytes = estimate_state_bytes(graph_state)
+            self._memory_bytes += memory_bytes - session.memory_bytes
+            session.graph_state = graph_state
+            session.memory_bytes = memory_bytes
+            session.has_saved_state = True
+            session.last_active = time.monotonic()
+            self._sessions[session_id] = self._sessions.pop(session_id)
+            self._enforce_limits(keep=session_id)
+
+    def remove_session(self, session_id: str):
+        """
+        Forgets the session and deletes its checkpoints.
+        """
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return
+            self._memory_bytes -= session.memory_bytes
+            self.removal_count += 1
+
+        logger.info(f"Removed session {session_id}")
+        if self.delete_thread is not None:
+            self.delete_thread(session.thread_id)
+
+    def remove_idle_sessions(self) -> int:
+        """
+        Removes every session idle for longer than the timeout.  Returns how many were removed.
+        """
+        cutoff = time.monotonic() - self.idle_timeout_seconds
+        with self._lock:
+            idle = [session_id for session_id, session in self._sessions.items() if session.last_active < cutoff]
+        for session_id in idle:
+            self.remove_session(session_id)
+        return len(idle)
+
+    def _reload(self, session: Session):
+        state = self.load_state(session.thread_id) if self.load_state is not None else None
+        if state is None:
+            logger.warning(f"No saved state for session {session.session_id}; starting it over")
+            state = self.new_state()
+        session.graph_state = state
+        session.memory_bytes = estimate_state_bytes(state)
+        self._memory_bytes += session.memory_bytes
+        logger.info(f"Reloaded session {session.session_id} ({session.memory_bytes} bytes)")
+
+    def _offload(self, session: Session):
+        self._memory_bytes -= session.memory_bytes
+        session.graph_state = None
+        session.memory_bytes = 0
+        self.offload_count += 1
+        logger.info(f"Offloaded session {session.session_id}")
+
+    def _enforce_limits(self, keep: str):
+        """
+        Removes the least recently used sessions beyond max_sessions, then offloads the least recently used sessions
+        until we're under the memory ceiling.  The session being worked on is never touched.  Sessions can only be
+        offloaded if their state has been saved and can be reloaded.
+        """
+        while len(self._sessions) > self.max_sessions:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                break
+            self.remove_session(oldest)
+
+        if self.load_state is None:
+            return
+        for session in list(self._sessions.values()):
+            if self._memory_bytes <= self.memory_ceiling_bytes:
+                break
+            if session.session_id != keep and session.has_saved_state and not session.offloaded:
+                self._offload(session)
+
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "resident_sessions": sum(1 for session in self._sessions.values() if not session.offloaded),
+                "memory_bytes": self._memory_bytes,
+                "memory_ceiling_bytes": self.memory_ceiling_bytes,
+                "offload_count": self.offload_count,
+                "removal_count": self.removal_count
+            }
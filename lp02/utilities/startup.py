@@ -0,0 +1,157 @@
+import argparse
+import atexit
+from contextlib import contextmanager
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, Generic, Iterator, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+#
+# Helpers to keep process start-up cheap: Lazy defers building expensive objects (compiled graphs, checkpointers) to
+# first use, and the profile mode reports where start-up time goes.  Set LP02_PROFILE_STARTUP=1 to record how long
+# each lazy object took to build, or run from the lp02 directory:
+#
+#     python -m utilities.startup [--build] [cw_expert approval_expert ...]
+#
+# to import the modules in a fresh interpreter and break down the time by package and by build phase.
+#
+# This module only uses the standard library, so importing it costs nothing.
+#
+
+PROFILE_ENV_VAR = "LP02_PROFILE_STARTUP"
+OWN_PACKAGES = {"approval_expert", "aws_interactions", "benchmarks", "chat_service", "cw_expert", "utilities"}
+PROFILE_STARTUP = os.environ.get(PROFILE_ENV_VAR) == "1"
+
+# (phase name, seconds), in the order the phases finished
+STARTUP_PHASES: List[Tuple[str, float]] = []
+
+@contextmanager
+def startup_phase(name: str) -> Iterator[None]:
+    """
+    Times the block as a named start-up phase when profiling is on.
+    """
+    if not PROFILE_STARTUP:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_PHASES.append((name, time.perf_counter() - start))
+
+T = TypeVar("T")
+
+_LAZY_OBJECTS: List["Lazy"] = []
+
+class Lazy(Generic[T]):
+    def __init__(self, name: str, factory: Callable[[], T]):
+        """
+        Builds the factory's object on first use, once, and then stands in for it: attribute access is passed through,
+        so a Lazy can be used wherever the object itself was.  Use get() for the object itself.
+        """
+        self._name = name
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._built = False
+        self._lock = threading.Lock()
+        _LAZY_OBJECTS.append(self)
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    def get(self) -> T:
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    with startup_phase(self._name):
+                        self._value = self._factory()
+                    self._built = True
+                    logger.debug(f"Built {self._name}")
+        return self._value
+
+    def __getattr__(self, name: str):
+        # Only called for attributes the Lazy itself doesn't have
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __repr__(self) -> str:
+        return f"Lazy({self._name}, built={self._built})"
+
+def build_all():
+    """
+    Builds every lazy object created so far, e.g. to warm a server up before it takes traffic.
+    """
+    for lazy in list(_LAZY_OBJECTS):
+        lazy.get()
+
+def _report_phases():
+    print(json.dumps({"phases": STARTUP_PHASES}))
+
+if PROFILE_STARTUP and os.environ.get("LP02_PROFILE_STARTUP_REPORT") == "1":
+    atexit.register(_report_phases)
+
+def _parse_import_times(stderr: str) -> List[Tuple[str, int, int]]:
+    """
+    Parses -X importtime output into (module, self microseconds, cumulative microseconds).
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        entries.append((module.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+def profile_startup(modules: List[str], build: bool = False) -> Dict[str, object]:
+    """
+    Imports the modules in a fresh interpreter and returns the wall time, the import time of each top-level package,
+    the cumulative import time of each of our own modules, and the build phases.
+    """
+    code = "".join(f"import {module}\n" for module in modules)
+    if build:
+        code += "from utilities.startup import build_all\nbuild_all()\n"
+    env = {**os.environ, PROFILE_ENV_VAR: "1", "LP02_PROFILE_STARTUP_REPORT": "1"}
+
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, env=env,
+        check=True)
+    wall_seconds = time.perf_counter() - start
+
+    own_packages = {module.split(".")[0] for module in modules} | OWN_PACKAGES
+    packages: Dict[str, int] = {}
+    own_modules: Dict[str, int] = {}
+    for module, self_us, cumulative_us in _parse_import_times(result.stderr):
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+        if package in own_packages:
+            own_modules[module] = cumulative_us
+
+    phases = json.loads(result.stdout.strip().splitlines()[-1])["phases"]
+    return {"wall_seconds": wall_seconds, "packages": packages, "own_modules": own_modules, "phases": phases}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report where start-up time goes")
+    parser.add_argument("modules", nargs="*", default=["cw_expert"], help="Modules to import")
+    parser.add_argument("--build", action="store_true", help="Also build every lazy object, as the first request would")
+    parser.add_argument("--top", type=int, default=15, help="How many packages and modules to list")
+    args = parser.parse_args()
+
+    profile = profile_startup(args.modules, args.build)
+    print(f"Start-up took {profile['wall_seconds']:.2f}s (including interpreter start)\n")
+    print("Import time by package:")
+    for package, self_us in sorted(profile["packages"].items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {package:<40} {self_us / 1000:8.1f} ms")
+    print("\nCumulative import time of our modules:")
+    for module, cumulative_us in sorted(profile["own_modules"].items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {module:<40} {cumulative_us / 1000:8.1f} ms")
+    print("\nBuild phases:")
+    for name, seconds in profile["phases"] or [("(none)", 0.0)]:
+        print(f"  {name:<40} {seconds * 1000:8.1f} ms")
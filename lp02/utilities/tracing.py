@@ -0,0 +1,258 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+#
+# Lightweight span tracing for graph runs, nodes, LLM calls, tool calls, and AWS API calls.  Tracing is off until
+# configure_tracing() is called, and while off every entry point returns after a single flag check.
+#
+
+@dataclass
+class Span:
+    name: str
+    kind: str  # "graph", "node", "llm", "tool", or "aws"
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str] = None
+    start_time_ns: int = 0
+    end_time_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_time_ns - self.start_time_ns) / 1_000_000
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_ns": self.start_time_ns,
+            "end_time_ns": self.end_time_ns,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+class SpanExporter(ABC):
+    @abstractmethod
+    def export(self, span: Span):
+        """
+        Called with each span as it finishes, on the thread that finished it.
+        """
+
+class JsonlSpanExporter(SpanExporter):
+    def __init__(self, file_path: str):
+        """
+        Appends each finished span to a local file as a line of JSON.
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_json(), default=str)
+        with self._lock:
+            with open(self.file_path, "a") as f:
+                f.write(line + "\n")
+
+class InMemorySpanCollector(SpanExporter):
+    def __init__(self, max_spans: int = 100_000):
+        """
+        Keeps finished spans in memory and can render them as an OTLP/JSON ExportTraceServiceRequest body, so they
+        can be inspected in-process or forwarded to any OTLP-compatible backend.
+        """
+        self.max_spans = max_spans
+        self._lock = threading.Lock()
+        self._spans: List[Span] = []
+
+    def export(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+            if len(self._spans) > self.max_spans:
+                del self._spans[:len(self._spans) - self.max_spans]
+
+    @property
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+    def to_otlp(self, service_name: str = "lp02") -> Dict[str, Any]:
+        def to_attribute(key: str, value: Any) -> Dict[str, Any]:
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        otlp_spans = []
+        for span in self.spans:
+            otlp_span = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(span.start_time_ns),
+                "endTimeUnixNano": str(span.end_time_ns),
+                "attributes": [to_attribute("lp02.kind", span.kind)]
+                    + [to_attribute(key, value) for key, value in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1}
+            }
+            if span.parent_span_id:
+                otlp_span["parentSpanId"] = span.parent_span_id
+            otlp_spans.append(otlp_span)
+
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [to_attribute("service.name", service_name)]},
+                "scopeSpans": [{"scope": {"name": "lp02"}, "spans": otlp_spans}]
+            }]
+        }
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self._exporters: List[SpanExporter] = []
+        self._current_span: ContextVar[Optional[Span]] = ContextVar("lp02_current_span", default=None)
+
+    def configure(self, exporters: List[SpanExporter]):
+        self._exporters = list(exporters)
+        self.enabled = bool(self._exporters)
+
+    def current_span(self) -> Optional[Span]:
+        return self._current_span.get()
+
+    def start_span(self, name: str, kind: str, parent: Optional[Span] = None, **attributes) -> Optional[Span]:
+        """
+        Starts a span without making it the current span; pair with end_span().  Parents default to the current
+        span, and a span with no parent starts a new trace.  Returns None when tracing is disabled.
+        """
+        if not self.enabled:
+            return None
+
+        parent = parent or self._current_span.get()
+        return Span(
+            name=name,
+            kind=kind,
+            trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex(),
+            parent_span_id=parent.span_id if parent else None,
+            start_time_ns=time.time_ns(),
+            attributes=attributes
+        )
+
+    def end_span(self, span: Optional[Span], error: Optional[BaseException] = None):
+        if span is None:
+            return
+
+        span.end_time_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        for exporter in self._exporters:
+            try:
+                exporter.export(span)
+            except Exception:
+                logger.exception(f"Failed to export span {span.name}")
+
+    @contextmanager
+    def _active_span(self, name: str, kind: str, attributes: Dict[str, Any]) -> Iterator[Span]:
+        span = self.start_span(name, kind, **attributes)
+        token = self._current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, error=e)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            self._current_span.reset(token)
+
+    def span(self, name: str, kind: str, **attributes):
+        """
+        Context manager that records a span and makes it the parent of any spans started inside it.  Yields the Span,
+        or None when tracing is disabled.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._active_span(name, kind, attributes)
+
+TRACER = Tracer()
+
+def configure_tracing(*exporters: SpanExporter):
+    """
+    Turns on tracing and sends finished spans to the given exporters.  Call with no exporters to turn tracing off.
+    """
+    TRACER.configure(list(exporters))
+
+def record_llm_usage(span: Optional[Span], response: Any):
+    """
+    Copies token usage from a chat model response onto an LLM span.
+    """
+    if span is None:
+        return
+
+    usage = getattr(response, "usage_metadata", None) or {}
+    for key in ["input_tokens", "output_tokens", "total_tokens"]:
+        if key in usage:
+            span.set_attribute(f"llm.{key}", usage[key])
+
+def trace_node(state_to_json: Callable[[Dict[str, Any]], Dict[str, Any]]):
+    """
+    Decorator factory for graph nodes.  Logs node entry, logs the starting state and output at DEBUG (serializing the
+    state only when DEBUG logging is actually enabled), and records a "node" span.  Works on sync and async nodes.
+    """
+    def decorator(func: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        def log_entry(state: Dict[str, Any]):
+            logger.info(f"Entering node: {func.__name__}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Starting state: {str(state_to_json(state))}")
+
+        def log_exit(result: Dict[str, Any]):
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Output of {func.__name__}: {result}")
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+                log_entry(state)
+                with TRACER.span(func.__name__, "node"):
+                    result = await func(state)
+                log_exit(result)
+                return result
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+            log_entry(state)
+            with TRACER.span(func.__name__, "node"):
+                result = func(state)
+            log_exit(result)
+            return result
+
+        return wrapper
+
+    return decorator